@@ -0,0 +1,115 @@
+"""
+Async (ASGI) serving mode for the pharmacy API.
+
+Serves the same routes as server.py. Blocking BigQuery and snapshot calls
+run on a bounded executor (API_MAX_CONCURRENCY), and identical concurrent
+requests for the same route and arguments share one in-flight call.
+
+Run with:
+    uvicorn asgi_server:app --host 0.0.0.0 --port 8080
+"""
+import os
+from typing import Optional
+from urllib.parse import urlencode
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from coalesce import RequestCoalescer
+from conditional import ResponseCache, make_etag, not_modified_headers
+from serialization import dumps, ndjson
+from pharmacy import (
+    home_summary, list_medicines, medicines_page, iter_medicine_pages, health_status, inventory_version,
+    medicine_prescriptions, medicine_prescriptions_batch, parse_medicine_ids, page_size,
+)
+
+app = FastAPI()
+app.add_middleware(
+    CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "ETag"],
+)
+
+coalescer = RequestCoalescer(max_concurrency=int(os.getenv('API_MAX_CONCURRENCY', '16')))
+
+# Rendered inventory responses by ETag (route, arguments and inventory data version)
+response_cache = ResponseCache()
+
+def _render_json(fn, args):
+    data, headers = fn(*args)
+    return dumps(data).encode(), headers or {}
+
+async def _conditional(request: Request, key: tuple, fn, *args) -> Response:
+    """
+    Responds with fn(*args) -> (data, headers) as JSON under an ETag for `key`
+    and the inventory version: 304 if the client has it, else from
+    response_cache, rendering (once per ETag across concurrent requests) on a miss.
+    """
+    etag = make_etag(key, await coalescer.run(('inventory_version',), inventory_version))
+    if response_cache.client_has(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=not_modified_headers(etag))
+    entry = response_cache.get(etag)
+    if entry is None:
+        entry = response_cache.put(etag, *await coalescer.run(('render', etag), _render_json, fn, args))
+    body, headers = await run_in_threadpool(response_cache.finish, entry, etag, request.headers.get('accept-encoding'))
+    return Response(body, headers=headers, media_type='application/json')
+
+# Route: Pharmacy home summary
+@app.get('/api/pharmacy/home')
+async def pharmacy_home(request: Request):
+    return await _conditional(request, ('home',), lambda: (home_summary(), None))
+
+# Route: List of medicines, optional search (q). The whole listing by default;
+# paged by cursor (after=, next cursor in X-Next-Cursor / Link) or by offset when
+# limit, after or offset is given; or streamed in full as NDJSON
+@app.get('/api/medicines')
+async def get_medicines(
+    request: Request, q: str = '', limit: Optional[int] = None, offset: Optional[int] = None,
+    after: Optional[str] = None, format: Optional[str] = None,
+):
+    if format == 'ndjson' or 'application/x-ndjson' in request.headers.get('accept', ''):
+        # Each stream gets its own iterator, so it is not shared through the coalescer
+        pages = await run_in_threadpool(iter_medicine_pages, q)
+        # Sync iterator: Starlette pulls each page on a worker thread
+        return StreamingResponse(ndjson(pages), media_type='application/x-ndjson')
+    if limit is None and offset is None and after is None:
+        # Unpaged callers keep getting the whole listing
+        return await _conditional(request, ('medicines_all', q), lambda: (list_medicines(q), None))
+    if offset is not None:
+        return await _conditional(
+            request, ('medicines', q, page_size(limit), offset),
+            lambda: (list_medicines(q, page_size(limit), offset), None),
+        )
+
+    def render():
+        rows, cursor = medicines_page(q, limit, after)
+        if not cursor:
+            return rows, None
+        query = urlencode({**request.query_params, 'after': cursor})
+        return rows, {'X-Next-Cursor': cursor, 'Link': f'<{request.url.path}?{query}>; rel="next"'}
+
+    try:
+        return await _conditional(request, ('medicines_page', q, page_size(limit), after), render)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Route: Snapshot health
+@app.get('/api/health')
+async def health():
+    status = health_status()
+    status['coalescer'] = coalescer.stats()
+    status['response_cache'] = response_cache.stats()
+    return status
+
+# Route: Medicine details by ID
+@app.get('/api/medicine/{medicine_id}')
+async def medicine_details(medicine_id: int):
+    return await coalescer.run(('medicine', medicine_id), medicine_prescriptions, medicine_id)
+
+# Route: Prescriptions for many medicines at once (?ids=1,2,3)
+@app.get('/api/medicines/details')
+async def medicines_details(ids: str = ''):
+    try:
+        medicine_ids = parse_medicine_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await coalescer.run(('medicines_details', tuple(medicine_ids)), medicine_prescriptions_batch, medicine_ids)
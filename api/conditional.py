@@ -0,0 +1,150 @@
+"""
+Conditional, compressed JSON responses keyed on table data versions.
+
+A response's ETag is a hash of the route, its arguments and the data
+version of the tables it reads (TableSnapshot.data_version()), so it is
+known before any data is read: a matching If-None-Match is answered with a
+304 and no body. Rendered bodies are kept in a small LRU cache under their
+ETag, together with their gzip / brotli encodings, so repeat requests that
+don't revalidate also skip the query, serialization and compression until
+the data changes. Bodies under COMPRESS_MIN_BYTES are sent uncompressed.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '256'))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Clients may store responses but must revalidate them (cheap: a 304)
+CACHE_CONTROL = 'no-cache'
+
+def make_etag(*parts: Any) -> str:
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest()[:24] + '"'
+
+def _opaque(tag: str) -> str:
+    # If-None-Match uses weak comparison; encoded variants ("<tag>-gzip") share their base tag
+    tag = tag.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    return tag.strip('"').split('-')[0]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    base = _opaque(etag)
+    return any(_opaque(tag) == base for tag in if_none_match.split(','))
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Picks br or gzip from an Accept-Encoding header (ignoring q-value ordering), or None."""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def not_modified_headers(etag: str) -> Dict[str, str]:
+    return {'ETag': etag, 'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+
+class CachedResponse:
+    def __init__(self, body: bytes, headers: Dict[str, str]):
+        self.body = body
+        self.headers = headers
+        self.encoded: Dict[str, bytes] = {}
+
+class ResponseCache:
+    """LRU of rendered bodies (and their encodings) by ETag."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry
+
+    def put(self, etag: str, body: bytes, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        entry = CachedResponse(body, headers or {})
+        with self._lock:
+            self._entries[etag] = entry
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def finish(self, entry: CachedResponse, etag: str, accept_encoding: Optional[str]) -> Tuple[bytes, Dict[str, str]]:
+        """The body to send for `entry` and its headers, compressed if the client accepts it."""
+        headers = {**entry.headers, **not_modified_headers(etag)}
+        encoding = choose_encoding(accept_encoding) if len(entry.body) >= COMPRESS_MIN_BYTES else None
+        if encoding is None:
+            return entry.body, headers
+        body = entry.encoded.get(encoding)
+        if body is None:
+            # Racing requests may both compress; the result is the same
+            body = entry.encoded.setdefault(encoding, compress(entry.body, encoding))
+        headers['ETag'] = f'"{_opaque(etag)}-{encoding}"'
+        headers['Content-Encoding'] = encoding
+        return body, headers
+
+    def client_has(self, if_none_match: Optional[str], etag: str) -> bool:
+        """True if If-None-Match matches `etag`, i.e. the request gets a 304."""
+        if not etag_matches(if_none_match, etag):
+            return False
+        self.not_modified += 1
+        return True
+
+    def respond(
+        self,
+        etag: str,
+        if_none_match: Optional[str],
+        accept_encoding: Optional[str],
+        render: Callable[[], Tuple[bytes, Dict[str, str]]],
+    ) -> Tuple[int, bytes, Dict[str, str]]:
+        """
+        Returns (status, body, headers) for a request: 304 if the client has
+        `etag`, else the cached body for it, calling render() -> (body, headers) on a miss.
+        """
+        if self.client_has(if_none_match, etag):
+            return 304, b'', not_modified_headers(etag)
+        entry = self.get(etag) or self.put(etag, *render())
+        body, headers = self.finish(entry, etag, accept_encoding)
+        return 200, body, headers
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+        }
@@ -0,0 +1,218 @@
+"""
+Data access for the pharmacy API, shared by the Flask app (server.py) and
+the async app (asgi_server.py). Functions here return plain Python data;
+the web layers only handle HTTP.
+"""
+import base64
+import json
+import os
+from google.cloud import bigquery
+from google.oauth2 import service_account
+from snapshot import TableSnapshot
+from search_index import MedicineSearchIndex, normalize
+from prescription_index import PrescriptionsByMedicine
+
+# BigQuery client setup
+credentials = service_account.Credentials.from_service_account_file(
+    'path/to/your/service-account-file.json'
+)
+bq_client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+
+INVENTORY_TABLE = 'med-ease-473410.MedEase.inventory'
+PRESCRIPTION_TABLE = 'med-ease-473410.MedEase.prescription'
+MEDICINE_LIST_COLUMNS = ['id', 'name', 'currentStock', 'expirationDate', 'costPerUnit', 'location']
+MEDICINE_PRESCRIPTION_COLUMNS = ['status', 'prescriptionId', 'patientId', 'doctorId']
+MAX_BATCH_IDS = int(os.getenv('MAX_BATCH_IDS', '200'))
+MEDICINES_PAGE_SIZE = int(os.getenv('MEDICINES_PAGE_SIZE', '100'))
+MEDICINES_MAX_PAGE_SIZE = int(os.getenv('MEDICINES_MAX_PAGE_SIZE', '1000'))
+MEDICINES_STREAM_PAGE_SIZE = int(os.getenv('MEDICINES_STREAM_PAGE_SIZE', '500'))
+# Column the prescriptions snapshot refreshes by; empty for a table without
+# one, which is then fully reloaded on every refresh
+PRESCRIPTION_WATERMARK_COLUMN = os.getenv('PRESCRIPTION_WATERMARK_COLUMN', 'updated_at') or None
+
+# Inventory snapshot, refreshed in the background by updated_at watermark
+inventory_snapshot = TableSnapshot(
+    bq_client,
+    INVENTORY_TABLE,
+    columns=MEDICINE_LIST_COLUMNS + ['genericName', 'minThreshold'],
+    refresh_interval=float(os.getenv('INVENTORY_REFRESH_SECONDS', '30')),
+    max_staleness=float(os.getenv('INVENTORY_MAX_STALENESS_SECONDS', '120')),
+    full_reload_interval=float(os.getenv('INVENTORY_FULL_RELOAD_SECONDS', '3600')),
+)
+
+# Name search index, kept in step with the snapshot
+medicine_index = MedicineSearchIndex()
+
+def _update_medicine_index(changed_rows, full_reload):
+    if full_reload:
+        medicine_index.rebuild(inventory_snapshot.iter_rows(['id', 'name', 'genericName']))
+    else:
+        for row in changed_rows:
+            medicine_index.upsert(row['id'], row.get('name'), row.get('genericName'))
+
+inventory_snapshot.add_listener(_update_medicine_index)
+inventory_snapshot.start()
+
+# Prescriptions snapshot and its medicineId -> prescriptions index
+prescription_snapshot = TableSnapshot(
+    bq_client,
+    PRESCRIPTION_TABLE,
+    columns=['medicineId'] + MEDICINE_PRESCRIPTION_COLUMNS,
+    key='prescriptionId',
+    watermark_column=PRESCRIPTION_WATERMARK_COLUMN,
+    refresh_interval=float(os.getenv('PRESCRIPTION_REFRESH_SECONDS', '30')),
+    max_staleness=float(os.getenv('PRESCRIPTION_MAX_STALENESS_SECONDS', '120')),
+    full_reload_interval=float(os.getenv('PRESCRIPTION_FULL_RELOAD_SECONDS', '3600')),
+    retry_interval=float(os.getenv('PRESCRIPTION_RETRY_SECONDS', '30')),
+)
+prescription_index = PrescriptionsByMedicine(MEDICINE_PRESCRIPTION_COLUMNS)
+
+def _update_prescription_index(changed_rows, full_reload):
+    if full_reload:
+        prescription_index.rebuild(prescription_snapshot.iter_rows())
+    else:
+        for row in changed_rows:
+            prescription_index.upsert(row)
+
+prescription_snapshot.add_listener(_update_prescription_index)
+prescription_snapshot.start()
+
+def inventory_version():
+    """Data version of the inventory (refreshing the snapshot first if stale), for ETags."""
+    inventory_snapshot.ensure_fresh()
+    return inventory_snapshot.data_version()
+
+def home_summary():
+    inventory_snapshot.ensure_fresh()
+    stock, thresholds = inventory_snapshot.column_view('currentStock', 'minThreshold')
+    return {
+        'total_medicines': sum(s for s in stock if s is not None),
+        'low_stock_items': sum(
+            1 for s, t in zip(stock, thresholds)
+            if s is not None and t is not None and s < t
+        ),
+    }
+
+def page_size(limit):
+    """Clamps a requested page size to 1..MEDICINES_MAX_PAGE_SIZE (MEDICINES_PAGE_SIZE if not given)."""
+    return max(1, min(limit or MEDICINES_PAGE_SIZE, MEDICINES_MAX_PAGE_SIZE))
+
+def _medicine_rows(ids):
+    data = [inventory_snapshot.get(i, MEDICINE_LIST_COLUMNS) for i in ids]
+    return [row for row in data if row is not None]
+
+def list_medicines(search='', limit=None, offset=0):
+    """Matching medicines from `offset`: `limit` of them (clamped by page_size), or all if limit is None."""
+    inventory_snapshot.ensure_fresh()
+    limit = None if limit is None else page_size(limit)
+    return _medicine_rows(medicine_index.search(search, limit=limit, offset=offset))
+
+def encode_cursor(search, position):
+    """Opaque cursor for a keyset position of the listing for `search`."""
+    payload = json.dumps([normalize(search), position[0], list(position[1])], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(search, cursor):
+    """Returns the keyset position in `cursor`. Raises ValueError if it is malformed or for another search."""
+    try:
+        q, rank, sort_key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError('invalid cursor') from e
+    if q != normalize(search):
+        raise ValueError('cursor belongs to a different search')
+    return rank, tuple(sort_key)
+
+def medicines_page(search='', limit=None, after=None):
+    """
+    One keyset page of the medicine listing (name, then id order within each
+    search rank). Returns (rows, cursor of the next page or None).
+    Raises ValueError on a bad `after` cursor.
+    """
+    position = decode_cursor(search, after) if after else None
+    inventory_snapshot.ensure_fresh()
+    ids, next_position = medicine_index.page(search, page_size(limit), position)
+    return _medicine_rows(ids), encode_cursor(search, next_position) if next_position else None
+
+def _snapshot_medicine_pages(search):
+    position = None
+    while True:
+        ids, position = medicine_index.page(search, MEDICINES_STREAM_PAGE_SIZE, position)
+        yield _medicine_rows(ids)
+        if position is None:
+            return
+
+def _query_medicine_pages(job):
+    for page in job.result(page_size=MEDICINES_STREAM_PAGE_SIZE).pages:
+        yield [dict(row.items()) for row in page]
+
+def iter_medicine_pages(search=''):
+    """
+    Every matching medicine, as an iterator of row lists, for streamed
+    responses: only one page is held in memory at a time. Pages come from
+    the snapshot by keyset; if the snapshot has never loaded, an unfiltered
+    listing streams straight from BigQuery result pages as they arrive.
+    """
+    try:
+        inventory_snapshot.ensure_fresh()
+    except Exception:
+        if normalize(search):
+            raise
+        sql = f"SELECT {', '.join(MEDICINE_LIST_COLUMNS)} FROM `{INVENTORY_TABLE}` ORDER BY name, id"
+        return _query_medicine_pages(bq_client.query(sql))
+    return _snapshot_medicine_pages(search)
+
+def health_status():
+    snapshots = {
+        'inventory_snapshot': inventory_snapshot.health(),
+        'prescription_snapshot': prescription_snapshot.health(),
+    }
+    return {
+        'status': 'degraded' if any(h['stale'] for h in snapshots.values()) else 'ok',
+        **snapshots,
+    }
+
+def parse_medicine_ids(text):
+    """Parses a comma-separated id list ("1,2,3"). Raises ValueError on bad or too many ids."""
+    try:
+        ids = [int(part) for part in text.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of integers')
+    if not ids:
+        raise ValueError('ids is required')
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f'at most {MAX_BATCH_IDS} ids per request')
+    return ids
+
+def _query_medicine_prescriptions(medicine_ids):
+    sql = f"""
+    SELECT medicineId, {', '.join(MEDICINE_PRESCRIPTION_COLUMNS)}
+    FROM `{PRESCRIPTION_TABLE}`
+    WHERE medicineId IN UNNEST(@med_ids)
+    """
+    params = [bigquery.ArrayQueryParameter("med_ids", "INT64", medicine_ids)]
+    job_config = bigquery.QueryJobConfig(query_parameters=params)
+    grouped = {medicine_id: [] for medicine_id in medicine_ids}
+    for row in bq_client.query(sql, job_config=job_config):
+        row = dict(row.items())
+        grouped[row.pop('medicineId')].append(row)
+    return grouped
+
+def _prescriptions_by_medicine(medicine_ids):
+    """
+    Prescriptions for each id, from the index. Falls back to a single
+    `IN UNNEST(@med_ids)` query if the prescriptions snapshot has never loaded;
+    after a failed load, the snapshot isn't retried for PRESCRIPTION_RETRY_SECONDS.
+    """
+    try:
+        prescription_snapshot.ensure_fresh()
+    except Exception:
+        return _query_medicine_prescriptions(medicine_ids)
+    return prescription_index.get_many(medicine_ids)
+
+def medicine_prescriptions(medicine_id):
+    return _prescriptions_by_medicine([medicine_id])[medicine_id]
+
+def medicine_prescriptions_batch(medicine_ids):
+    medicine_ids = list(dict.fromkeys(medicine_ids))
+    grouped = _prescriptions_by_medicine(medicine_ids)
+    return [{'medicineId': i, 'prescriptions': grouped[i]} for i in medicine_ids]
@@ -0,0 +1,52 @@
+"""
+Secondary index of prescriptions grouped by medicine.
+
+Kept in step with the prescriptions TableSnapshot (full rebuild on a full
+reload, per-row updates otherwise), so medicine detail lookups, single or
+batched, are dict reads instead of a BigQuery job per medicine. A
+prescription that moves to another medicine is removed from its old group.
+"""
+import threading
+from typing import Any, Dict, Iterable, List, Sequence
+
+class PrescriptionsByMedicine:
+    def __init__(self, columns: Sequence[str], key: str = "prescriptionId", group_by: str = "medicineId"):
+        self.columns = list(columns)
+        self.key = key
+        self.group_by = group_by
+        self._groups: Dict[Any, Dict[Any, Dict[str, Any]]] = {}
+        self._group_of: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def rebuild(self, rows: Iterable[Dict[str, Any]]) -> None:
+        groups: Dict[Any, Dict[Any, Dict[str, Any]]] = {}
+        group_of: Dict[Any, Any] = {}
+        for row in rows:
+            groups.setdefault(row[self.group_by], {})[row[self.key]] = {c: row.get(c) for c in self.columns}
+            group_of[row[self.key]] = row[self.group_by]
+        with self._lock:
+            self._groups = groups
+            self._group_of = group_of
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        key, group = row[self.key], row[self.group_by]
+        with self._lock:
+            previous = self._group_of.get(key)
+            if previous is not None and previous != group:
+                members = self._groups.get(previous, {})
+                members.pop(key, None)
+                if not members:
+                    self._groups.pop(previous, None)
+            self._groups.setdefault(group, {})[key] = {c: row.get(c) for c in self.columns}
+            self._group_of[key] = group
+
+    def get(self, group: Any) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._groups.get(group, {}).values())
+
+    def get_many(self, groups: Iterable[Any]) -> Dict[Any, List[Dict[str, Any]]]:
+        with self._lock:
+            return {g: list(self._groups.get(g, {}).values()) for g in groups}
+
+    def __len__(self) -> int:
+        return len(self._group_of)
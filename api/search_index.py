@@ -0,0 +1,228 @@
+"""
+In-memory search index over medicine names and generic names.
+
+Names are normalized (case, accents, whitespace) and indexed three ways:
+  * a sorted prefix array of (normalized name, key) pairs for prefix lookups,
+  * an n-gram (1- to 3-character) inverted index for substring lookups,
+  * a name-ordered key list so unfiltered listings come back pre-sorted.
+
+Results are ranked (exact > prefix > word prefix > generic-name prefix >
+substring) and ordered by name within each rank, and can be paged by
+offset or by keyset position (page()). Ranked results for recent
+queries are cached until the next update, so repeated lookups (many clients
+typing the same prefix) are a dict hit. The index is updated in place as
+inventory rows change.
+"""
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+GRAM_SIZE = 3
+RESULT_CACHE_SIZE = 256
+
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_GENERIC_PREFIX = 3
+RANK_SUBSTRING = 4
+RANK_GENERIC_SUBSTRING = 5
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercases, strips accents and collapses whitespace."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+def _grams(text: str, size: int) -> Set[str]:
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def _all_grams(text: str) -> Set[str]:
+    grams = set()
+    for size in range(1, GRAM_SIZE + 1):
+        grams |= _grams(text, size)
+    return grams
+
+class MedicineSearchIndex:
+    def __init__(self):
+        # key -> (normalized name, normalized generic name, sort key)
+        self._docs: Dict[Any, Tuple[str, str, Tuple]] = {}
+        self._grams: Dict[str, Set[Any]] = {}
+        self._prefixes: List[Tuple[str, int, Any]] = []  # (text, 0=name/1=generic, key)
+        self._ordered: List[Tuple[Tuple, Any]] = []       # (sort key, key)
+        self._results: "OrderedDict[str, List[Tuple[int, Tuple, Any]]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # -------------------------
+    # Updates
+    # -------------------------
+    def rebuild(self, rows: Iterable[Dict[str, Any]], key: str = "id") -> None:
+        """Replaces the index contents with `rows` (dicts with key/name/genericName)."""
+        docs, grams, prefixes, ordered = {}, {}, [], []
+        for row in rows:
+            k = row[key]
+            doc = self._make_doc(k, row.get("name"), row.get("genericName"))
+            docs[k] = doc
+            for g in _all_grams(doc[0]) | _all_grams(doc[1]):
+                grams.setdefault(g, set()).add(k)
+            prefixes.append((doc[0], 0, k))
+            if doc[1]:
+                prefixes.append((doc[1], 1, k))
+            ordered.append((doc[2], k))
+        prefixes.sort(key=lambda p: p[:2])
+        ordered.sort(key=lambda o: o[0])
+        with self._lock:
+            self._docs, self._grams, self._prefixes, self._ordered = docs, grams, prefixes, ordered
+            self._results.clear()
+
+    def upsert(self, key: Any, name: Optional[str], generic_name: Optional[str] = None) -> None:
+        with self._lock:
+            self._results.clear()
+            if key in self._docs:
+                self.remove(key)
+            doc = self._make_doc(key, name, generic_name)
+            self._docs[key] = doc
+            for g in _all_grams(doc[0]) | _all_grams(doc[1]):
+                self._grams.setdefault(g, set()).add(key)
+            self._insort_prefix((doc[0], 0, key))
+            if doc[1]:
+                self._insort_prefix((doc[1], 1, key))
+            self._insort_ordered((doc[2], key))
+
+    def remove(self, key: Any) -> None:
+        with self._lock:
+            doc = self._docs.pop(key, None)
+            if doc is None:
+                return
+            self._results.clear()
+            for g in _all_grams(doc[0]) | _all_grams(doc[1]):
+                keys = self._grams.get(g)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._grams[g]
+            self._remove_sorted(self._prefixes, (doc[0], 0), key, lambda p: p[:2], lambda p: p[2])
+            if doc[1]:
+                self._remove_sorted(self._prefixes, (doc[1], 1), key, lambda p: p[:2], lambda p: p[2])
+            self._remove_sorted(self._ordered, doc[2], key, lambda o: o[0], lambda o: o[1])
+
+    @staticmethod
+    def _make_doc(key: Any, name: Optional[str], generic_name: Optional[str]) -> Tuple[str, str, Tuple]:
+        # Mirrors ORDER BY name: NULL names first, then by name, ties broken by key
+        return normalize(name), normalize(generic_name), (name is not None, name or "", str(key))
+
+    def _insort_prefix(self, entry: Tuple[str, int, Any]) -> None:
+        pos = bisect_left(self._prefixes, entry[:2], key=lambda p: p[:2])
+        self._prefixes.insert(pos, entry)
+
+    def _insort_ordered(self, entry: Tuple[Tuple, Any]) -> None:
+        insort(self._ordered, entry, key=lambda o: o[0])
+
+    @staticmethod
+    def _remove_sorted(items: List, sort_key, key, key_of, id_of) -> None:
+        pos = bisect_left(items, sort_key, key=key_of)
+        while pos < len(items) and key_of(items[pos]) == sort_key:
+            if id_of(items[pos]) == key:
+                del items[pos]
+                return
+            pos += 1
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    def _prefix_matches(self, q: str) -> List[Tuple[str, int, Any]]:
+        lo = bisect_left(self._prefixes, (q, -1), key=lambda p: p[:2])
+        hi = bisect_left(self._prefixes, (q + "￿", -1), key=lambda p: p[:2])
+        return self._prefixes[lo:hi]
+
+    def _substring_candidates(self, q: str) -> Set[Any]:
+        size = min(GRAM_SIZE, len(q))
+        postings = sorted((self._grams.get(g, set()) for g in _grams(q, size)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p
+            if not candidates:
+                break
+        return candidates
+
+    def _rank(self, q: str, key: Any) -> Optional[int]:
+        name, generic, _ = self._docs[key]
+        if name == q:
+            return RANK_EXACT
+        if name.startswith(q):
+            return RANK_PREFIX
+        if f" {q}" in name:
+            return RANK_WORD_PREFIX
+        if generic.startswith(q) or f" {q}" in generic:
+            return RANK_GENERIC_PREFIX
+        if q in name:
+            return RANK_SUBSTRING
+        if q in generic:
+            return RANK_GENERIC_SUBSTRING
+        return None
+
+    def _ranked(self, q: str) -> List[Tuple[int, Tuple, Any]]:
+        """(rank, sort key, key) for every match of a normalized, non-empty query, in result order."""
+        ranked = self._results.get(q)
+        if ranked is not None:
+            self._results.move_to_end(q)
+            return ranked
+
+        candidates = self._substring_candidates(q)
+        candidates.update(k for _, _, k in self._prefix_matches(q))
+        ranked = []
+        for k in candidates:
+            rank = self._rank(q, k)
+            if rank is not None:
+                ranked.append((rank, self._docs[k][2], k))
+        ranked.sort(key=lambda r: r[:2])
+
+        self._results[q] = ranked
+        if len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+        return ranked
+
+    def search(self, q: str, limit: Optional[int] = None, offset: int = 0) -> List[Any]:
+        """
+        Returns matching keys, best matches first and ordered by name within a rank.
+        An empty query lists every key in name order.
+        """
+        q = normalize(q)
+        offset = max(0, offset)
+        end = None if limit is None else offset + limit
+        with self._lock:
+            if not q:
+                return [k for _, k in self._ordered[offset:end]]
+            return [k for _, _, k in self._ranked(q)[offset:end]]
+
+    def page(self, q: str, limit: int, after: Optional[Tuple] = None) -> Tuple[List[Any], Optional[Tuple]]:
+        """
+        Keyset version of search(): returns up to `limit` keys following the
+        position `after`, and the position of the last one if more follow.
+
+        Positions are (rank, sort key) tuples, so a page is found by bisection
+        and does not shift when rows before it are added or removed.
+        """
+        q = normalize(q)
+        limit = max(1, limit)
+        with self._lock:
+            if not q:
+                pos = bisect_right(self._ordered, tuple(after[1]), key=lambda o: o[0]) if after else 0
+                window = [(0, sort_key, k) for sort_key, k in self._ordered[pos:pos + limit + 1]]
+            else:
+                ranked = self._ranked(q)
+                pos = bisect_right(ranked, (after[0], tuple(after[1])), key=lambda r: r[:2]) if after else 0
+                window = ranked[pos:pos + limit + 1]
+        keys = [k for _, _, k in window[:limit]]
+        if len(window) <= limit:
+            return keys, None
+        rank, sort_key, _ = window[limit - 1]
+        return keys, (rank, sort_key)
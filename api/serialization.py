@@ -0,0 +1,26 @@
+"""
+JSON encoding shared by the Flask (server.py) and ASGI (asgi_server.py)
+apps, for plain JSON bodies and NDJSON streams alike, so the same rows are
+rendered byte for byte the same way whichever server and format serves
+them (and equal ETags mean equal bodies): dates and times as ISO 8601,
+NUMERIC values as numbers.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, List
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps(data: Any) -> str:
+    return json.dumps(data, default=json_default, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+
+def ndjson(pages: Iterable[List[Any]]) -> Iterator[str]:
+    """One chunk of newline-delimited JSON per page of rows."""
+    for rows in pages:
+        yield ''.join(dumps(row) + '\n' for row in rows)
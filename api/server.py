@@ -1,65 +1,103 @@
-from flask import Flask, jsonify, request
+from urllib.parse import urlencode
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from google.cloud import bigquery
-from google.oauth2 import service_account
+from conditional import ResponseCache, make_etag
+from serialization import dumps, json_default, ndjson
+from pharmacy import (
+    home_summary, list_medicines, medicines_page, iter_medicine_pages, health_status, inventory_version,
+    medicine_prescriptions, medicine_prescriptions_batch, parse_medicine_ids, page_size,
+)
+
+class JSONProvider(DefaultJSONProvider):
+    # jsonify() renders values the way every other route and asgi_server.py do
+    default = staticmethod(json_default)
+    ensure_ascii = False
+    sort_keys = False
 
 app = Flask(__name__)
-CORS(app)
+app.json = JSONProvider(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'Link', 'ETag'])
 
-# BigQuery client setup
-credentials = service_account.Credentials.from_service_account_file(
-    'path/to/your/service-account-file.json'
-)
-bq_client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+# Rendered inventory responses by ETag (route, arguments and inventory data version)
+response_cache = ResponseCache()
+
+def _conditional(key, render):
+    """
+    Responds with render() -> (data, headers) as JSON under an ETag for `key`
+    and the inventory version: 304 if the client has it, else from response_cache.
+    """
+    etag = make_etag(key, inventory_version())
+    status, body, headers = response_cache.respond(
+        etag, request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding'),
+        lambda: _render_json(*render()),
+    )
+    return Response(body, status=status, headers=headers, mimetype='application/json')
+
+def _render_json(data, headers=None):
+    return dumps(data).encode(), headers or {}
+
+def _wants_ndjson():
+    return request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+def _next_url(cursor):
+    return request.path + '?' + urlencode({**request.args.to_dict(), 'after': cursor})
 
 # Route: Pharmacy home summary
 @app.route('/api/pharmacy/home')
 def pharmacy_home():
-    query = """
-    SELECT 
-        SUM(currentStock) AS total_medicines,
-        COUNTIF(currentStock < minThreshold) AS low_stock_items
-    FROM `med-ease-473410.MedEase.inventory`
-    """
-    row = list(bq_client.query(query))[0]
-    return jsonify({k: row[k] for k in row.keys()})
+    return _conditional(('home',), lambda: (home_summary(), None))
 
-# Route: List of medicines, optional search
+# Route: List of medicines, optional search (q). The whole listing by default;
+# paged by cursor (after=, next cursor in X-Next-Cursor / Link) or by offset when
+# limit, after or offset is given; or streamed in full as NDJSON
 @app.route('/api/medicines')
 def get_medicines():
-    search = request.args.get('q', '').lower()
-    
-    sql = """
-    SELECT id, name, currentStock, expirationDate, costPerUnit, location
-    FROM `med-ease-473410.MedEase.inventory`
-    """
-    
-    params = []
-    if search:
-        sql += " WHERE LOWER(name) LIKE @search"
-        params.append(bigquery.ScalarQueryParameter("search", "STRING", f"%{search}%"))
-    
-    sql += " ORDER BY name"
-    
-    job_config = bigquery.QueryJobConfig(query_parameters=params)
-    rows = bq_client.query(sql, job_config=job_config)
-    
-    data = [dict(row.items()) for row in rows]
-    return jsonify(data)
+    search = request.args.get('q', '')
+    limit = request.args.get('limit', type=int)
+    if _wants_ndjson():
+        return Response(stream_with_context(ndjson(iter_medicine_pages(search))), mimetype='application/x-ndjson')
+    if not ({'limit', 'offset', 'after'} & request.args.keys()):
+        # Unpaged callers keep getting the whole listing
+        return _conditional(('medicines_all', search), lambda: (list_medicines(search), None))
+    if 'offset' in request.args:
+        offset = request.args.get('offset', 0, type=int)
+        return _conditional(
+            ('medicines', search, page_size(limit), offset),
+            lambda: (list_medicines(search, page_size(limit), offset), None),
+        )
+    after = request.args.get('after')
+
+    def render():
+        rows, cursor = medicines_page(search, limit, after)
+        headers = {'X-Next-Cursor': cursor, 'Link': f'<{_next_url(cursor)}>; rel="next"'} if cursor else None
+        return rows, headers
+
+    try:
+        return _conditional(('medicines_page', search, page_size(limit), after), render)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# Route: Snapshot health
+@app.route('/api/health')
+def health():
+    status = health_status()
+    status['response_cache'] = response_cache.stats()
+    return jsonify(status)
 
 # Route: Medicine details by ID
 @app.route('/api/medicine/<int:medicine_id>')
 def medicine_details(medicine_id):
-    sql = """
-    SELECT status, prescriptionId, patientId, doctorId
-    FROM `med-ease-473410.MedEase.prescription`
-    WHERE medicineId = @med_id
-    """
-    params = [bigquery.ScalarQueryParameter("med_id", "INT64", medicine_id)]
-    job_config = bigquery.QueryJobConfig(query_parameters=params)
-    rows = bq_client.query(sql, job_config=job_config)
-    data = [dict(row.items()) for row in rows]
-    return jsonify(data)
+    return jsonify(medicine_prescriptions(medicine_id))
+
+# Route: Prescriptions for many medicines at once (?ids=1,2,3)
+@app.route('/api/medicines/details')
+def medicines_details():
+    try:
+        ids = parse_medicine_ids(request.args.get('ids', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(medicine_prescriptions_batch(ids))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080)
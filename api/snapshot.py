@@ -0,0 +1,261 @@
+"""
+In-memory, column-oriented snapshots of BigQuery tables.
+
+A TableSnapshot loads a table once and then refreshes incrementally in the
+background by pulling only rows whose watermark column (updated_at) is at or
+past the last value seen; a table without one is fully reloaded instead. Routes read from the snapshot instead of scanning
+the table on every request. A refresh builds new column lists and swaps them
+in, so lists already handed to readers are never modified.
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+_DIGEST_MOD = 1 << 64
+
+def _row_digest(values: Sequence[Any]) -> int:
+    """Stable (not per-process salted) 64-bit digest of a row's values; summed, order doesn't matter."""
+    return int.from_bytes(hashlib.blake2b(repr(tuple(values)).encode(), digest_size=8).digest(), "big")
+
+class TableSnapshot:
+    def __init__(
+        self,
+        client: bigquery.Client,
+        table: str,
+        columns: Sequence[str],
+        key: str = "id",
+        watermark_column: Optional[str] = "updated_at",
+        refresh_interval: float = 30.0,
+        max_staleness: float = 120.0,
+        full_reload_interval: float = 3600.0,
+        retry_interval: float = 30.0,
+    ):
+        self.client = client
+        self.table = table
+        self.key = key
+        self.watermark_column = watermark_column
+        self.column_names = list(dict.fromkeys([key, *columns, *([watermark_column] if watermark_column else [])]))
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.full_reload_interval = full_reload_interval
+        self.retry_interval = retry_interval
+
+        self.columns: Dict[str, List[Any]] = {c: [] for c in self.column_names}
+        self.watermark = None
+        self.version = 0
+        self._data_version: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._positions: Dict[Any, int] = {}
+        self._digest = 0  # sum of the rows' content digests, see _row_digest
+        self._loaded_at: Optional[float] = None
+        self._full_loaded_at: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._listeners: List[Callable[[List[Dict[str, Any]], bool], None]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------
+    # Refresh
+    # -------------------------
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]], bool], None]) -> None:
+        """Registers `listener(changed_rows, full_reload)`, called after each refresh that changes data."""
+        self._listeners.append(listener)
+
+    def refresh(self, full: bool = False) -> int:
+        """
+        Pulls new and updated rows from BigQuery. Returns the number of rows that changed.
+        A full reload replaces the snapshot (and so also drops deleted rows).
+        Without a watermark column every refresh is a full reload.
+        """
+        with self._refresh_lock:
+            full = full or not self.watermark_column or self.watermark is None
+            sql = f"SELECT {', '.join(self.column_names)} FROM `{self.table}`"
+            params = []
+            if not full:
+                sql += f" WHERE {self.watermark_column} >= @watermark"
+                params.append(bigquery.ScalarQueryParameter("watermark", "TIMESTAMP", self.watermark))
+            job_config = bigquery.QueryJobConfig(query_parameters=params)
+            try:
+                rows = [dict(row.items()) for row in self.client.query(sql, job_config=job_config).result()]
+            except Exception as e:
+                self.last_error = str(e)
+                self._failed_at = time.monotonic()
+                logger.warning("refresh of %s failed: %s", self.table, e)
+                raise
+
+            # Copy-on-write: rows are applied to copies, which then replace the
+            # published lists, so readers holding the old lists never see a partial update.
+            # Rows already present unchanged (the watermark query repeats the newest ones) cost no copy
+            if not full:
+                rows = [row for row in rows if not self._is_current(row)]
+            if full:
+                columns, positions, digest = {c: [] for c in self.column_names}, {}, 0
+            elif rows:
+                columns = {c: list(values) for c, values in self.columns.items()}
+                positions, digest = dict(self._positions), self._digest
+            else:
+                columns, positions, digest = self.columns, self._positions, self._digest
+            # Published together with the columns, so a reader never sees a
+            # watermark ahead of the data it describes
+            watermark = None if full else self.watermark
+            changed = []
+            for row in rows:
+                mark = row.get(self.watermark_column) if self.watermark_column else None
+                if mark is not None and (watermark is None or mark > watermark):
+                    watermark = mark
+                pos = positions.get(row[self.key])
+                previous = 0 if pos is None else _row_digest([columns[c][pos] for c in self.column_names])
+                if self._upsert(row, columns, positions):
+                    digest = (digest - previous + _row_digest([row.get(c) for c in self.column_names])) % _DIGEST_MOD
+                    changed.append(row)
+
+            now = time.monotonic()
+            with self._lock:
+                if changed or full:
+                    self.columns, self._positions, self._digest = columns, positions, digest
+                    self.watermark = watermark
+                    self.version += 1
+                if full:
+                    self._full_loaded_at = now
+                self._loaded_at = now
+                self.last_error = None
+                self._failed_at = None
+
+            if changed or full:
+                for listener in self._listeners:
+                    listener(changed, full)
+                with self._lock:
+                    mark = self.watermark.isoformat() if hasattr(self.watermark, "isoformat") else self.watermark
+                    self._data_version = f"{mark}/{len(self._positions)}/{self._digest:016x}"
+            return len(changed)
+
+    def _is_current(self, row: Dict[str, Any]) -> bool:
+        """True if the published snapshot already holds `row` unchanged."""
+        pos = self._positions.get(row[self.key])
+        return pos is not None and all(self.columns[c][pos] == row.get(c) for c in self.column_names)
+
+    def _upsert(self, row: Dict[str, Any], columns: Dict[str, List[Any]], positions: Dict[Any, int]) -> bool:
+        """
+        Inserts or updates one row in `columns`/`positions` (unpublished copies);
+        returns False if it was already present unchanged.
+        """
+        pos = positions.get(row[self.key])
+        if pos is None:
+            positions[row[self.key]] = len(columns[self.key])
+            for c in self.column_names:
+                columns[c].append(row.get(c))
+            return True
+        if all(columns[c][pos] == row.get(c) for c in self.column_names):
+            return False
+        for c in self.column_names:
+            columns[c][pos] = row.get(c)
+        return True
+
+    def ensure_fresh(self) -> None:
+        """
+        Refreshes synchronously if the snapshot is older than the staleness bound.
+        If a refresh fails but an older snapshot exists, the old data keeps being served.
+        After a failed refresh, requests don't refresh again for retry_interval
+        seconds (the background thread keeps retrying); until the first load
+        succeeds they raise instead, so callers can fall back without waiting
+        on another failing query.
+        """
+        age = self.age_seconds()
+        if age is None or age > self.max_staleness:
+            failed_at = self._failed_at
+            if failed_at is not None and time.monotonic() - failed_at < self.retry_interval:
+                if age is None:
+                    raise RuntimeError(f"snapshot of {self.table} is unavailable: {self.last_error}")
+                return
+            try:
+                self.refresh()
+            except Exception:
+                if age is None:
+                    raise
+
+    def start(self) -> None:
+        """Starts the background refresh thread (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f"snapshot:{self.table}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            full = (
+                self._full_loaded_at is None
+                or time.monotonic() - self._full_loaded_at > self.full_reload_interval
+            )
+            try:
+                self.refresh(full=full)
+            except Exception:
+                pass  # already recorded in last_error; retry on the next tick
+            time.sleep(self.refresh_interval)
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    def age_seconds(self) -> Optional[float]:
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def health(self) -> Dict[str, Any]:
+        age = self.age_seconds()
+        return {
+            "table": self.table,
+            "rows": len(self._positions),
+            "version": self.version,
+            "data_version": self._data_version,
+            "age_seconds": None if age is None else round(age, 3),
+            "max_staleness_seconds": self.max_staleness,
+            "stale": age is None or age > self.max_staleness,
+            "watermark": self.watermark.isoformat() if hasattr(self.watermark, "isoformat") else self.watermark,
+            "last_error": self.last_error,
+        }
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def data_version(self) -> Optional[str]:
+        """
+        Version of the snapshot's data: its max updated_at, row count and a
+        digest of every row's values, or None before the first load. Any change
+        to a row changes it, even one that leaves updated_at behind the max.
+        It only depends on the table contents, so
+        every instance serving the same data reports the same version. It
+        changes after listeners have seen the new data, so anything derived
+        from the snapshot (e.g. a search index) is current for that version.
+        """
+        return self._data_version
+
+    def column_view(self, *names: str) -> List[List[Any]]:
+        """
+        Returns the named column lists from a consistent view of the snapshot
+        (do not mutate). Refreshes replace the lists rather than changing them,
+        so the view stays consistent after later refreshes.
+        """
+        with self._lock:
+            return [self.columns[c] for c in names]
+
+    def get(self, key: Any, columns: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        columns = columns or self.column_names
+        with self._lock:
+            pos = self._positions.get(key)
+            if pos is None:
+                return None
+            return {c: self.columns[c][pos] for c in columns}
+
+    def iter_rows(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yields rows as dicts from a consistent view of the snapshot."""
+        columns = columns or self.column_names
+        data = self.column_view(*columns)
+        for values in zip(*data):
+            yield dict(zip(columns, values))
@@ -3,6 +3,7 @@ import { ThemedText } from '@/components/themed-text';
 import { ThemedView } from '@/components/themed-view';
 import { Fonts } from '@/constants/theme';
 import Constants from 'expo-constants';
+import { fetch } from 'expo/fetch';
 import { Image } from 'expo-image';
 import React, { useEffect, useRef, useState } from 'react';
 import { Button, KeyboardAvoidingView, Platform, ScrollView, StyleSheet, TextInput } from 'react-native';
@@ -57,6 +58,7 @@ export default function ChatScreen() {
             question,
             user_id: 'demo-user',
             session_id: 'demo-session',
+            stream: 'ndjson',
           }),
           headers: { 
             'Content-Type': 'application/json',
@@ -68,25 +70,42 @@ export default function ChatScreen() {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      // Handle as regular response (no streaming)
-      const responseText = await response.text();
-      const lines = responseText.split('\n');
+      // Read the ndjson stream as it arrives, one frame per line
+      const reader = response.body?.getReader();
+      if (!reader) {
+        throw new Error('Response body is not readable');
+      }
+      const decoder = new TextDecoder();
+      let buffered = '';
       let fullContent = '';
+      let streamError: string | null = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        buffered += done ? decoder.decode() : decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        // Keep a trailing partial line until the rest of it arrives
+        buffered = done ? '' : lines.pop() ?? '';
 
-      for (const line of lines) {
-        const trimmedLine = line.trim();
-        if (trimmedLine) {
-          const chunk = parseResponseLine(trimmedLine);
-          if (chunk) {
-            fullContent += chunk;
+        for (const line of lines) {
+          const trimmedLine = line.trim();
+          if (!trimmedLine) continue;
+          const frame = parseResponseLine(trimmedLine);
+          if (frame.error) {
+            streamError = frame.error;
+          } else if (frame.text) {
+            fullContent += frame.text;
             updateMessageContent(assistantIndex, fullContent);
           }
         }
+        if (done) break;
       }
 
-      // If no structured content found, treat the whole response as the message
-      if (!fullContent.trim()) {
-        updateMessageContent(assistantIndex, responseText);
+      if (streamError) {
+        const notice = `Sorry, the assistant ran into a problem: ${streamError}`;
+        updateMessageContent(assistantIndex, fullContent ? `${fullContent}\n\n${notice}` : notice);
+      } else if (!fullContent.trim()) {
+        updateMessageContent(assistantIndex, "The assistant didn't return an answer. Please try again.");
       }
 
     } catch (error) {
@@ -104,9 +123,16 @@ export default function ChatScreen() {
     }
   };
 
-  const parseResponseLine = (line: string): string => {
+  // One ndjson line: answer text to append, or the error the stream ended with
+  const parseResponseLine = (line: string): { text?: string; error?: string } => {
     try {
-      const event = JSON.parse(line);      
+      const event = JSON.parse(line);
+      // Compact ndjson stream: only answer text deltas carry content; "end" and
+      // tool/thought frames are not shown
+      if (typeof event.t === 'string') {
+        if (event.t === 'error') return { error: event.d ?? 'unknown error' };
+        return event.t === 'text' ? { text: event.d ?? '' } : {};
+      }
       if (event.content?.parts && Array.isArray(event.content.parts)) {
         let extractedText = '';
         
@@ -117,11 +143,12 @@ export default function ChatScreen() {
           }
         }
         
-        return extractedText;
+        return { text: extractedText };
       }
-      return '';
+      return {};
     } catch (parseError) {
       console.warn('Failed to parse line as JSON:', line, parseError);
+      return {};
     }
   };
 
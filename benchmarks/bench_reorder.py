@@ -0,0 +1,116 @@
+"""
+Times the reorder planner on a synthetic inventory of N SKUs, each stocked
+in --lots-per-sku lots (inventory rows).
+
+Reports the vectorized plan time (compute_reorder_plan over column arrays),
+the one-off cost of converting query rows to columns, and, for reference, a
+straightforward row-by-row Python loop computing the same totals.
+
+Usage:
+    python benchmarks/bench_reorder.py [--skus 1000000] [--lots-per-sku 2] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "medease-agent"))
+
+from reorder import columns_from_rows, compute_reorder_plan  # noqa: E402
+
+SUPPLIERS = ["McKesson", "Cardinal Health", "AmerisourceBergen", "Henry Schein", "Morris & Dickson", None]
+
+def synthetic_columns(n: int, lots_per_sku: int = 2, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(date.today(), "D")
+    n_lots = n * lots_per_sku
+    min_threshold = rng.integers(10, 100, n)
+    lot_stock = rng.integers(0, 300 // lots_per_sku + 1, n_lots)
+    lot_sku = np.arange(n_lots) // lots_per_sku
+    suppliers = np.array(sorted(s or "(none)" for s in SUPPLIERS), dtype=object)
+    return {
+        "lot_sku": lot_sku,
+        "lot_stock": lot_stock,
+        "lot_expiration": today + rng.integers(-30, 720, n_lots).astype("timedelta64[D]"),
+        "id": np.arange(n).astype(str).astype(object),
+        "name": np.array([f"Medicine {i}" for i in range(n)], dtype=object),
+        "ndc": np.array([f"{i // 10000:05d}-{i % 10000:04d}" for i in range(n)], dtype=object),
+        "lots": np.bincount(lot_sku, minlength=n),
+        "supplier_code": rng.integers(0, len(suppliers), n).astype(np.int32),
+        "suppliers": suppliers,
+        "currentStock": np.bincount(lot_sku, weights=lot_stock, minlength=n).astype(np.int64),
+        "minThreshold": min_threshold,
+        "maxStock": min_threshold * rng.integers(3, 8, n),
+        "costPerUnit": rng.uniform(0.05, 40.0, n).round(2),
+        "needsReorder": rng.random(n) < 0.05,
+    }
+
+def rows_from_columns(columns, n_lots):
+    rows = []
+    for lot in range(n_lots):
+        i = columns["lot_sku"][lot]
+        rows.append({
+            "id": f"{columns['id'][i]}-{lot}", "name": columns["name"][i], "ndc": columns["ndc"][i],
+            "supplier": columns["suppliers"][columns["supplier_code"][i]],
+            "currentStock": int(columns["lot_stock"][lot]), "minThreshold": int(columns["minThreshold"][i]),
+            "maxStock": int(columns["maxStock"][i]), "costPerUnit": float(columns["costPerUnit"][i]),
+            "expirationDate": str(columns["lot_expiration"][lot]), "needsReorder": bool(columns["needsReorder"][i]),
+        })
+    return rows
+
+def row_loop_plan(rows, expiry_buffer_days=30):
+    cutoff = (date.today() + timedelta(days=expiry_buffer_days)).isoformat()
+    skus = {}
+    for r in rows:
+        sku = skus.setdefault(r["ndc"], {**r, "usable": 0, "needsReorder": False})
+        if r["expirationDate"] > cutoff:
+            sku["usable"] += r["currentStock"]
+        sku["needsReorder"] = sku["needsReorder"] or r["needsReorder"]
+    totals = {}
+    for sku in skus.values():
+        usable = sku["usable"]
+        if usable < sku["minThreshold"] or sku["needsReorder"]:
+            quantity = max(max(sku["maxStock"], sku["minThreshold"]) - usable, 0)
+            if quantity:
+                entry = totals.setdefault(sku["supplier"], [0, 0.0])
+                entry[0] += quantity
+                entry[1] += quantity * sku["costPerUnit"]
+    return totals
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Reorder planner benchmark")
+    parser.add_argument("--skus", type=int, default=1_000_000)
+    parser.add_argument("--lots-per-sku", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--row-sample", type=int, default=100_000, help="rows for the load and row-loop timings")
+    args = parser.parse_args()
+
+    columns = synthetic_columns(args.skus, args.lots_per_sku)
+    plan, ms = timed(lambda: compute_reorder_plan(columns, limit=25), args.repeat)
+    n_lots = args.skus * args.lots_per_sku
+    print(f"vectorized plan, {args.skus:,} SKUs in {n_lots:,} lots: {ms:.1f} ms median "
+          f"({plan['total_units']:,} units, ${plan['total_cost']:,.2f}, {len(plan['suppliers'])} suppliers)")
+    plan, ms = timed(lambda: compute_reorder_plan(columns, supplier="McKesson", limit=25), args.repeat)
+    print(f"vectorized plan, one supplier:      {ms:.1f} ms median")
+
+    n = min(args.row_sample, n_lots)
+    rows = rows_from_columns(columns, n)
+    _, ms = timed(lambda: columns_from_rows(rows), 1)
+    print(f"rows -> columns load, {n:,} rows:   {ms:.0f} ms ({ms * n_lots / n / 1000:.1f} s projected for {n_lots:,})")
+    _, ms = timed(lambda: row_loop_plan(rows), 1)
+    print(f"row-by-row Python loop, {n:,} rows: {ms:.0f} ms ({ms * n_lots / n / 1000:.1f} s projected for {n_lots:,})")
+
+if __name__ == "__main__":
+    main()
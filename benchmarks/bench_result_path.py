@@ -0,0 +1,135 @@
+"""
+Compares the legacy DataFrame/JSON result path of query_bigquery_context with
+the row-streaming query_rows path for a synthetic inventory result set.
+
+The BigQuery client is replaced by an in-process fake that serves rows in
+pages the way RowIterator does, so the numbers isolate result handling from
+network time.
+
+Usage:
+    python benchmarks/bench_result_path.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "medease-agent"))
+
+import clients  # noqa: E402
+
+PAGE_SIZE = 1000
+
+class FakeRow:
+    def __init__(self, names, values):
+        self._names = names
+        self._values = values
+
+    def keys(self):
+        return iter(self._names)
+
+    def values(self):
+        return self._values
+
+    def items(self):
+        return zip(self._names, self._values)
+
+class FakeRowIterator:
+    def __init__(self, names, rows):
+        self._names = names
+        self._rows = rows
+
+    @property
+    def pages(self):
+        for start in range(0, len(self._rows), PAGE_SIZE):
+            yield [FakeRow(self._names, r) for r in self._rows[start:start + PAGE_SIZE]]
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame.from_records(self._rows, columns=self._names)
+
+class FakeClient:
+    def __init__(self, names, rows):
+        self._names = names
+        self._rows = rows
+
+    def query_and_wait(self, sql_query, job_config=None):
+        return FakeRowIterator(self._names, self._rows)
+
+def make_inventory_rows(n):
+    names = [
+        "id", "name", "genericName", "ndc", "currentStock", "minThreshold", "maxStock",
+        "lastReorder", "needsReorder", "supplier", "costPerUnit", "expirationDate",
+        "lotNumber", "location", "created_at", "updated_at",
+    ]
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(n):
+        rows.append((
+            f"med-{i}", f"Medicine {i}", f"Generic {i % 500}", f"{i:05d}-{i % 9999:04d}",
+            i % 300, 50, 400, date(2024, 12, 1) + timedelta(days=i % 30), i % 300 < 50,
+            f"Supplier {i % 12}", Decimal(f"{i % 97}.{i % 100:02d}"),
+            date(2025, 6, 1) + timedelta(days=i % 365), f"LOT{i:07d}", f"Aisle {i % 40}",
+            now, now + timedelta(minutes=i),
+        ))
+    return names, rows
+
+def legacy_path(client):
+    """The pre-streaming path: to_dataframe -> to_dict -> json_safe -> dumps -> loads."""
+    import pandas as pd
+    df = client.query_and_wait("SELECT").to_dataframe()
+    records = df.to_dict(orient="records")
+    safe = [
+        {k: (v.isoformat() if isinstance(v, (datetime, date, pd.Timestamp))
+             else float(v) if isinstance(v, Decimal) else v)
+         for k, v in row.items()}
+        for row in records
+    ]
+    return json.loads(json.dumps(safe))
+
+def streaming_path(client):
+    clients.invalidate_query_cache()
+    return clients.query_rows("SELECT")
+
+def measure(fn, client, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(client)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(client)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    names, rows = make_inventory_rows(args.rows)
+    client = FakeClient(names, rows)
+    clients._bq_client = client
+
+    paths = [("query_rows (streaming)", streaming_path)]
+    # Checked without importing it; only the legacy path itself loads pandas
+    if importlib.util.find_spec("pandas") is not None:
+        paths.insert(0, ("legacy (pandas + json)", legacy_path))
+    else:
+        print("pandas not installed; skipping the legacy path")
+
+    print(f"{args.rows} rows, median of {args.repeat} runs")
+    for label, fn in paths:
+        seconds, peak = measure(fn, client, args.repeat)
+        print(f"{label:<26} {seconds * 1000:9.1f} ms   peak {peak / 1024 / 1024:8.1f} MiB")
+
+if __name__ == "__main__":
+    main()
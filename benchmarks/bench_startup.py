@@ -0,0 +1,122 @@
+"""
+Measures cold start of the medease-agent service: the time from spawning
+uvicorn to the first HTTP response, and (with the startup warm-up) to the
+agent being loaded and ready. Each trial is a fresh process, so the numbers
+include interpreter start and every import, as on a scale-from-zero start.
+
+`--importtime` also prints the slowest imports of `import app` (from
+python -X importtime), which is the profile to check when startup regresses.
+
+The first response is any HTTP status from GET /healthz, so the same script
+can be pointed at an older tree without the route for a before/after number.
+
+Usage:
+    python benchmarks/bench_startup.py [--trials 5] [--importtime] [--top 15]
+    python benchmarks/bench_startup.py --no-warmup
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "medease-agent")
+IMPORT_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def get_health(port: int):
+    """Returns the parsed /healthz body, {} for any other HTTP response, or None if nothing answered."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1) as response:
+            return json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError:
+        return {}
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+def trial(python: str, warmup: bool, timeout: float) -> dict:
+    port = free_port()
+    env = dict(os.environ, AGENT_WARMUP="1" if warmup else "0")
+    env.setdefault("GOOGLE_CLOUD_PROJECT", "bench")
+    env.setdefault("BQ_DATASET_ID", "medease")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [python, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=AGENT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    first_byte = ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            health = get_health(port)
+            now = time.perf_counter() - start
+            if health is not None and first_byte is None:
+                first_byte = now
+            if health is not None and (health.get("ready") or "ready" not in health):
+                # Older trees have no readiness flag; they are ready once they answer
+                ready = now
+                break
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {"first_byte_s": first_byte, "ready_s": ready}
+
+def import_profile(python: str, module: str, top: int) -> None:
+    env = dict(os.environ, AGENT_WARMUP="0")
+    env.setdefault("GOOGLE_CLOUD_PROJECT", "bench")
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=AGENT_DIR, env=env, capture_output=True, text=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(cumulative_us), int(self_us), len(indent) // 2, name))
+    total = next((e for e in reversed(entries) if e[3] == module), None)
+    if total:
+        print(f"\nimport {module}: {total[0] / 1000:.0f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, depth, name in sorted(entries, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:8.1f}  {'  ' * depth}{name}")
+
+def fmt(values) -> str:
+    values = [v for v in values if v is not None]
+    if not values:
+        return "n/a"
+    return f"median {statistics.median(values) * 1000:.0f} ms (min {min(values) * 1000:.0f}, max {max(values) * 1000:.0f})"
+
+def main():
+    parser = argparse.ArgumentParser(description="medease-agent cold-start benchmark")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--python", default=sys.executable, help="interpreter with the service's dependencies")
+    parser.add_argument("--no-warmup", action="store_true", help="start with AGENT_WARMUP=0")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for each server")
+    parser.add_argument("--importtime", action="store_true", help="print the slowest imports of `import app`")
+    parser.add_argument("--module", default="app", help="module to profile with --importtime")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    results = [trial(args.python, not args.no_warmup, args.timeout) for _ in range(args.trials)]
+    print(f"{args.trials} cold starts, warm-up {'off' if args.no_warmup else 'on'}")
+    print(f"  first byte: {fmt(r['first_byte_s'] for r in results)}")
+    print(f"  ready:      {fmt(r['ready_s'] for r in results)}")
+
+    if args.importtime:
+        import_profile(args.python, args.module, args.top)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compares the full-event stream of /agent/respond with the compact ndjson/sse
+formats for a representative agent turn (thought, one check_inventory call
+returning 50 rows, and a ~200-word answer).
+
+Reports response bytes and an estimated time to the first answer byte on a
+slow mobile link. The full format is produced without model streaming (as
+the endpoint does), so its answer text only exists once the whole answer is
+generated. The compact formats stream the answer in chunks.
+
+Usage:
+    python benchmarks/bench_stream_format.py [--kbps 400] [--tokens-per-second 60]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "medease-agent"))
+
+from google.adk.events import Event  # noqa: E402
+from google.genai.types import Content, FunctionCall, FunctionResponse, Part  # noqa: E402
+
+from streaming import CompactEventEncoder, encode  # noqa: E402
+
+AUTHOR = "pharmacy_assistant"
+THOUGHT = "The user wants low-stock items, so I should query inventory where currentStock is below minThreshold. " * 3
+ANSWER_WORDS = ("Amoxicillin 500 mg is below its minimum threshold and should be reordered from McKesson. " * 15).split()
+CHUNK_WORDS = 8
+
+def inventory_rows(n=50):
+    return [
+        {
+            "id": f"med-{i}", "name": f"Medicine {i}", "genericName": f"Generic {i}",
+            "ndc": f"{i:05d}-0001", "currentStock": i, "minThreshold": 60, "maxStock": 400,
+            "lastReorder": "2025-01-01", "needsReorder": True, "supplier": "McKesson",
+            "costPerUnit": 1.25, "expirationDate": "2026-01-01", "lotNumber": f"LOT{i:06d}",
+            "location": "Aisle 3", "created_at": "2024-01-01T00:00:00+00:00",
+            "updated_at": "2025-01-01T00:00:00+00:00",
+        }
+        for i in range(n)
+    ]
+
+def tool_events():
+    call = Event(author=AUTHOR, content=Content(role="model", parts=[
+        Part(text=THOUGHT, thought=True),
+        Part(function_call=FunctionCall(name="check_inventory", args={"filters": {"needsReorder": True}})),
+    ]))
+    response = Event(author=AUTHOR, content=Content(role="user", parts=[
+        Part(function_response=FunctionResponse(name="check_inventory", response={"result": inventory_rows()})),
+    ]))
+    return [call, response]
+
+def full_events():
+    answer = " ".join(ANSWER_WORDS)
+    return tool_events() + [Event(author=AUTHOR, content=Content(role="model", parts=[Part(text=answer)]))]
+
+def streamed_events():
+    events = tool_events()
+    for i in range(0, len(ANSWER_WORDS), CHUNK_WORDS):
+        chunk = " ".join(ANSWER_WORDS[i:i + CHUNK_WORDS]) + " "
+        events.append(Event(author=AUTHOR, partial=True, content=Content(role="model", parts=[Part(text=chunk)])))
+    events.append(Event(author=AUTHOR, content=Content(role="model", parts=[Part(text=" ".join(ANSWER_WORDS))])))
+    return events
+
+def full_stream():
+    return [(e, e.model_dump_json() + "\n") for e in full_events()]
+
+def compact_stream(stream_format, include_thoughts=False):
+    encoder = CompactEventEncoder(include_thoughts=include_thoughts)
+    out = []
+    for e in streamed_events():
+        out.append((e, "".join(encode(m, stream_format) for m in encoder.messages(e))))
+    out.append((None, encode({"t": "end"}, stream_format)))
+    return out
+
+def first_text_offset(stream, is_text):
+    """Bytes sent before (and including) the first chunk that carries answer text."""
+    sent = 0
+    for event, chunk in stream:
+        sent += len(chunk.encode())
+        if event is not None and is_text(event, chunk):
+            return sent
+    return sent
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /agent/respond stream formats")
+    parser.add_argument("--kbps", type=float, default=400.0, help="link bandwidth in kilobits per second")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="model output rate")
+    args = parser.parse_args()
+
+    answer_tokens = len(ANSWER_WORDS) * 1.3
+    first_chunk_tokens = CHUNK_WORDS * 1.3
+    bytes_per_second = args.kbps * 1000 / 8
+
+    def has_answer_text(event, chunk):
+        parts = event.content.parts if event.content and event.content.parts else []
+        return any(p.text and not p.thought for p in parts) and chunk
+
+    rows = []
+    full = full_stream()
+    rows.append(("events (current)", full, answer_tokens))
+    for fmt in ("ndjson", "sse"):
+        rows.append((fmt, compact_stream(fmt), first_chunk_tokens))
+    rows.append(("ndjson + thoughts", compact_stream("ndjson", include_thoughts=True), first_chunk_tokens))
+
+    print(f"link {args.kbps:.0f} kbit/s, model {args.tokens_per_second:.0f} tokens/s")
+    print(f"{'format':<20} {'bytes':>9} {'first text @':>13} {'est. first text':>16}")
+    for label, stream, gen_tokens in rows:
+        total = sum(len(chunk.encode()) for _, chunk in stream)
+        offset = first_text_offset(stream, has_answer_text)
+        seconds = gen_tokens / args.tokens_per_second + offset / bytes_per_second
+        print(f"{label:<20} {total:>9} {offset:>12}B {seconds:>15.2f}s")
+
+if __name__ == "__main__":
+    main()
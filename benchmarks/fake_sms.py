@@ -0,0 +1,83 @@
+"""
+Local stand-in for the Twilio Messages API.
+
+Accepts POST /2010-04-01/Accounts/<sid>/Messages.json like Twilio does,
+records every message, and can inject latency and transient 429/503
+failures. Point TWILIO_API_BASE at `server.url` to use it.
+
+    with FakeSmsServer(latency=0.05, fail_every=5) as server:
+        os.environ["TWILIO_API_BASE"] = server.url
+        ...
+        print(len(server.messages))
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+class FakeSmsServer:
+    def __init__(self, latency: float = 0.0, fail_every: int = 0, fail_status: int = 429, port: int = 0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.fail_status = fail_status
+        self.messages = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                time.sleep(server.latency)
+                with server._lock:
+                    server.requests += 1
+                    fail = server.fail_every and server.requests % server.fail_every == 0
+                    if not fail:
+                        sid = "SM" + uuid.uuid4().hex
+                        server.messages.append({"sid": sid, **form})
+                if fail:
+                    self._reply(server.fail_status, {"code": 20429, "message": "Too Many Requests"})
+                elif not self.path.endswith("/Messages.json") or "To" not in form:
+                    self._reply(400, {"code": 21604, "message": "A 'To' phone number is required."})
+                else:
+                    self._reply(201, {"sid": sid, "to": form["To"], "from": form.get("From"), "status": "queued"})
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeSmsServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeSmsServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
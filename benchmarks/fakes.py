@@ -0,0 +1,394 @@
+"""
+Local stand-ins for BigQuery and Gemini used by the offline benchmarks.
+
+FakeBigQueryClient answers the queries the API and agent tools issue from an
+in-memory SQLite database loaded with synthetic rows that follow the MedEase
+schemas. It supports named scalar/array parameters, COUNTIF, dry runs and
+RowIterator-style pages, with optional injected latency per query.
+
+FakeLlm is a scripted ADK model: it answers each question with tool calls
+picked from keywords in the question (one per model turn, and only tools the
+calling agent has), then summarizes the tool results.
+"""
+import asyncio
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence
+
+from schemas import INVENTORY_COLUMN_TYPES, PRESCRIPTIONS_COLUMN_TYPES, USERS_COLUMN_TYPES
+
+# The pharmacy API's prescription table (api/pharmacy.py) has its own shape
+API_PRESCRIPTION_COLUMN_TYPES = {
+    "prescriptionId": "STRING",
+    "medicineId": "INTEGER",
+    "patientId": "STRING",
+    "doctorId": "STRING",
+    "status": "STRING",
+    "updated_at": "TIMESTAMP",
+}
+
+TABLE_SCHEMAS = {
+    "inventory": INVENTORY_COLUMN_TYPES,
+    "prescriptions": PRESCRIPTIONS_COLUMN_TYPES,
+    "users": USERS_COLUMN_TYPES,
+    "prescription": API_PRESCRIPTION_COLUMN_TYPES,
+}
+
+SUPPLIERS = ["McKesson", "Cardinal Health", "AmerisourceBergen", "Henry Schein", "Morris & Dickson"]
+DRUGS = ["Amoxicillin", "Lisinopril", "Metformin", "Atorvastatin", "Ibuprofen", "Omeprazole",
+         "Amlodipine", "Sertraline", "Levothyroxine", "Gabapentin", "Losartan", "Albuterol"]
+STATUSES = ["pending", "filled", "blocked", "picked_up"]
+BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+# -------------------------
+# Synthetic data
+# -------------------------
+def generate_rows(inventory_rows: int, seed: int = 7) -> Dict[str, List[Dict[str, Any]]]:
+    """Synthetic rows for every table, scaled from the inventory size."""
+    rng = random.Random(seed)
+    n_users = max(10, inventory_rows // 5)
+    n_prescriptions = max(10, inventory_rows // 2)
+
+    inventory = []
+    for i in range(inventory_rows):
+        drug = DRUGS[i % len(DRUGS)]
+        stock = rng.randint(0, 500)
+        threshold = rng.choice([20, 50, 100])
+        inventory.append({
+            "id": str(i + 1), "name": f"{drug} {rng.choice([5, 10, 20, 250, 500])} mg #{i + 1}",
+            "genericName": drug.lower(), "ndc": f"{rng.randint(10000, 99999)}-{i % 10000:04d}",
+            "currentStock": stock, "minThreshold": threshold, "maxStock": 600,
+            "lastReorder": (BASE_TIME - timedelta(days=rng.randint(1, 120))).date(),
+            "needsReorder": stock < threshold, "supplier": rng.choice(SUPPLIERS),
+            "costPerUnit": Decimal(f"{rng.uniform(0.05, 40):.2f}"),
+            "expirationDate": (BASE_TIME + timedelta(days=rng.randint(-30, 720))).date(),
+            "lotNumber": f"LOT{rng.randint(0, 10**7):07d}", "location": f"Aisle {rng.randint(1, 40)}",
+            "created_at": BASE_TIME - timedelta(days=365),
+            "updated_at": BASE_TIME - timedelta(minutes=rng.randint(0, 10**5)),
+        })
+
+    users = []
+    for i in range(n_users):
+        users.append({
+            "id": f"u{i + 1}", "name": f"Patient {i + 1}", "role": "patient" if i % 20 else "pharmacist",
+            "email": f"patient{i + 1}@example.com", "phone": f"555-{(i // 10000) % 1000:03d}-{i % 10000:04d}",
+            "DateOfBirth": date(1940 + i % 60, 1 + i % 12, 1 + i % 28),
+            "created_at": BASE_TIME - timedelta(days=400), "updated_at": BASE_TIME - timedelta(days=i % 90),
+        })
+
+    prescriptions, api_prescriptions = [], []
+    for i in range(n_prescriptions):
+        user = users[rng.randrange(n_users)]
+        item = inventory[rng.randrange(inventory_rows)]
+        status = rng.choice(STATUSES)
+        created = BASE_TIME - timedelta(hours=rng.randint(1, 24 * 90))
+        prescriptions.append({
+            "id": f"rx{i + 1}", "patientId": user["id"], "patientName": user["name"],
+            "medication": item["name"], "dosage": "1 tablet daily", "quantity": rng.choice([30, 60, 90]),
+            "status": status, "prescribedBy": f"Dr. {rng.choice(['Lee', 'Patel', 'Garcia', 'Smith'])}",
+            "dateCreated": created, "dateFilled": created + timedelta(hours=4) if status != "pending" else None,
+            "agentId": "agent-1", "insuranceStatus": rng.choice(["approved", "denied", "pending"]),
+            "priority": rng.choice(["normal", "normal", "high"]),
+            "estimatedCompletion": created + timedelta(hours=6),
+            "copayAmount": Decimal(f"{rng.uniform(0, 50):.2f}"), "refillsRemaining": rng.randint(0, 5),
+            "instructions": "Take one tablet by mouth daily with food. Do not crush or chew.",
+            "warnings": "May cause dizziness. Avoid alcohol. Keep out of reach of children.",
+            "created_at": created, "updated_at": created + timedelta(hours=rng.randint(0, 48)),
+        })
+        api_prescriptions.append({
+            "prescriptionId": f"rx{i + 1}", "medicineId": int(item["id"]), "patientId": user["id"],
+            "doctorId": f"d{rng.randint(1, 50)}", "status": status,
+            "updated_at": created + timedelta(hours=rng.randint(0, 48)),
+        })
+
+    return {"inventory": inventory, "users": users, "prescriptions": prescriptions,
+            "prescription": api_prescriptions}
+
+# -------------------------
+# BigQuery stand-in
+# -------------------------
+def _to_sqlite(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def _from_sqlite(col_type: Optional[str], value: Any) -> Any:
+    if value is None:
+        return None
+    if col_type == "BOOLEAN":
+        return bool(value)
+    if col_type == "NUMERIC":
+        return Decimal(str(value))
+    if col_type == "DATE":
+        return date.fromisoformat(value)
+    if col_type == "TIMESTAMP":
+        return datetime.fromisoformat(value)
+    return value
+
+class FakeRow:
+    """Duck-types google.cloud.bigquery.Row."""
+
+    __slots__ = ("_names", "_values", "_index")
+
+    def __init__(self, names, values, index):
+        self._names = names
+        self._values = values
+        self._index = index
+
+    def keys(self):
+        return iter(self._names)
+
+    def values(self):
+        return self._values
+
+    def items(self):
+        return zip(self._names, self._values)
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else self._values[i]
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._values[key]
+        return self._values[self._index[key]]
+
+class FakeRowIterator:
+    def __init__(self, rows: List[FakeRow], total_bytes_processed: int, page_size: int = 1000):
+        self._rows = rows
+        self.total_rows = len(rows)
+        self.total_bytes_processed = total_bytes_processed
+        self.slot_millis = max(1, total_bytes_processed // 10**6)
+        self.cache_hit = False
+        self.job_id = f"fake-{id(self):x}"
+        self.page_size = page_size
+
+    @property
+    def pages(self):
+        for start in range(0, len(self._rows), self.page_size):
+            yield self._rows[start:start + self.page_size]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+class FakeQueryJob:
+    def __init__(self, iterator: Optional[FakeRowIterator], total_bytes_processed: int):
+        self._iterator = iterator
+        self.total_bytes_processed = total_bytes_processed
+        self.total_bytes_billed = total_bytes_processed
+        self.slot_millis = max(1, total_bytes_processed // 10**6)
+        self.cache_hit = False
+        self.job_id = f"fake-{id(self):x}"
+
+    def result(self, *args, **kwargs) -> FakeRowIterator:
+        return self._iterator if self._iterator is not None else FakeRowIterator([], 0)
+
+    def __iter__(self):
+        return iter(self.result())
+
+_TABLE_RE = re.compile(r"`([\w.-]+)`")
+_COUNTIF_RE = re.compile(r"COUNTIF\(([^()]*)\)", re.IGNORECASE)
+_UNNEST_RE = re.compile(r"UNNEST\(@(\w+)\)", re.IGNORECASE)
+_PARAM_RE = re.compile(r"@(\w+)")
+_SELECT_RE = re.compile(r"SELECT\s+(.*?)\s+FROM\s", re.IGNORECASE | re.DOTALL)
+_ALIAS_RE = re.compile(r"\s+AS\s+(\w+)\s*$", re.IGNORECASE)
+
+class FakeBigQueryClient:
+    """In-memory SQLite stand-in for google.cloud.bigquery.Client."""
+
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]], latency: float = 0.0, page_size: int = 1000):
+        self.latency = latency
+        self.page_size = page_size
+        self.queries = 0
+        self.project = "bench"
+        self._local = threading.local()
+        self._uri = f"file:fakebq{id(self)}?mode=memory&cache=shared"
+        self._keeper = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        self._column_bytes: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        for name, rows in tables.items():
+            self.load_table(name, rows)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+        return conn
+
+    def load_table(self, name: str, rows: List[Dict[str, Any]]) -> None:
+        schema = TABLE_SCHEMAS[name.lower()]
+        cols = list(schema)
+        with self._lock:
+            self._keeper.execute(f"DROP TABLE IF EXISTS {name}")
+            self._keeper.execute(f"CREATE TABLE {name} ({', '.join(cols)})")
+            self._keeper.executemany(
+                f"INSERT INTO {name} VALUES ({', '.join('?' for _ in cols)})",
+                ([_to_sqlite(r.get(c)) for c in cols] for r in rows),
+            )
+            self._keeper.execute(f"CREATE INDEX idx_{name}_updated ON {name} (updated_at)")
+            self._keeper.commit()
+            self._column_bytes[name.lower()] = {
+                c: sum(len(str(r.get(c))) for r in rows[:1000]) * max(1, len(rows)) // max(1, min(len(rows), 1000))
+                for c in cols
+            }
+
+    def upsert_rows(self, name: str, rows: List[Dict[str, Any]], key: str = "id") -> None:
+        """Replaces rows by key (used to simulate data changes between refreshes)."""
+        cols = list(TABLE_SCHEMAS[name.lower()])
+        with self._lock:
+            for r in rows:
+                self._keeper.execute(f"DELETE FROM {name} WHERE {key} = ?", (_to_sqlite(r[key]),))
+                self._keeper.execute(
+                    f"INSERT INTO {name} VALUES ({', '.join('?' for _ in cols)})",
+                    [_to_sqlite(r.get(c)) for c in cols],
+                )
+            self._keeper.commit()
+
+    def estimate_bytes(self, sql: str) -> int:
+        """Bytes BigQuery would bill: the full size of every column the query references."""
+        total = 0
+        select = _SELECT_RE.search(sql)
+        star = select is not None and select.group(1).strip().endswith("*")
+        for table in {t.split(".")[-1].lower() for t in _TABLE_RE.findall(sql)}:
+            for col, size in self._column_bytes.get(table, {}).items():
+                if star or re.search(rf"\b{re.escape(col)}\b", sql):
+                    total += size
+        return total
+
+    def _translate(self, sql: str, job_config) -> (str, Dict[str, Any]):
+        params: Dict[str, Any] = {}
+        arrays = {}
+        for p in getattr(job_config, "query_parameters", None) or []:
+            if hasattr(p, "values"):
+                arrays[p.name] = list(p.values)
+            else:
+                params[p.name] = _to_sqlite(p.value)
+
+        def expand(match):
+            name = match.group(1)
+            keys = []
+            for i, v in enumerate(arrays.get(name, [])):
+                params[f"{name}_{i}"] = _to_sqlite(v)
+                keys.append(f":{name}_{i}")
+            return f"({', '.join(keys) or 'NULL'})"
+
+        sql = _TABLE_RE.sub(lambda m: m.group(1).split(".")[-1], sql)
+        sql = _COUNTIF_RE.sub(r"SUM(CASE WHEN \1 THEN 1 ELSE 0 END)", sql)
+        sql = _UNNEST_RE.sub(expand, sql)
+        sql = _PARAM_RE.sub(r":\1", sql)
+        return sql, params
+
+    def _column_types(self, sql: str, names: Sequence[str]) -> List[Optional[str]]:
+        types = {}
+        for table in _TABLE_RE.findall(sql):
+            for col, col_type in TABLE_SCHEMAS.get(table.split(".")[-1].lower(), {}).items():
+                types.setdefault(col, col_type)
+        return [types.get(n) for n in names]
+
+    def _run(self, sql: str, job_config=None) -> FakeRowIterator:
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        translated, params = self._translate(sql, job_config)
+        cursor = self._conn().execute(translated, params)
+        names = [d[0] for d in cursor.description]
+        index = {n: i for i, n in enumerate(names)}
+        types = self._column_types(sql, names)
+        rows = [
+            FakeRow(names, tuple(_from_sqlite(t, v) for t, v in zip(types, raw)), index)
+            for raw in cursor.fetchall()
+        ]
+        return FakeRowIterator(rows, self.estimate_bytes(sql), self.page_size)
+
+    def query(self, sql: str, job_config=None, **kwargs) -> FakeQueryJob:
+        if job_config is not None and getattr(job_config, "dry_run", False):
+            return FakeQueryJob(None, self.estimate_bytes(sql))
+        iterator = self._run(sql, job_config)
+        return FakeQueryJob(iterator, iterator.total_bytes_processed)
+
+    def query_and_wait(self, sql: str, job_config=None, **kwargs) -> FakeRowIterator:
+        return self._run(sql, job_config)
+
+# -------------------------
+# LLM stand-in
+# -------------------------
+def _make_fake_llm_class():
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from google.genai.types import Content, FunctionCall, Part
+
+    class FakeLlm(BaseLlm):
+        """
+        Scripted model: keyword-chosen tool calls (one per model turn, limited
+        to the tools the calling agent has), then a short summary.
+        """
+
+        latency: float = 0.0
+        # Extra latency per 1000 prompt characters, as prompt processing grows with context
+        prefill_per_kchar: float = 0.0
+        prompt_chars: List[int] = []
+
+        @classmethod
+        def supported_models(cls) -> List[str]:
+            return [r"fake-.*"]
+
+        @staticmethod
+        def plan(question: str):
+            q = question.lower()
+            if "attention" in q or "today" in q:
+                # Multi-domain question: one lookup per domain
+                return [
+                    ("check_inventory", {"filters": {"needsReorder": True}, "limit": 50}),
+                    ("get_prescriptions", {"filters": {"status": "pending"}, "limit": 50}),
+                    ("get_users", {"filters": {"role": "patient"}, "limit": 50}),
+                ]
+            if "pickup" in q or "prescription" in q:
+                return [("get_prescriptions", {"filters": {"status": "filled"}, "limit": 50})]
+            if "patient" in q or "user" in q:
+                return [("get_users", {"filters": {"role": "patient"}, "limit": 50})]
+            return [("check_inventory", {"filters": {"needsReorder": True}, "limit": 50})]
+
+        async def generate_content_async(self, llm_request, stream: bool = False) -> AsyncGenerator:
+            chars = sum(len(c.model_dump_json(exclude_none=True)) for c in llm_request.contents)
+            self.prompt_chars.append(chars)
+            delay = self.latency + self.prefill_per_kchar * chars / 1000
+            if delay:
+                await asyncio.sleep(delay)
+            # The current turn: everything after the last user text
+            turn_start = max(
+                (i for i, c in enumerate(llm_request.contents) if c.role == "user" and any(p.text for p in c.parts or [])),
+                default=0,
+            )
+            turn = llm_request.contents[turn_start:]
+            question = " ".join(p.text for p in (turn[0].parts or []) if p.text) if turn else ""
+            done = {p.function_response.name for c in turn for p in c.parts or [] if p.function_response}
+            steps = [(n, a) for n, a in self.plan(question) if n in llm_request.tools_dict and n not in done]
+            if steps:
+                name, args = steps[0]
+                yield LlmResponse(content=Content(role="model", parts=[
+                    Part(function_call=FunctionCall(name=name, args=args)),
+                ]))
+                return
+            if done:
+                text = f"{', '.join(sorted(done))} returned results; here is a summary of what needs attention."
+            elif llm_request.tools_dict:
+                text = "Nothing to report."
+            else:
+                text = "Here is a summary of what needs attention."
+            yield LlmResponse(content=Content(role="model", parts=[Part(text=text)]))
+
+    return FakeLlm
+
+def make_fake_llm(latency: float = 0.0, prefill_per_kchar: float = 0.0):
+    return _make_fake_llm_class()(model="fake-llm", latency=latency, prefill_per_kchar=prefill_per_kchar, prompt_chars=[])
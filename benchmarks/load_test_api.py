@@ -0,0 +1,88 @@
+"""
+Concurrent load test for the pharmacy API (Flask or ASGI mode).
+
+Opens N concurrent clients that each issue requests back to back until the
+total is reached, then reports throughput and latency percentiles.
+
+Usage:
+    python benchmarks/load_test_api.py --url http://localhost:8080 \
+        --path /api/pharmacy/home --clients 200 --requests 5000
+
+With --app module:attr the ASGI app is driven in-process (no sockets), which
+measures the app itself when client and server would share too few cores.
+"""
+import argparse
+import asyncio
+import importlib
+import statistics
+import time
+
+import httpx
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def run_load(url, paths, clients, total_requests, app=None):
+    latencies = []
+    errors = 0
+    remaining = total_requests
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    transport = httpx.ASGITransport(app=app) if app is not None else None
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60, transport=transport) as http:
+        async def client_loop(worker):
+            nonlocal remaining, errors
+            i = worker
+            while remaining > 0:
+                remaining -= 1
+                path = paths[i % len(paths)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    response = await http.get(path)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(w) for w in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the pharmacy API")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="route to request; repeat to rotate through several (default: /api/pharmacy/home)")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--app", help="drive an ASGI app in-process, e.g. asgi_server:app")
+    args = parser.parse_args()
+
+    app = None
+    if args.app:
+        module, _, attr = args.app.partition(":")
+        app = getattr(importlib.import_module(module), attr or "app")
+
+    result = asyncio.run(run_load(args.url, args.paths or ["/api/pharmacy/home"], args.clients, args.requests, app))
+    print(f"{result['requests']} requests, {args.clients} clients, {result['errors']} errors")
+    print(f"throughput {result['throughput_rps']:.1f} req/s   "
+          f"p50 {result['p50_ms']:.1f} ms   p99 {result['p99_ms']:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""
+Offline benchmark and load-test suite.
+
+Swaps BigQuery, the SMS provider and the Gemini model for local stand-ins
+(fakes.py, fake_sms.py), loads synthetic data at the requested scale, and
+drives the pharmacy API routes, the agent tools, /agent/respond, the bulk
+SMS path, a prescription reminder sweep, a multi-domain agent turn run
+by the single agent and by the parallel fan-out, and the same turn with and
+without tool-result compaction. Reports p50/p99 latency, throughput and peak RSS per scenario as
+JSON tagged with the git commit, so runs can be compared across commits.
+
+Usage:
+    python benchmarks/run.py --rows 10000 --out bench.json
+    python benchmarks/run.py --rows 100000 --bq-latency-ms 300 --compare bench.json
+    python benchmarks/run.py --scenarios api,tools
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [HERE, os.path.join(ROOT, "medease-agent"), os.path.join(ROOT, "api")]
+
+SCENARIOS = ("api", "tools", "respond", "notify", "sweep", "fanout", "compaction")
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))] * 1000
+    return {
+        "n": len(latencies),
+        "p50_ms": round(pct(50), 3),
+        "p99_ms": round(pct(99), 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def timed_calls(fn, args_list):
+    latencies = []
+    start = time.perf_counter()
+    for args in args_list:
+        t = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start)
+
+# -------------------------
+# Environment
+# -------------------------
+def install_fakes(args):
+    """Creates the fake BigQuery client and points every module at it."""
+    os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "bench")
+    os.environ.setdefault("BQ_DATASET_ID", "medease")
+
+    from fakes import FakeBigQueryClient, generate_rows
+    start = time.perf_counter()
+    fake = FakeBigQueryClient(generate_rows(args.rows), latency=args.bq_latency_ms / 1000)
+    print(f"loaded {args.rows} inventory rows in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    import clients
+    clients._bq_client = fake
+
+    from google.cloud import bigquery
+    from google.oauth2 import service_account
+
+    class _Credentials:
+        project_id = "bench"
+
+    service_account.Credentials.from_service_account_file = staticmethod(lambda *a, **k: _Credentials())
+    bigquery.Client = lambda *a, **k: fake
+    return fake
+
+@contextlib.contextmanager
+def fake_sms(args):
+    """
+    Starts a FakeSmsServer and points a fresh notification queue at it. The
+    queue is a process-wide singleton, so it is closed and dropped on exit;
+    otherwise the next scenario would send to this (stopped) server.
+    """
+    import notifications
+    from fake_sms import FakeSmsServer
+
+    with FakeSmsServer(latency=args.sms_latency_ms / 1000) as server:
+        os.environ.update({
+            "TWILIO_ACCOUNT_SID": "ACbench", "TWILIO_AUTH_TOKEN": "bench",
+            "TWILIO_PHONE_NUMBER": "+15550000000", "TWILIO_API_BASE": server.url,
+            "SMS_RATE_PER_SECOND": str(args.sms_rate),
+        })
+        notifications._queue = None
+        try:
+            yield server
+        finally:
+            if notifications._queue is not None:
+                notifications._queue.close()
+                notifications._queue = None
+
+def use_model(agent, model):
+    """Points every LLM agent in an agent tree at `model`."""
+    if hasattr(agent, "model"):
+        agent.model = model
+    for sub_agent in agent.sub_agents:
+        use_model(sub_agent, model)
+
+# -------------------------
+# Scenarios
+# -------------------------
+def bench_api(args, fake, rng):
+    import pharmacy
+    from server import app
+
+    pharmacy.inventory_snapshot.ensure_fresh()
+    pharmacy.prescription_snapshot.ensure_fresh()
+    client = app.test_client()
+    terms = ["amox", "lis", "metf", "ator", "ibu", "500 mg", "#12", "zz"]
+    n = args.requests
+    results = {}
+    results["GET /api/pharmacy/home"] = timed_calls(lambda: client.get("/api/pharmacy/home"), [()] * n)
+    results["GET /api/medicines?q=&limit=50"] = timed_calls(
+        lambda q: client.get(f"/api/medicines?q={q}&limit=50"),
+        [(rng.choice(terms)[:rng.randint(1, 4)],) for _ in range(n)],
+    )
+    etag = client.get("/api/pharmacy/home").headers["ETag"]
+    results["GET /api/pharmacy/home (If-None-Match, 304)"] = timed_calls(
+        lambda: client.get("/api/pharmacy/home", headers={"If-None-Match": etag}), [()] * n
+    )
+    results["GET /api/medicines?limit=1000 (gzip, cached)"] = timed_calls(
+        lambda: client.get("/api/medicines?limit=1000", headers={"Accept-Encoding": "gzip"}), [()] * n
+    )
+    cursor = [None]
+    def next_page():
+        response = client.get("/api/medicines?limit=50" + (f"&after={cursor[0]}" if cursor[0] else ""))
+        cursor[0] = response.headers.get("X-Next-Cursor")
+    results["GET /api/medicines?after=<cursor>&limit=50"] = timed_calls(next_page, [()] * n)
+
+    def first_chunk():
+        response = client.get("/api/medicines?format=ndjson", buffered=False)
+        next(iter(response.response))
+        response.close()
+    results["GET /api/medicines?format=ndjson (first page)"] = timed_calls(first_chunk, [()] * max(1, n // 20))
+    results["GET /api/medicines?format=ndjson (all rows)"] = timed_calls(
+        lambda: client.get("/api/medicines?format=ndjson").data, [()] * max(1, n // 100)
+    )
+    results["GET /api/medicine/<id>"] = timed_calls(
+        lambda i: client.get(f"/api/medicine/{i}"),
+        [(rng.randint(1, args.rows),) for _ in range(max(1, n // 5))],
+    )
+    results["GET /api/medicines/details?ids=(50)"] = timed_calls(
+        lambda ids: client.get(f"/api/medicines/details?ids={ids}"),
+        [(",".join(str(rng.randint(1, args.rows)) for _ in range(50)),) for _ in range(max(1, n // 5))],
+    )
+    return results
+
+def bench_tools(args, fake, rng):
+    import agent
+    import clients
+
+    suppliers = ["McKesson", "Cardinal Health", "Henry Schein"]
+    calls = {
+        "check_inventory": lambda: agent.check_inventory(
+            {"currentStock": ("<=", rng.choice([10, 20, 50])), "supplier": rng.choice(suppliers)}),
+        "get_prescriptions": lambda: agent.get_prescriptions({"status": rng.choice(["filled", "pending"])}),
+        "get_users": lambda: agent.get_users({"role": "patient"}, limit=20),
+    }
+    results = {}
+    n = max(1, args.requests // 5)
+    for name, call in calls.items():
+        def cold():
+            clients.invalidate_query_cache()
+            call()
+        results[f"{name} (cold)"] = timed_calls(cold, [()] * n)
+        results[f"{name} (warm)"] = timed_calls(call, [()] * n)
+    return results
+
+def bench_respond(args, fake, rng):
+    import httpx
+    import agent
+    import app as agent_app
+    from fakes import make_fake_llm
+
+    use_model(agent.root_agent, make_fake_llm(latency=args.llm_latency_ms / 1000))
+    questions = ["Which items are low on stock?", "Any prescriptions waiting for pickup?",
+                 "List patients to contact", "What is expiring soon?"]
+
+    async def drive():
+        latencies = []
+        transport = httpx.ASGITransport(app=agent_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+            async def client_loop(worker, count):
+                for i in range(count):
+                    t = time.perf_counter()
+                    response = await http.post("/agent/respond", json={
+                        "question": questions[(worker + i) % len(questions)],
+                        "user_id": f"user-{worker}", "session_id": f"session-{worker}",
+                    })
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - t)
+            per_client = max(1, args.requests // (5 * args.concurrency))
+            start = time.perf_counter()
+            await asyncio.gather(*(client_loop(w, per_client) for w in range(args.concurrency)))
+            return latencies, time.perf_counter() - start
+
+    latencies, elapsed = asyncio.run(drive())
+    return {f"POST /agent/respond x{args.concurrency}": summarize(latencies, elapsed)}
+
+def bench_notify(args, fake, rng):
+    with fake_sms(args):
+        import agent
+        patients = [{"id": f"u{i}", "phone": f"555-{i // 10000:03d}-{i % 10000:04d}"} for i in range(args.sms_patients)]
+        start = time.perf_counter()
+        result = asyncio.run(agent.notify_patients(f"Refill reminder {time.time()}", patients))
+        elapsed = time.perf_counter() - start
+    return {f"notify_patients x{args.sms_patients}": {
+        "n": len(patients), "seconds": round(elapsed, 3), "sent": result.get("sent"),
+        "failed": result.get("failed"), "throughput_rps": round(len(patients) / elapsed, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }}
+
+def bench_sweep(args, fake, rng):
+    """
+    A pickup-reminder sweep planned the old way (get_prescriptions, get_users
+    per patient, notify_patient per patient) against the joined plan
+    (get_prescriptions_with_patients, then send_prescription_reminders).
+    """
+    filters = {"status": "filled"}
+    limit = args.sweep_prescriptions
+    with fake_sms(args):
+        import agent
+        import clients
+
+        async def per_patient(message):
+            queries = fake.queries
+            found = agent.get_prescriptions(filters, limit, ["id", "patientId", "patientName", "medication"])
+            for patient_id in dict.fromkeys(row["patientId"] for row in found["rows"]):
+                user = agent.get_users({"id": patient_id}, 1, ["id", "name", "phone"])["rows"]
+                if user:
+                    await agent.notify_patient(message, user[0])
+            return fake.queries - queries
+
+        async def joined(message):
+            queries = fake.queries
+            found = agent.get_prescriptions_with_patients(filters, limit=limit,
+                                                          columns=["id", "patientName", "medication"])
+            result = await agent.send_prescription_reminders(message, found["rows"])
+            assert result.get("status") != "ERROR", result
+            return fake.queries - queries
+
+        results = {}
+        for name, plan in (("per-patient", per_patient), ("joined", joined)):
+            clients.invalidate_query_cache()
+            start = time.perf_counter()
+            queries = asyncio.run(plan(f"{name} pickup reminder {time.time()}"))
+            elapsed = time.perf_counter() - start
+            results[f"reminder sweep x{limit} ({name})"] = {
+                "seconds": round(elapsed, 3), "bigquery_queries": queries,
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+            }
+    return results
+
+def bench_fanout(args, fake, rng):
+    """
+    One multi-domain turn ("what needs attention today") through the single
+    agent, which looks up each domain in turn, and through the parallel
+    fan-out, where the domain branches run concurrently.
+    """
+    import agent
+    import clients
+    from fakes import make_fake_llm
+    from google.adk.runners import InMemoryRunner
+    from google.genai.types import Content, Part
+
+    async def turns(root, count):
+        runner = InMemoryRunner(agent=root, app_name="bench")
+        latencies = []
+        for i in range(count):
+            clients.invalidate_query_cache()
+            session = await runner.session_service.create_session(app_name="bench", user_id="bench")
+            t = time.perf_counter()
+            async for _ in runner.run_async(user_id="bench", session_id=session.id, new_message=Content(
+                role="user", parts=[Part(text="What needs attention today?")]
+            )):
+                pass
+            latencies.append(time.perf_counter() - t)
+        return latencies
+
+    results = {}
+    n = max(1, args.requests // 50)
+    for name, root in (("single", agent.assistant_agent), ("parallel", agent.build_fan_out_agent())):
+        use_model(root, make_fake_llm(latency=args.llm_latency_ms / 1000))
+        start = time.perf_counter()
+        latencies = asyncio.run(turns(root, n))
+        results[f"multi-domain turn ({name})"] = summarize(latencies, time.perf_counter() - start)
+    return results
+
+def bench_compaction(args, fake, rng):
+    """
+    The multi-domain turn through the single agent with tool results
+    compacted and with raw tool results, reporting the prompt the model is
+    sent per turn (summed over its calls) and the result tokens saved.
+    """
+    import agent
+    import clients
+    from compaction import CHARS_PER_TOKEN, compactor
+    from fakes import make_fake_llm
+    from google.adk.runners import InMemoryRunner
+    from google.genai.types import Content, Part
+
+    async def turns(root, count):
+        runner = InMemoryRunner(agent=root, app_name="bench")
+        latencies, saved = [], []
+        for i in range(count):
+            clients.invalidate_query_cache()
+            session = await runner.session_service.create_session(app_name="bench", user_id="bench")
+            invocation_id = None
+            t = time.perf_counter()
+            async for event in runner.run_async(user_id="bench", session_id=session.id, new_message=Content(
+                role="user", parts=[Part(text="What needs attention today?")]
+            )):
+                invocation_id = event.invocation_id
+            latencies.append(time.perf_counter() - t)
+            saved.append(compactor.pop_turn_stats(invocation_id)["tokens_saved"])
+        return latencies, saved
+
+    results = {}
+    n = max(1, args.requests // 50)
+    for name, compact in (("compacted", True), ("raw", False)):
+        root = agent.assistant_agent.clone(update={"tools": list(agent.build_tools(compact=compact).values())})
+        model = make_fake_llm(latency=args.llm_latency_ms / 1000, prefill_per_kchar=args.llm_prefill_ms_per_kchar / 1000)
+        use_model(root, model)
+        start = time.perf_counter()
+        latencies, saved = asyncio.run(turns(root, n))
+        results[f"multi-domain turn ({name} results)"] = {
+            **summarize(latencies, time.perf_counter() - start),
+            "prompt_tokens_per_turn": round(sum(model.prompt_chars) / n / CHARS_PER_TOKEN),
+            "tokens_saved_per_turn": round(statistics.mean(saved)),
+        }
+    return results
+
+BENCHES = {
+    "api": bench_api, "tools": bench_tools, "respond": bench_respond, "notify": bench_notify, "sweep": bench_sweep,
+    "fanout": bench_fanout, "compaction": bench_compaction,
+}
+
+# -------------------------
+# Reporting
+# -------------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, baseline, threshold):
+    """Prints per-scenario deltas; returns the names of scenarios that regressed."""
+    regressions = []
+    print(f"\n{'scenario':<42} {'p99 base':>10} {'p99 now':>10} {'rps base':>10} {'rps now':>10}")
+    for name, now in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        p99_b, p99_n = base.get("p99_ms"), now.get("p99_ms")
+        rps_b, rps_n = base.get("throughput_rps"), now.get("throughput_rps")
+        flag = ""
+        if (p99_b and p99_n and p99_n > p99_b * (1 + threshold)) or (rps_b and rps_n and rps_n < rps_b * (1 - threshold)):
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<42} {p99_b or '-':>10} {p99_n or '-':>10} {rps_b or '-':>10} {rps_n or '-':>10}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline MedEase benchmark suite")
+    parser.add_argument("--rows", type=int, default=10_000, help="inventory rows (others scale from it)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per API scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent /agent/respond clients")
+    parser.add_argument("--bq-latency-ms", type=float, default=0.0, help="injected latency per BigQuery query")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="injected latency per model call")
+    parser.add_argument("--llm-prefill-ms-per-kchar", type=float, default=0.0,
+                        help="injected model latency per 1000 prompt characters")
+    parser.add_argument("--sms-latency-ms", type=float, default=20.0)
+    parser.add_argument("--sms-rate", type=float, default=50.0, help="SMS_RATE_PER_SECOND for the notify scenario")
+    parser.add_argument("--sms-patients", type=int, default=200)
+    parser.add_argument("--sweep-prescriptions", type=int, default=200, help="prescriptions in the reminder sweep")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fake = install_fakes(args)
+    results = {}
+    for name in args.scenarios.split(","):
+        print(f"running {name}...", file=sys.stderr)
+        results.update(BENCHES[name.strip()](args, fake, rng))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "python": sys.version.split()[0],
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "bigquery_queries": fake.queries,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} scenario(s) regressed beyond {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,47 @@
 import os
-from google.adk.agents import LlmAgent, ParallelAgent, LoopAgent
-from typing import Dict, Any, List, Tuple, Union
+import asyncio
+from google.adk.agents import LlmAgent, ParallelAgent, SequentialAgent
+from typing import Dict, Any, List, Optional, Tuple, Union
 from google.adk.planners import BuiltInPlanner
 from google.genai.types import ThinkingConfig
-from clients import query_bigquery_context, send_patient_sms
-
-gcp_project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
-dataset_id = os.getenv('BQ_DATASET_ID')
-
-INVENTORY_COLUMN_TYPES = {
-    "id": "STRING",
-    "name": "STRING",
-    "genericName": "STRING",
-    "ndc": "STRING",
-    "currentStock": "INTEGER",
-    "minThreshold": "INTEGER",
-    "maxStock": "INTEGER",
-    "lastReorder": "DATE",
-    "needsReorder": "BOOLEAN",
-    "supplier": "STRING",
-    "costPerUnit": "NUMERIC",
-    "expirationDate": "DATE",
-    "lotNumber": "STRING",
-    "location": "STRING",
-    "created_at": "TIMESTAMP",
-    "updated_at": "TIMESTAMP",
-}
-
-PRESCRIPTIONS_COLUMN_TYPES = {
-    "id": "STRING",
-    "patientId": "STRING",
-    "patientName": "STRING",
-    "medication": "STRING",
-    "dosage": "STRING",
-    "quantity": "INTEGER",
-    "status": "STRING",           # e.g., "pending", "filled", "blocked"
-    "prescribedBy": "STRING",
-    "dateCreated": "TIMESTAMP",
-    "dateFilled": "TIMESTAMP",
-    "agentId": "STRING",
-    "insuranceStatus": "STRING",  # e.g., "approved", "denied", "pending"
-    "priority": "STRING",         # e.g., "normal", "high"
-    "estimatedCompletion": "TIMESTAMP",
-    "copayAmount": "NUMERIC",
-    "refillsRemaining": "INTEGER",
-    "instructions": "STRING",
-    "warnings": "STRING",
-    "created_at": "TIMESTAMP",
-    "updated_at": "TIMESTAMP",
-}
-
-USERS_COLUMN_TYPES = {
-    "id": "STRING",
-    "name": "STRING",
-    "role": "STRING",
-    "email": "STRING",
-    "phone": "STRING",
-    "DateOfBirth": "DATE",
-    "created_at": "TIMESTAMP",
-    "updated_at": "TIMESTAMP",
-}
-
-def format_value(field_map: Dict[str, str], col: str, val: Any) -> str:
-    col_type = field_map.get(col)
-
-    if val is None:
-        return "NULL"
-
-    if col_type in ("STRING"):
-        return f"'{val}'"
-    elif col_type == "DATE":
-        return f"DATE '{val}'"
-    elif col_type == "TIMESTAMP":
-        return f"TIMESTAMP '{val}'"
-    elif col_type == "BOOLEAN":
-        return "TRUE" if val else "FALSE"
-    else:  # INTEGER, NUMERIC
-        return str(val)
-    
-
-def get_prescriptions(filters: Dict[str, Any], limit: int = 50) -> List[dict]:
+from alerts import expiring_alerts, low_stock_alerts, pending_pickup_alerts
+from compaction import compact_tools, compactor
+from cost_guard import run_budgeted_query, run_within_budget
+from notifications import get_notification_queue
+from reorder import reorder_planner
+from metrics import instrument_tool
+from orchestration import TimeoutAgent
+from query_builder import build_join_query
+from schemas import (
+    INVENTORY_COLUMN_TYPES, INVENTORY_SUMMARY_COLUMNS,
+    PRESCRIPTIONS_COLUMN_TYPES, PRESCRIPTIONS_SUMMARY_COLUMNS,
+    USERS_COLUMN_TYPES, USERS_SUMMARY_COLUMNS, table_id,
+)
+from tool_memo import memoize_tools, session_id_of
+
+# "single": one agent calls every tool. "parallel": domain sub-agents run
+# concurrently (each bounded by AGENT_BRANCH_TIMEOUT_SECONDS), then one agent merges their findings
+AGENT_ORCHESTRATION = os.getenv('AGENT_ORCHESTRATION', 'single')
+AGENT_BRANCH_TIMEOUT_SECONDS = float(os.getenv('AGENT_BRANCH_TIMEOUT_SECONDS', '30'))
+AGENT_MODEL = "gemini-2.5-flash"
+
+NOTIFY_WAIT_SECONDS = float(os.getenv('NOTIFY_WAIT_SECONDS', '10'))
+NOTIFY_BULK_WAIT_SECONDS = float(os.getenv('NOTIFY_BULK_WAIT_SECONDS', '60'))
+REMINDER_MAX_PRESCRIPTIONS = int(os.getenv('REMINDER_MAX_PRESCRIPTIONS', '1000'))
+# Shrink tool results (column profiles, summaries of large results) before the model sees them
+TOOL_COMPACTION = os.getenv('TOOL_COMPACTION', '1') != '0'
+FULL_RECORDS_MAX_IDS = int(os.getenv('FULL_RECORDS_MAX_IDS', '100'))
+
+PATIENT_COLUMN_PREFIX = "patient_"
+DEFAULT_PATIENT_COLUMNS = ["name", "phone"]
+REMINDER_PRESCRIPTION_COLUMNS = ["id", "patientId", "patientName", "medication"]
+
+def get_prescriptions(
+    filters: Dict[str, Any],
+    limit: int = 50,
+    columns: Optional[List[str]] = None,
+    page_token: Optional[str] = None
+) -> dict:
     """
     Fetch prescriptions from BigQuery with optional filters.
 
@@ -110,43 +72,32 @@ def get_prescriptions(filters: Dict[str, Any], limit: int = 50) -> List[dict]:
     Args:
         filters: dict mapping column names to filter values (e.g., {"patientName": "Alice Rivera", "status": "filled"}).
         limit: maximum number of rows to return.
+        columns: optional list of columns to return (e.g., ["id", "patientName", "status"]).
+                 Fetch only the fields you need; defaults to all columns. "id" is always included.
+        page_token: "next_page_token" from a previous call with the same filters, to get the next page.
 
     Returns:
-        List of prescription dicts (JSON-serializable).
-    """
-    where_clauses = []
-    for col, val in filters.items():
-        if isinstance(val, (tuple, list)) and len(val) == 2:
-            op, v = val
-        else:
-            op, v = "=", val
-
-        if v is None:
-            if op in ("=", "IS"):
-                where_clauses.append(f"{col} IS NULL")
-            elif op in ("!=", "<>", "IS NOT"):
-                where_clauses.append(f"{col} IS NOT NULL")
-        else:
-            where_clauses.append(f"{col} {op} {format_value(PRESCRIPTIONS_COLUMN_TYPES, col, v)}")
-
-    where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
-
-    sql = f"""
-        SELECT *
-        FROM `{gcp_project_id}.{dataset_id}.Prescriptions`
-        {where_sql}
-        LIMIT {limit}
+        dict with "rows" (list of prescription dicts, ordered by id), "estimated_bytes"
+        and "bytes_processed" (bytes BigQuery scanned; 0 if served from cache).
+        "next_page_token" is present when more rows match.
+        If the query would scan more than the tool's bytes budget, it is
+        narrowed to summary columns and fewer rows ("rewritten" says how),
+        or rejected with an ERROR if it still doesn't fit.
     """
-    raw = query_bigquery_context(sql)
-    print(f"raw: {raw}")
-    import json
     try:
-        rows = json.loads(raw)
-        return rows[0] if rows else {}
-    except Exception:
-        return {}
-
-def get_users(filters: Dict[str, Any], limit: int = 50) -> List[dict]:
+        return run_budgeted_query(
+            "get_prescriptions", table_id("Prescriptions"), PRESCRIPTIONS_COLUMN_TYPES,
+            PRESCRIPTIONS_SUMMARY_COLUMNS, filters, limit, columns, page_token
+        )
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+def get_users(
+    filters: Dict[str, Any],
+    limit: int = 50,
+    columns: Optional[List[str]] = None,
+    page_token: Optional[str] = None
+) -> dict:
     """
     Fetch users from BigQuery with optional filters.
 
@@ -168,43 +119,23 @@ def get_users(filters: Dict[str, Any], limit: int = 50) -> List[dict]:
                     {"role": "pharmacist"}
                     {"DateOfBirth": (">", "1990-01-01")}
         limit: maximum number of rows to return.
+        columns: optional list of columns to return (e.g., ["id", "name", "phone"]).
+        page_token: "next_page_token" from a previous call with the same filters, to get the next page.
 
     Returns:
-        List of user dicts (JSON-serializable).
-    """
-    where_clauses = []
-    for col, val in filters.items():
-        if isinstance(val, (tuple, list)) and len(val) == 2:
-            op, v = val
-        else:
-            op, v = "=", val
-
-        if v is None:
-            if op in ("=", "IS"):
-                where_clauses.append(f"{col} IS NULL")
-            elif op in ("!=", "<>", "IS NOT"):
-                where_clauses.append(f"{col} IS NOT NULL")
-        else:
-            where_clauses.append(f"{col} {op} {format_value(USERS_COLUMN_TYPES, col, v)}")
-
-    where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
-
-    sql = f"""
-        SELECT *
-        FROM `{gcp_project_id}.{dataset_id}.Users`
-        {where_sql}
-        LIMIT {limit}
+        dict with "rows" (list of user dicts, ordered by id), "estimated_bytes" and
+        "bytes_processed", and "next_page_token" when more rows match.
+        Over-budget queries come back narrowed ("rewritten") or as an ERROR.
     """
-    raw = query_bigquery_context(sql)
-    print(f"raw: {raw}")
-    import json
     try:
-        rows = json.loads(raw)
-        return rows if isinstance(rows, list) else []
-    except Exception:
-        return []
-
-def notify_patient(message: str, patient_info: Dict[str, Any]) -> dict:
+        return run_budgeted_query(
+            "get_users", table_id("Users"), USERS_COLUMN_TYPES, USERS_SUMMARY_COLUMNS, filters, limit, columns,
+            page_token
+        )
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+async def notify_patient(message: str, patient_info: Dict[str, Any]) -> dict:
     """
     Send a notification to a patient via SMS.
 
@@ -223,18 +154,200 @@ def notify_patient(message: str, patient_info: Dict[str, Any]) -> dict:
     Returns:
         dict: Status of the notification and response from the SMS provider.
               Example: {"status": "SUCCESS", ...}
+              "QUEUED" means the message is still being delivered in the background.
+              "UNKNOWN" means the provider may have received it; it is not sent again.
+              The same message is never sent twice to the same number.
     """
-    phone_number = patient_info["phone"]
+    phone_number = patient_info.get("phone")
     if not phone_number:
         return {"status": "FAILED", "message": "No phone number provided"}
 
-    resp = send_patient_sms(phone_number, message)
-    return resp
+    try:
+        future = get_notification_queue().submit(phone_number, message)
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), NOTIFY_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        return {"status": "QUEUED", "to": phone_number}
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+async def notify_patients(message: str, patients: List[Dict[str, Any]]) -> dict:
+    """
+    Send the same SMS to many patients at once (e.g., a refill-reminder sweep).
+
+    Messages are sent concurrently within the SMS provider's rate limit, and a
+    patient who already received this exact message is not texted again.
+
+    Args:
+        message: The text message to send to every patient.
+        patients: list of patient dicts following the Users table schema (must include "phone").
+
+    Returns:
+        dict: counts of sent / failed / unknown (possibly delivered) / deduplicated / queued
+              messages and per-patient results.
+    """
+    messages = []
+    results = []
+    for patient in patients:
+        if patient.get("phone"):
+            messages.append({"to": patient["phone"], "body": message})
+        else:
+            results.append({"status": "FAILED", "id": patient.get("id"), "message": "No phone number provided"})
+
+    return await _send_messages(messages, results)
+
+async def _send_messages(messages: List[Dict[str, str]], results: List[Dict[str, Any]]) -> dict:
+    """Submits {"to", "body"} messages as one batch and counts the outcomes."""
+    queued = 0
+    if messages:
+        try:
+            future = get_notification_queue().submit_many(messages)
+            results.extend(await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), NOTIFY_BULK_WAIT_SECONDS
+            ))
+        except asyncio.TimeoutError:
+            queued = len(messages)
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+
+    return {
+        "sent": sum(1 for r in results if r["status"] == "SUCCESS" and not r.get("deduplicated")),
+        "deduplicated": sum(1 for r in results if r.get("deduplicated")),
+        "failed": sum(1 for r in results if r["status"] not in ("SUCCESS", "UNKNOWN")),
+        "unknown": sum(1 for r in results if r["status"] == "UNKNOWN"),
+        "queued": queued,
+        "results": results,
+    }
+
+def get_prescriptions_with_patients(
+    filters: Dict[str, Any],
+    patient_filters: Optional[Dict[str, Any]] = None,
+    limit: int = 50,
+    columns: Optional[List[str]] = None,
+    patient_columns: Optional[List[str]] = None
+) -> dict:
+    """
+    Fetch prescriptions joined to the patient's contact details in one query.
+
+    Use this instead of get_prescriptions followed by get_users for each
+    patient, e.g. to find who to remind about a pickup or refill.
+
+    Args:
+        filters: dict of prescription filters, same columns and syntax as get_prescriptions
+                 (e.g., {"status": "filled", "dateFilled": ("<", "2025-01-01")}).
+        patient_filters: optional dict of filters on the patient's Users row
+                 (e.g., {"phone": ("IS NOT", None)}).
+        limit: maximum number of rows to return.
+        columns: optional list of prescription columns to return (e.g., ["id", "medication"]).
+        patient_columns: Users columns to add to each row, returned as "patient_<column>"
+                 (defaults to ["name", "phone"]).
+
+    Returns:
+        dict with "rows" (prescription dicts with the patient_* fields added;
+        None if the patient has no Users row), "estimated_bytes" and
+        "bytes_processed". The rows can be passed straight to
+        send_prescription_reminders. Over-budget queries come back narrowed
+        ("rewritten") or as an ERROR.
+    """
+    patient_columns = patient_columns or DEFAULT_PATIENT_COLUMNS
+    try:
+        return run_within_budget(
+            "get_prescriptions_with_patients",
+            lambda cols, n: build_join_query(
+                table_id("Prescriptions"), PRESCRIPTIONS_COLUMN_TYPES,
+                table_id("Users"), USERS_COLUMN_TYPES, ("patientId", "id"),
+                filters, patient_filters, n, cols, patient_columns, PATIENT_COLUMN_PREFIX,
+            ),
+            list(columns) if columns else list(PRESCRIPTIONS_COLUMN_TYPES),
+            PRESCRIPTIONS_SUMMARY_COLUMNS,
+            limit,
+            columns,
+        )
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+class _BlankMissing(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
+
+async def send_prescription_reminders(
+    message: str,
+    prescriptions: Optional[List[Dict[str, Any]]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    patient_filters: Optional[Dict[str, Any]] = None
+) -> dict:
+    """
+    Send one reminder SMS per patient for a set of prescriptions.
+
+    Pass either the "rows" returned by get_prescriptions_with_patients as
+    `prescriptions`, or the same `filters` / `patient_filters` to select the
+    prescriptions here. Prescriptions are grouped by patient phone number, so
+    a patient with several prescriptions gets a single message. Messages are
+    sent concurrently within the SMS provider's rate limit, and a patient who
+    already received the exact same message is not texted again.
+
+    Args:
+        message: message template; {patientName}, {medication} (all of the
+                 patient's medications, comma-separated) and {count} are filled in.
+                 Example: "Hi {patientName}, your {medication} is ready for pickup."
+        prescriptions: rows from get_prescriptions_with_patients (need
+                 "patient_phone", plus "patientName" and "medication" for the template).
+        filters: prescription filters, used when `prescriptions` is not given.
+        patient_filters: patient filters, used with `filters`.
+
+    Returns:
+        dict with "patients" (messages to send), "prescriptions", "skipped"
+        (prescriptions without a phone number), counts of sent / failed /
+        unknown / deduplicated / queued messages and per-message results.
+    """
+    if prescriptions is None:
+        if filters is None:
+            return {"status": "ERROR", "message": "Provide either prescriptions or filters"}
+        found = await asyncio.to_thread(
+            get_prescriptions_with_patients, filters, patient_filters,
+            REMINDER_MAX_PRESCRIPTIONS, REMINDER_PRESCRIPTION_COLUMNS,
+        )
+        if found.get("status") == "ERROR":
+            return found
+        prescriptions = found["rows"]
+
+    by_phone: Dict[str, Dict[str, Any]] = {}
+    skipped = []
+    for row in prescriptions:
+        phone = row.get(PATIENT_COLUMN_PREFIX + "phone") or row.get("phone")
+        if not phone:
+            skipped.append(row.get("id"))
+            continue
+        patient = by_phone.setdefault(phone, {
+            "patientName": row.get("patientName") or row.get(PATIENT_COLUMN_PREFIX + "name") or "",
+            "medications": [],
+        })
+        medication = row.get("medication")
+        if medication and medication not in patient["medications"]:
+            patient["medications"].append(medication)
+
+    messages = []
+    try:
+        for phone, patient in by_phone.items():
+            body = message.format_map(_BlankMissing(
+                patientName=patient["patientName"],
+                medication=", ".join(patient["medications"]),
+                count=len(patient["medications"]),
+            ))
+            messages.append({"to": phone, "body": body})
+    except (ValueError, IndexError, AttributeError) as e:
+        return {"status": "ERROR", "message": f"Invalid message template: {e}"}
+
+    result = await _send_messages(messages, [])
+    if result.get("status") != "ERROR":
+        result = {"patients": len(messages), "prescriptions": len(prescriptions), "skipped": skipped, **result}
+    return result
 
 def check_inventory(
     filters: Dict[str, Union[Any, Tuple[str, Any], List[Any]]],
-    limit: int = 50
-) -> List[dict]:
+    limit: int = 50,
+    columns: Optional[List[str]] = None,
+    page_token: Optional[str] = None
+) -> dict:
     """
     Fetch inventory records from BigQuery with flexible filters.
 
@@ -264,42 +377,171 @@ def check_inventory(
                     {"ndc": "12345-6789"}
                     {"currentStock": ("<=", 10)}
                     {"expirationDate": (">", "2025-01-01")}
+                    {"supplier": ["McKesson", "Cardinal"]}
         limit: maximum number of rows.
+        columns: optional list of columns to return (e.g., ["name", "currentStock", "minThreshold"]).
+        page_token: "next_page_token" from a previous call with the same filters, to get the next page.
 
     Returns:
-        List of inventory dicts (JSON-safe).
+        dict with "rows" (list of inventory dicts, ordered by id), "estimated_bytes" and
+        "bytes_processed", and "next_page_token" when more rows match.
+        Over-budget queries come back narrowed ("rewritten") or as an ERROR.
     """
-    where_clauses = []
-    for col, val in filters.items():
-        if isinstance(val, (tuple, list)) and len(val) == 2:
-            op, v = val
-        else:
-            op, v = "=", val
+    try:
+        return run_budgeted_query(
+            "check_inventory", table_id("Inventory"), INVENTORY_COLUMN_TYPES, INVENTORY_SUMMARY_COLUMNS, filters, limit, columns,
+            page_token
+        )
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+def get_low_stock_alerts(limit: int = 50) -> dict:
+    """
+    List inventory items below their minimum stock threshold.
 
-        if v is None:
-            if op in ("=", "IS"):
-                where_clauses.append(f"{col} IS NULL")
-            elif op in ("!=", "<>", "IS NOT"):
-                where_clauses.append(f"{col} IS NOT NULL")
-        else:
-            where_clauses.append(f"{col} {op} {format_value(INVENTORY_COLUMN_TYPES, col, v)}")
-
-    where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
-    sql = f"""
-        SELECT *
-        FROM `{gcp_project_id}.{dataset_id}.Inventory`
-        {where_sql}
-        LIMIT {limit}
+    Answered from a precomputed alert set that is kept up to date in the
+    background, so prefer this over check_inventory for "what is low on
+    stock / what needs reordering" questions.
+
+    Args:
+        limit: maximum number of items to return.
+
+    Returns:
+        dict with "total" (all low-stock items), "rows" (inventory dicts with
+        "shortfall" = minThreshold - currentStock, largest relative shortfall
+        first) and "age_seconds" (how old the alert set is).
+    """
+    try:
+        return low_stock_alerts(limit)
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+def get_expiring_alerts(within_days: int = 30, limit: int = 50) -> dict:
+    """
+    List medication lots expiring within `within_days` days, grouped by week.
+
+    Answered from a precomputed alert set; prefer this over check_inventory
+    for "what is expiring soon" questions. Covers up to 90 days ahead.
+
+    Args:
+        within_days: how many days ahead to look (e.g., 30).
+        limit: maximum number of lots to return.
+
+    Returns:
+        dict with "total" (lots expiring in the window), "weeks" (list of
+        {"week", "from", "to", "items"}, week 1 = next 7 days; each item has
+        "days_left"), "expired_total" and "expired" (lots already past
+        expirationDate) and "age_seconds".
     """
-    print(f"sql query: {sql}")
-    raw = query_bigquery_context(sql)
-    import json
     try:
-        rows = json.loads(raw)
-        print(f"rows: {rows}")
-        return rows
-    except Exception:
-        return []
+        return expiring_alerts(within_days, limit)
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+def get_pending_pickups(min_days_waiting: int = 0, limit: int = 50) -> dict:
+    """
+    List filled prescriptions that are waiting for the patient to pick them up.
+
+    Answered from a precomputed alert set; prefer this over get_prescriptions
+    for "what is waiting for pickup / who needs a pickup reminder" questions.
+
+    Args:
+        min_days_waiting: only include prescriptions filled at least this many days ago.
+        limit: maximum number of prescriptions to return.
+
+    Returns:
+        dict with "total", "rows" (prescription dicts with patientId,
+        patientName, medication, dateFilled and "days_waiting", longest
+        waiting first) and "age_seconds".
+    """
+    try:
+        return pending_pickup_alerts(min_days_waiting, limit)
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+def plan_reorders(
+    supplier: Optional[str] = None,
+    expiry_buffer_days: int = 30,
+    limit: int = 25
+) -> dict:
+    """
+    Compute what to reorder across the whole inventory, grouped by supplier.
+
+    Every SKU is considered in one call, with its lots (inventory rows of the
+    same ndc) added up: a SKU is reordered when its usable stock is below
+    minThreshold (or a lot is flagged needsReorder), and the order brings it
+    back up to maxStock. Stock in lots expiring within `expiry_buffer_days` is
+    not counted as usable. Use this instead of paging through check_inventory
+    to work out reorder quantities or costs.
+
+    Args:
+        supplier: only plan orders for this supplier (e.g., "McKesson").
+        expiry_buffer_days: lots expiring within this many days don't count as usable stock.
+        limit: number of order lines to return, largest cost first (totals always cover every line).
+
+    Returns:
+        dict with "suppliers" (list of {"supplier", "items", "units", "total_cost"}),
+        "lines" (order lines with orderQuantity and lineCost), "total_units",
+        "total_cost", "skus_considered" and "expiring_lots" (lots, not SKUs).
+    """
+    try:
+        return reorder_planner.plan(supplier=supplier, expiry_buffer_days=expiry_buffer_days, limit=limit)
+    except Exception as e:
+        return {"status": "ERROR", "message": str(e)}
+
+# (tool name for the bytes budget, table, column types, summary columns) per record source
+RECORD_SOURCES = {
+    "prescriptions": ("get_prescriptions", "Prescriptions", PRESCRIPTIONS_COLUMN_TYPES, PRESCRIPTIONS_SUMMARY_COLUMNS),
+    "users": ("get_users", "Users", USERS_COLUMN_TYPES, USERS_SUMMARY_COLUMNS),
+    "inventory": ("check_inventory", "Inventory", INVENTORY_COLUMN_TYPES, INVENTORY_SUMMARY_COLUMNS),
+}
+
+def get_full_records(source: str, ids: List[str], tool_context=None) -> dict:
+    """
+    Fetch complete rows by id, e.g. the rows behind a summarized result.
+
+    Rows the query tools returned earlier in the conversation are answered
+    from memory; any others are looked up in BigQuery.
+
+    Args:
+        source: "prescriptions", "users" or "inventory" (the "note" of a summarized result names it).
+        ids: row ids, from a result's "ids" or rows (at most 100 per call).
+
+    Returns:
+        dict with "rows" (every column of each row found, in the order of `ids`)
+        and "missing" (ids with no row), or an ERROR if looking up the rest
+        would go over the query budget.
+    """
+    if source not in RECORD_SOURCES:
+        return {"status": "ERROR", "message": f"Unknown source '{source}'; use one of {sorted(RECORD_SOURCES)}"}
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > FULL_RECORDS_MAX_IDS:
+        return {"status": "ERROR", "message": f"At most {FULL_RECORDS_MAX_IDS} ids per call (got {len(ids)})"}
+
+    found = compactor.lookup(session_id_of(tool_context), source, ids)
+    missing = [i for i in ids if i not in found]
+    if missing:
+        tool, table, column_types, summary_columns = RECORD_SOURCES[source]
+        try:
+            result = run_budgeted_query(
+                tool, table_id(table), column_types, summary_columns, {"id": missing}, len(missing)
+            )
+        except Exception as e:
+            return {"status": "ERROR", "message": str(e)}
+        if result.get("status") == "ERROR":
+            return result
+        if "rewritten" in result:
+            # Narrowed rows are not full records; don't pass them off as such
+            return {
+                "status": "ERROR",
+                "message": (
+                    f"Full rows for {len(missing)} ids would scan over the {tool} bytes budget. "
+                    "Ask for fewer ids, or use the query tool with `columns`."
+                ),
+                "rewritten": result["rewritten"],
+            }
+        found.update((row["id"], row) for row in result["rows"])
+    return {"rows": [found[i] for i in ids if i in found], "missing": [i for i in ids if i not in found]}
 
 # Step 1: Configure the planner
 planner = BuiltInPlanner(
@@ -308,10 +550,30 @@ planner = BuiltInPlanner(
     )
 )
 
-# Step 2: Define the main LLM agent
-root_agent = LlmAgent(
+# Step 2: Wrap the tools once; every agent below shares them.
+# Read-only tools are memoized per session; the notification tools never are.
+# Results are compacted outside the memo, so cached results keep their full rows
+TOOL_FUNCTIONS = [
+    get_prescriptions, get_users, get_prescriptions_with_patients,
+    notify_patient, notify_patients, send_prescription_reminders, check_inventory,
+    get_low_stock_alerts, get_expiring_alerts, get_pending_pickups, plan_reorders, get_full_records,
+]
+
+def build_tools(compact: bool = TOOL_COMPACTION) -> Dict[str, Any]:
+    tools = memoize_tools(TOOL_FUNCTIONS)
+    if compact:
+        tools = compact_tools(tools)
+    return {tool.__name__: instrument_tool(tool) for tool in tools}
+
+TOOLS = build_tools()
+
+def _tools(*names: str) -> list:
+    return [TOOLS[name] for name in names]
+
+# Step 3: Define the main LLM agent
+assistant_agent = LlmAgent(
     name="pharmacy_assistant",
-    model="gemini-2.5-flash",
+    model=AGENT_MODEL,
     description="""
 Coordinates pharmacy workflows autonomously by managing prescriptions, patients, and inventory levels.
 
@@ -331,14 +593,117 @@ You are a pharmacy AI assistant. Your tasks:
 4. Monitor inventory: Alert staff about low stock, expiring medications, or controlled substances.
 
 Use the following tools as needed:
-- `get_prescriptions(filters, limit)`
-- `get_users(filters, limit)`
+- `get_prescriptions(filters, limit, columns, page_token)`
+- `get_users(filters, limit, columns, page_token)`
+- `get_prescriptions_with_patients(filters, patient_filters, limit, columns, patient_columns)`
+  for prescriptions together with the patient's name and phone, in one call
 - `notify_patient(message, patient_info)`
-- `check_inventory(filters, limit)`
+- `notify_patients(message, patients)` to send one message to many patients at once
+- `send_prescription_reminders(message, prescriptions or filters)` to remind every patient
+  in a prescription result set, one message per patient
+- `check_inventory(filters, limit, columns, page_token)`
+- `get_low_stock_alerts(limit)`, `get_expiring_alerts(within_days, limit)` and
+  `get_pending_pickups(min_days_waiting, limit)` for low stock, expiring medications and
+  prescriptions waiting for pickup
+- `plan_reorders(supplier, expiry_buffer_days, limit)` to compute reorder quantities and costs per supplier
+- `get_full_records(source, ids)` for every column of specific rows
+
+For those three common questions, use the alert tools first: they answer from precomputed
+results in a single call. Use the filter tools for anything more specific.
+For a reminder sweep, don't look up each patient with get_users: pass the
+get_prescriptions_with_patients rows (or the same filters) to send_prescription_reminders.
+Pass `columns` with only the fields you need for the task. Query tools return their
+results under "rows"; if a result says "rewritten", it was narrowed to stay within the
+query budget, so ask again with tighter filters if you need the dropped fields.
+If a result has "next_page_token" and you need more rows, call the same tool again with
+the same filters and `page_token` set to it.
+Results are compacted: fields shared by every row are listed once under "common", empty
+fields are left out, and unless you pass `columns` some wide columns are omitted
+("omitted_columns"). Large results come as a "summary" with "sample" rows and the row "ids"
+("ids_truncated" if only the first ones are listed); call get_full_records with the ids you
+need rather than re-running the query, and narrow the filters to reach the others.
 
 Respond in clear action steps, specifying which tool to call and the parameters to provide.
 """,
-    tools=[get_prescriptions, get_users, notify_patient, check_inventory],
+    tools=list(TOOLS.values()),
     planner=planner,
     output_key="latest_action"
-)
\ No newline at end of file
+)
+
+# Step 4 (AGENT_ORCHESTRATION=parallel): domain branches run concurrently, then merge
+BRANCH_INSTRUCTION = """
+You are the {domain} specialist of a pharmacy AI assistant, working alongside the
+other specialists ({others}) on the same request.
+
+Handle only the {domain} part of the request: {scope}
+If nothing in the request concerns {domain}, reply "Nothing to report." without calling tools.
+Otherwise call the tools you need (independent calls can be made together), then reply with
+a short factual summary of what you found or did, with the ids, names and numbers that matter.
+Prefer the alert tools for low stock, expiring medications and pending pickups: they answer
+from precomputed results in a single call. Pass `columns` with only the fields you need.
+Large results come summarized with row "ids"; use get_full_records for the rows you need.
+"""
+
+BRANCHES = {
+    "inventory": (
+        "stock levels, low stock, expiring lots, reorder quantities and costs.",
+        ("check_inventory", "get_low_stock_alerts", "get_expiring_alerts", "plan_reorders", "get_full_records"),
+    ),
+    "prescriptions": (
+        "prescription status, pending work, prescriptions waiting for pickup.",
+        ("get_prescriptions", "get_pending_pickups", "get_full_records"),
+    ),
+    "patient outreach": (
+        "finding which patients to contact and sending them reminders, only if the request asks to notify or remind.",
+        ("get_users", "get_prescriptions_with_patients", "get_pending_pickups",
+         "notify_patient", "notify_patients", "send_prescription_reminders", "get_full_records"),
+    ),
+}
+
+def _branch_key(domain: str) -> str:
+    return domain.replace(" ", "_")
+
+def build_fan_out_agent(timeout_seconds: float = AGENT_BRANCH_TIMEOUT_SECONDS) -> SequentialAgent:
+    """ParallelAgent over the domain branches (each under a TimeoutAgent), followed by a merging agent."""
+    branches = []
+    for domain, (scope, tool_names) in BRANCHES.items():
+        key = _branch_key(domain)
+        branch = LlmAgent(
+            name=f"{key}_agent",
+            model=AGENT_MODEL,
+            description=f"Answers the {domain} part of a pharmacy request.",
+            instruction=BRANCH_INSTRUCTION.format(
+                domain=domain, scope=scope, others=", ".join(d for d in BRANCHES if d != domain)
+            ),
+            tools=_tools(*tool_names),
+            output_key=f"{key}_findings",
+        )
+        branches.append(TimeoutAgent(
+            name=f"{key}_branch", sub_agents=[branch],
+            timeout_seconds=timeout_seconds, output_key=f"{key}_findings",
+        ))
+
+    findings = "\n".join(f"{domain.capitalize()}: {{{_branch_key(domain)}_findings?}}" for domain in BRANCHES)
+    merger = LlmAgent(
+        name="pharmacy_assistant",
+        model=AGENT_MODEL,
+        description="Merges the specialists' findings into one answer.",
+        instruction=f"""
+You are a pharmacy AI assistant. Specialists have just looked into the user's latest request
+in parallel. Their findings:
+
+{findings}
+
+Combine them into one answer: lead with what needs attention first, skip specialists with
+nothing to report, and say plainly if a specialist's findings are unavailable.
+Respond in clear action steps. Do not repeat lookups the specialists already made.
+""",
+        planner=planner,
+        output_key="latest_action",
+    )
+    return SequentialAgent(
+        name="pharmacy_fan_out",
+        sub_agents=[ParallelAgent(name="specialists", sub_agents=branches), merger],
+    )
+
+root_agent = build_fan_out_agent() if AGENT_ORCHESTRATION == "parallel" else assistant_agent
\ No newline at end of file
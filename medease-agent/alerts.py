@@ -0,0 +1,318 @@
+"""
+Precomputed alert sets for the agent's most common questions: low stock,
+medications expiring soon and prescriptions waiting for pickup.
+
+Each AlertTable keeps only the rows of one table that currently match one of
+its alerts. The first load (and a periodic full reload, or one when the date
+changes, since "expiring soon" depends on today) reads just the matching
+rows. Between reloads, a background thread pulls every row whose updated_at
+is at or past the last watermark and adds or drops it from each alert set,
+so alert reads never scan the table.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from clients import iter_query_rows
+from metrics import log_sampled, registry
+from schemas import table_id
+
+ALERT_REFRESH_SECONDS = float(os.getenv("ALERT_REFRESH_SECONDS", "60"))
+ALERT_MAX_STALENESS_SECONDS = float(os.getenv("ALERT_MAX_STALENESS_SECONDS", "300"))
+ALERT_FULL_RELOAD_SECONDS = float(os.getenv("ALERT_FULL_RELOAD_SECONDS", "3600"))
+# Expiring-soon alerts cover this many days ahead (already expired lots included)
+EXPIRY_HORIZON_DAYS = int(os.getenv("ALERT_EXPIRY_HORIZON_DAYS", "90"))
+# Prescription status meaning "filled, waiting for the patient to pick it up"
+PICKUP_STATUS = os.getenv("ALERT_PICKUP_STATUS", "filled")
+
+ALERT_REFRESH_DURATION = registry.histogram(
+    "medease_alert_refresh_seconds", "Alert table refresh latency.", ["table", "mode"]
+)
+ALERT_ROWS = registry.counter("medease_alert_rows_changed_total", "Rows entering or leaving alert sets.", ["alert"])
+
+# (SQL condition for full loads, predicate applied to changed rows with today's date)
+AlertDefinition = Tuple[str, Callable[[Dict[str, Any], date], bool]]
+
+class AlertTable:
+    def __init__(
+        self,
+        table: str,
+        columns: Sequence[str],
+        alerts: Dict[str, AlertDefinition],
+        query_parameters: Callable[[date], List[Any]] = lambda today: [],
+        key: str = "id",
+        watermark_column: str = "updated_at",
+        refresh_interval: float = ALERT_REFRESH_SECONDS,
+        max_staleness: float = ALERT_MAX_STALENESS_SECONDS,
+        full_reload_interval: float = ALERT_FULL_RELOAD_SECONDS,
+    ):
+        self.table = table
+        self.key = key
+        self.watermark_column = watermark_column
+        self.column_names = list(dict.fromkeys([key, *columns, watermark_column]))
+        self.alerts = alerts
+        self.query_parameters = query_parameters
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.full_reload_interval = full_reload_interval
+
+        self.sets: Dict[str, Dict[Any, Dict[str, Any]]] = {name: {} for name in alerts}
+        self.watermark = None
+        self.last_error: Optional[str] = None
+        self._loaded_at: Optional[float] = None
+        self._full_loaded_at: Optional[float] = None
+        self._loaded_on: Optional[date] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------
+    # Refresh
+    # -------------------------
+    def refresh(self, full: bool = False) -> int:
+        """
+        Brings the alert sets up to date. Returns the number of rows that
+        entered or left an alert set. A full reload rebuilds every set (and so
+        also drops deleted rows).
+        """
+        from google.cloud import bigquery
+
+        with self._refresh_lock:
+            today = date.today()
+            full = full or self.watermark is None or self._loaded_on != today
+            start = time.perf_counter()
+            try:
+                if full:
+                    # Read the watermark first so rows changed during the load are re-pulled next time
+                    watermark_rows = list(iter_query_rows(
+                        f"SELECT MAX({self.watermark_column}) AS watermark FROM `{self.table}`"
+                    ))
+                    watermark = watermark_rows[0]["watermark"] if watermark_rows else None
+                    condition = " OR ".join(f"({sql})" for sql, _ in self.alerts.values())
+                    rows = list(iter_query_rows(
+                        f"SELECT {', '.join(self.column_names)} FROM `{self.table}` WHERE {condition}",
+                        self.query_parameters(today),
+                    ))
+                else:
+                    watermark = self.watermark
+                    rows = list(iter_query_rows(
+                        f"SELECT {', '.join(self.column_names)} FROM `{self.table}` "
+                        f"WHERE {self.watermark_column} >= @watermark",
+                        [bigquery.ScalarQueryParameter("watermark", "TIMESTAMP", self.watermark)],
+                    ))
+            except Exception as e:
+                self.last_error = str(e)
+                log_sampled("alert refresh of %s failed: %s", self.table, type(e).__name__, level=logging.WARNING)
+                raise
+
+            with self._lock:
+                sets = {name: {} for name in self.alerts} if full else {n: dict(s) for n, s in self.sets.items()}
+                changed = 0
+                for row in rows:
+                    mark = row.get(self.watermark_column)
+                    if mark is not None and (watermark is None or mark > watermark):
+                        watermark = mark
+                    for name, (_, predicate) in self.alerts.items():
+                        matches = predicate(row, today)
+                        present = row[self.key] in sets[name]
+                        if matches:
+                            sets[name][row[self.key]] = row
+                        elif present:
+                            del sets[name][row[self.key]]
+                        if matches != present:
+                            changed += 1
+                            ALERT_ROWS.inc(alert=name)
+                # Swap in whole sets so readers never see a half-applied refresh
+                self.sets = sets
+                self.watermark = watermark
+                now = time.monotonic()
+                self._loaded_at = now
+                if full:
+                    self._full_loaded_at = now
+                    self._loaded_on = today
+                self.last_error = None
+
+            ALERT_REFRESH_DURATION.observe(
+                time.perf_counter() - start, table=self.table.split(".")[-1], mode="full" if full else "incremental"
+            )
+            return changed
+
+    def ensure_fresh(self) -> None:
+        """
+        Refreshes synchronously if the alert sets are older than the staleness bound
+        (or from a previous day). If a refresh fails but older sets exist, they keep being served.
+        """
+        age = self.age_seconds()
+        if age is None or age > self.max_staleness or self._loaded_on != date.today():
+            try:
+                self.refresh()
+            except Exception:
+                if age is None:
+                    raise
+
+    def start(self) -> None:
+        """Starts the background refresh thread (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f"alerts:{self.table}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            full = (
+                self._full_loaded_at is None
+                or time.monotonic() - self._full_loaded_at > self.full_reload_interval
+            )
+            try:
+                self.refresh(full=full)
+            except Exception:
+                pass  # already recorded in last_error; retry on the next tick
+            time.sleep(self.refresh_interval)
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    def age_seconds(self) -> Optional[float]:
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def rows(self, alert: str) -> List[Dict[str, Any]]:
+        """Current rows of one alert set (shared dicts; do not mutate)."""
+        self.ensure_fresh()
+        return list(self.sets[alert].values())
+
+    def health(self) -> Dict[str, Any]:
+        age = self.age_seconds()
+        return {
+            "table": self.table,
+            "alerts": {name: len(rows) for name, rows in self.sets.items()},
+            "age_seconds": None if age is None else round(age, 3),
+            "stale": age is None or age > self.max_staleness,
+            "watermark": self.watermark,
+            "last_error": self.last_error,
+        }
+
+# -------------------------
+# Alert definitions
+# -------------------------
+def _expiry_horizon(today: date) -> date:
+    return today + timedelta(days=EXPIRY_HORIZON_DAYS)
+
+def _is_low_stock(row: Dict[str, Any], today: date) -> bool:
+    stock, threshold = row.get("currentStock"), row.get("minThreshold")
+    return stock is not None and threshold is not None and stock < threshold
+
+def _is_expiring(row: Dict[str, Any], today: date) -> bool:
+    expires = row.get("expirationDate")
+    return expires is not None and expires <= _expiry_horizon(today).isoformat()
+
+def _is_waiting_pickup(row: Dict[str, Any], today: date) -> bool:
+    return row.get("status") == PICKUP_STATUS
+
+INVENTORY_ALERT_COLUMNS = (
+    "name", "genericName", "ndc", "currentStock", "minThreshold", "maxStock",
+    "supplier", "expirationDate", "lotNumber", "location",
+)
+PRESCRIPTION_ALERT_COLUMNS = ("patientId", "patientName", "medication", "status", "dateFilled", "priority")
+
+def _inventory_params(today: date) -> List[Any]:
+    from google.cloud import bigquery
+    return [bigquery.ScalarQueryParameter("horizon", "DATE", _expiry_horizon(today))]
+
+def _prescription_params(today: date) -> List[Any]:
+    from google.cloud import bigquery
+    return [bigquery.ScalarQueryParameter("pickup_status", "STRING", PICKUP_STATUS)]
+
+_alert_tables: Optional[Dict[str, AlertTable]] = None
+_alert_tables_lock = threading.Lock()
+
+def get_alert_tables() -> Dict[str, AlertTable]:
+    """Returns the process-wide alert tables, creating them on first use."""
+    global _alert_tables
+    if _alert_tables is None:
+        with _alert_tables_lock:
+            if _alert_tables is None:
+                _alert_tables = {
+                    "inventory": AlertTable(table_id("Inventory"), INVENTORY_ALERT_COLUMNS, {
+                        "low_stock": ("currentStock < minThreshold", _is_low_stock),
+                        "expiring": ("expirationDate <= @horizon", _is_expiring),
+                    }, _inventory_params),
+                    "prescriptions": AlertTable(table_id("Prescriptions"), PRESCRIPTION_ALERT_COLUMNS, {
+                        "pending_pickup": ("status = @pickup_status", _is_waiting_pickup),
+                    }, _prescription_params),
+                }
+    return _alert_tables
+
+def start_alert_refresh() -> None:
+    """Starts background refresh of every alert table."""
+    for alert_table in get_alert_tables().values():
+        alert_table.start()
+
+# -------------------------
+# Alert reads
+# -------------------------
+def _envelope(alert_table: AlertTable, total: int, **data: Any) -> Dict[str, Any]:
+    age = alert_table.age_seconds()
+    return {"total": total, **data, "age_seconds": None if age is None else round(age, 1)}
+
+def low_stock_alerts(limit: int = 50) -> Dict[str, Any]:
+    """Items below their minimum threshold, largest relative shortfall first."""
+    alert_table = get_alert_tables()["inventory"]
+    rows = alert_table.rows("low_stock")
+    rows.sort(key=lambda r: (r["currentStock"] / r["minThreshold"] if r["minThreshold"] else 0, r.get("name") or ""))
+    items = [{**r, "shortfall": r["minThreshold"] - r["currentStock"]} for r in rows[:limit]]
+    return _envelope(alert_table, len(rows), rows=items)
+
+def expiring_alerts(within_days: int = 30, limit: int = 50) -> Dict[str, Any]:
+    """
+    Lots expiring within `within_days` days (at most ALERT_EXPIRY_HORIZON_DAYS),
+    bucketed by week. Already expired lots are counted and listed separately;
+    `limit` applies to each list.
+    """
+    alert_table = get_alert_tables()["inventory"]
+    today = date.today()
+    within_days = max(0, min(int(within_days), EXPIRY_HORIZON_DAYS))
+    cutoff = (today + timedelta(days=within_days)).isoformat()
+    rows = sorted(
+        (r for r in alert_table.rows("expiring") if r["expirationDate"] <= cutoff),
+        key=lambda r: r["expirationDate"],
+    )
+    split = bisect_left([r["expirationDate"] for r in rows], today.isoformat())
+    expired, upcoming = rows[:split], rows[split:]
+
+    weeks: Dict[int, Dict[str, Any]] = {}
+    for r in upcoming[:limit]:
+        days_left = (date.fromisoformat(r["expirationDate"][:10]) - today).days
+        week = days_left // 7 + 1
+        bucket = weeks.setdefault(week, {
+            "week": week,
+            "from": (today + timedelta(days=(week - 1) * 7)).isoformat(),
+            "to": (today + timedelta(days=week * 7 - 1)).isoformat(),
+            "items": [],
+        })
+        bucket["items"].append({**r, "days_left": days_left})
+    return _envelope(
+        alert_table, len(upcoming), within_days=within_days, weeks=list(weeks.values()),
+        expired_total=len(expired), expired=expired[:limit],
+    )
+
+def pending_pickup_alerts(min_days_waiting: int = 0, limit: int = 50) -> Dict[str, Any]:
+    """Filled prescriptions not yet picked up, longest waiting first."""
+    alert_table = get_alert_tables()["prescriptions"]
+    today = date.today()
+    items = []
+    for r in alert_table.rows("pending_pickup"):
+        filled = r.get("dateFilled")
+        days_waiting = (today - date.fromisoformat(filled[:10])).days if filled else None
+        if days_waiting is None or days_waiting >= min_days_waiting:
+            items.append({**r, "days_waiting": days_waiting})
+    items.sort(key=lambda r: -1 if r["days_waiting"] is None else r["days_waiting"], reverse=True)
+    return _envelope(alert_table, len(items), rows=items[:limit])
+
+def alerts_health() -> Dict[str, Any]:
+    return {name: alert_table.health() for name, alert_table in get_alert_tables().items()}
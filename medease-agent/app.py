@@ -1,50 +1,242 @@
-import json
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
-from agent import root_agent
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai.types import Content, Part
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import metrics
+from alerts import alerts_health, expiring_alerts, low_stock_alerts, pending_pickup_alerts, start_alert_refresh
 from pydantic import BaseModel
+from streaming import (
+    FULL_FORMAT, MEDIA_TYPES, STREAM_FORMATS, STREAM_HEADERS, CompactEventEncoder, encode
+)
+from metrics import SERIALIZATION_SECONDS, StreamTimer, log_sampled, logger
+from compaction import compactor
+from tool_memo import tool_memo
+
+APP_NAME = "medease-agent"
+
+# Load the agent and shared clients in a background thread at startup
+AGENT_WARMUP = os.getenv("AGENT_WARMUP", "1") != "0"
 
 app = FastAPI()
 
+# -------------------------
+# Runner (loaded on first use)
+# -------------------------
+# One session service and Runner for the whole process, so conversation
+# history (and the tool results in it) carries over between turns. They are
+# created on first use, not at import: google-adk and google-genai take
+# seconds to import, and the server should bind its port and answer health
+# checks before that. The startup warm-up usually has them ready before the
+# first request arrives.
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_runner():
+    """Returns the process-wide Runner, importing the agent on the first call."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                from google.adk.runners import Runner
+                from agent import root_agent
+                from sessions import create_session_service
+
+                _runner = Runner(
+                    app_name=APP_NAME,
+                    agent=root_agent,
+                    session_service=create_session_service()
+                )
+    return _runner
+
+async def load_runner():
+    if _runner is not None:
+        return _runner
+    # Importing blocks for seconds; keep the event loop serving meanwhile
+    return await asyncio.to_thread(get_runner)
+
+def warm_up():
+    """Loads the Runner, creates the pooled BigQuery client and SMS dispatcher, and starts alert refresh."""
+    from clients import get_bigquery_client
+    from notifications import get_notification_queue
+
+    start = time.perf_counter()
+    steps = (
+        ("agent", get_runner),
+        ("bigquery", get_bigquery_client),
+        ("sms", get_notification_queue),
+        ("alerts", start_alert_refresh),
+    )
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            log_sampled("warm-up step %s failed: %s", name, type(e).__name__, level=logging.WARNING)
+    logger.info("warm-up finished in %.0f ms", (time.perf_counter() - start) * 1000)
+
+@app.on_event("startup")
+async def start_warm_up():
+    if AGENT_WARMUP:
+        threading.Thread(target=warm_up, name="agent-warm-up", daemon=True).start()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe; `ready` turns true once the agent has been loaded."""
+    return {"status": "ok", "ready": _runner is not None}
+
 class AgentRequest(BaseModel):
     question: str
     user_id: str
     session_id: str
+    # "events" (full ADK events), or compact "ndjson" / "sse" deltas
+    stream: str = FULL_FORMAT
+    include_thoughts: bool = False
 
-async def event_generator(question: str, user_id: str, session_id: str):
-    new_message = Content(parts=[Part(text=question)])
-    service = InMemorySessionService()
-    session = service.create_session_sync(
-        app_name="medease-agent",
+async def get_or_create_session(user_id: str, session_id: str):
+    session_service = (await load_runner()).session_service
+    session = await session_service.get_session(
+        app_name=APP_NAME,
         user_id=user_id,
         session_id=session_id
     )
-    runner = Runner(
-        app_name="medease-agent",
-        agent=root_agent, 
-        session_service=service
-    )
+    if session is None:
+        try:
+            session = await session_service.create_session(
+                app_name=APP_NAME,
+                user_id=user_id,
+                session_id=session_id
+            )
+        except Exception:
+            # Created concurrently by another request for the same session
+            session = await session_service.get_session(
+                app_name=APP_NAME,
+                user_id=user_id,
+                session_id=session_id
+            )
+            if session is None:
+                raise
+    return session
+
+async def event_generator(question: str, user_id: str, session_id: str):
+    runner = await load_runner()
+    from google.genai.types import Content, Part
+
+    new_message = Content(role="user", parts=[Part(text=question)])
+    await get_or_create_session(user_id, session_id)
+    timer = StreamTimer(FULL_FORMAT)
+    invocation_id = None
     async for event in runner.run_async(
         user_id=user_id,
         session_id=session_id,
         new_message=new_message,
     ):
+        invocation_id = event.invocation_id
+        timer.mark()
         # Convert event to JSON
-        yield event.model_dump_json() + "\n"
+        with SERIALIZATION_SECONDS.time(stage="stream"):
+            line = event.model_dump_json() + "\n"
+        yield line
+    log_turn_stats(invocation_id, timer)
+
+def log_turn_stats(invocation_id, timer: StreamTimer):
+    stats = {**tool_memo.pop_turn_stats(invocation_id), **compactor.pop_turn_stats(invocation_id)}
+    log_sampled("turn %s: %d backend tool calls, %d avoided by memoization, ~%d of %d result tokens saved by compaction, "
+                "%d events streamed", invocation_id, stats["backend_calls"], stats["avoided_calls"],
+                stats["tokens_saved"], stats["result_tokens"], timer.events)
+    return stats
+
+async def compact_event_generator(
+    question: str, user_id: str, session_id: str, stream_format: str, include_thoughts: bool
+):
+    encoder = CompactEventEncoder(include_thoughts=include_thoughts)
+    timer = StreamTimer(stream_format)
+    invocation_id = None
+    try:
+        runner = await load_runner()
+        from google.adk.agents.run_config import RunConfig, StreamingMode
+        from google.genai.types import Content, Part
+
+        new_message = Content(role="user", parts=[Part(text=question)])
+        await get_or_create_session(user_id, session_id)
+        async for event in runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=new_message,
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        ):
+            invocation_id = event.invocation_id
+            for message in encoder.messages(event):
+                timer.mark()
+                with SERIALIZATION_SECONDS.time(stage="stream"):
+                    chunk = encode(message, stream_format)
+                yield chunk
+    except Exception as e:
+        log_turn_stats(invocation_id, timer)
+        yield encode({"t": "error", "d": str(e)}, stream_format)
+        return
+    stats = log_turn_stats(invocation_id, timer)
+    yield encode({"t": "end", "avoided_calls": stats["avoided_calls"], "tokens_saved": stats["tokens_saved"]}, stream_format)
 
 @app.post("/agent/respond")
 async def respond(request: AgentRequest):
     """
     Stream the agent's events as JSON objects.
     Each line in the response is a JSON object representing an Event.
+
+    With `stream` set to "ndjson" or "sse", only text deltas and short tool
+    status markers are sent (see streaming.py); thoughts are included only
+    if `include_thoughts` is set.
     """
     question = request.question
     user_id = request.user_id
     session_id = request.session_id
+    if request.stream not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"stream must be one of {', '.join(STREAM_FORMATS)}")
+    if request.stream == FULL_FORMAT:
+        generator = event_generator(question, user_id, session_id)
+    else:
+        generator = compact_event_generator(
+            question, user_id, session_id, request.stream, request.include_thoughts
+        )
     return StreamingResponse(
-        event_generator(question, user_id, session_id),
-        media_type="application/json"
-    )
\ No newline at end of file
+        generator,
+        media_type=MEDIA_TYPES[request.stream],
+        headers=STREAM_HEADERS
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Tool, BigQuery, serialization and streaming metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# -------------------------
+# Alerts
+# -------------------------
+# Plain `def` routes: FastAPI runs them on its thread pool, since the first
+# read (or a stale one) refreshes from BigQuery synchronously.
+@app.get("/alerts/low-stock")
+def low_stock(limit: int = 50):
+    return low_stock_alerts(limit)
+
+@app.get("/alerts/expiring")
+def expiring(within_days: int = 30, limit: int = 50):
+    return expiring_alerts(within_days, limit)
+
+@app.get("/alerts/pending-pickup")
+def pending_pickup(min_days_waiting: int = 0, limit: int = 50):
+    return pending_pickup_alerts(min_days_waiting, limit)
+
+@app.get("/alerts/health")
+def alerts_status():
+    return alerts_health()
+
+# -------------------------
+# Reorder planning
+# -------------------------
+@app.get("/inventory/reorder-plan")
+def reorder_plan(supplier: Optional[str] = None, expiry_buffer_days: int = 30, limit: int = 25):
+    from reorder import reorder_planner  # numpy loads on first use, not at startup
+    return reorder_planner.plan(supplier=supplier, expiry_buffer_days=expiry_buffer_days, limit=limit)
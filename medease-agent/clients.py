@@ -1,48 +1,309 @@
 import os
+import re
+import sys
 import json
-from typing import Dict, Any, List
-from google.cloud import bigquery
-from twilio.rest import Client as TwilioClient
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional, Sequence, Tuple
 from datetime import datetime, date
 from decimal import Decimal
-import pandas as pd
+from metrics import (
+    BQ_BYTES, BQ_QUERIES, BQ_ROWS, BQ_SECONDS, BQ_SLOT_MS, SERIALIZATION_SECONDS,
+    log_sampled, query_fingerprint,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# google-cloud-bigquery is imported where it is first used, so importing
+# this module (and starting the service) stays cheap.
+if TYPE_CHECKING:
+    from google.cloud import bigquery
 
 # -------------------------
 # BigQuery Utilities
 # -------------------------
 def json_safe(val):
-    if isinstance(val, (datetime, date, pd.Timestamp)):
+    if isinstance(val, (datetime, date)):
         return val.isoformat()
     if isinstance(val, Decimal):
         # Convert to float (or str if you want exact precision)
         return float(val)
     return val
 
-def get_bigquery_client() -> bigquery.Client:
+def dumps(obj: Any) -> str:
+    """Encodes JSON-safe rows as text, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+_bq_client: Optional["bigquery.Client"] = None
+_bq_client_lock = threading.Lock()
+
+def get_bigquery_client() -> "bigquery.Client":
     """
-    Returns a BigQuery client using GOOGLE_APPLICATION_CREDENTIALS
-    and project ID from environment variables.
+    Returns the process-wide BigQuery client, creating it on first use.
+
+    The client is built once from GOOGLE_APPLICATION_CREDENTIALS and the
+    project ID in the environment, then shared by every tool call so auth
+    and the HTTP session are only set up once. bigquery.Client is safe to
+    share across threads.
     """
-    project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
-    if not project_id:
-        raise ValueError("GOOGLE_CLOUD_PROJECT environment variable not set")
-    return bigquery.Client(project=project_id)
+    global _bq_client
+    if _bq_client is None:
+        with _bq_client_lock:
+            if _bq_client is None:
+                project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
+                if not project_id:
+                    raise ValueError("GOOGLE_CLOUD_PROJECT environment variable not set")
+                from google.cloud import bigquery
+                _bq_client = bigquery.Client(project=project_id)
+    return _bq_client
 
-def query_bigquery_context(sql_query: str) -> str:
-    "Executes a SELECT query on BigQuery to retrieve patient info, drug name, or inventory data required for decision making."
+# -------------------------
+# Query Result Cache
+# -------------------------
+_TABLE_REF_RE = re.compile(r"(?:FROM|JOIN)\s+`?([\w.-]+)`?", re.IGNORECASE)
+
+def normalize_sql(sql_query: str) -> str:
+    """Collapses whitespace so formatting differences share a cache entry."""
+    return " ".join(sql_query.split())
+
+def referenced_tables(sql_query: str) -> Tuple[str, ...]:
+    """
+    Returns the short (unqualified) names of the tables a query reads from,
+    e.g. "Inventory" for `project.dataset.Inventory`.
+    """
+    return tuple(sorted({m.split(".")[-1] for m in _TABLE_REF_RE.findall(sql_query)}))
+
+def _params_key(query_parameters: Optional[Sequence[Any]]) -> Tuple:
+    if not query_parameters:
+        return ()
+    key = []
+    for p in query_parameters:
+        value = getattr(p, "value", None)
+        if value is None and hasattr(p, "values"):
+            value = tuple(p.values)
+        key.append((p.name, getattr(p, "type_", None) or getattr(p, "array_type", None), repr(value)))
+    return tuple(key)
+
+class QueryResultCache:
+    """
+    Thread-safe LRU cache of query results keyed on normalized SQL plus
+    query parameters.
+
+    Entries expire after a per-table TTL (the shortest TTL of the tables the
+    query reads), the cache is capped by total size in bytes, and entries can
+    be dropped by table name when the underlying data changes.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: float, table_ttls: Optional[Dict[str, float]] = None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.table_ttls = {k.lower(): v for k, v in (table_ttls or {}).items()}
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int, float, Tuple[str, ...]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def ttl_for(self, tables: Sequence[str]) -> float:
+        ttls = [self.table_ttls.get(t.lower(), self.default_ttl) for t in tables]
+        return min(ttls) if ttls else self.default_ttl
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value: Any, size: int, tables: Sequence[str]) -> None:
+        ttl = self.ttl_for(tables)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl, tuple(t.lower() for t in tables))
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, table: Optional[str] = None) -> int:
+        """Drops every entry reading `table` (or everything if no table is given)."""
+        with self._lock:
+            if table is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._size = 0
+                return dropped
+            table = table.split(".")[-1].lower()
+            stale = [k for k, e in self._entries.items() if table in e[3]]
+            for k in stale:
+                self._drop(k)
+            return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, key: Tuple) -> None:
+        _, size, _, _ = self._entries.pop(key)
+        self._size -= size
+
+def _parse_table_ttls(spec: str) -> Dict[str, float]:
+    """Parses BQ_CACHE_TABLE_TTLS, e.g. "Inventory=30,Prescriptions=10,Users=300"."""
+    ttls = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        table, _, seconds = item.partition("=")
+        ttls[table.strip()] = float(seconds)
+    return ttls
+
+query_cache = QueryResultCache(
+    max_bytes=int(os.getenv("BQ_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    default_ttl=float(os.getenv("BQ_CACHE_TTL_SECONDS", "60")),
+    table_ttls=_parse_table_ttls(os.getenv("BQ_CACHE_TABLE_TTLS", "")),
+)
+
+def invalidate_query_cache(table: Optional[str] = None) -> int:
+    """Drops cached results for `table` (e.g. after a write). Returns the number of entries dropped."""
+    return query_cache.invalidate(table)
+
+def _estimate_rows_size(rows: Sequence[Dict[str, Any]]) -> int:
+    """Approximates the in-memory size of a result set from a small sample of rows."""
+    if not rows:
+        return sys.getsizeof(rows)
+    sample = rows[:50]
+    sample_size = sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+        for row in sample
+    )
+    return sys.getsizeof(rows) + sample_size * len(rows) // len(sample)
+
+def dry_run_bytes(sql_query: str, query_parameters: Optional[List[Any]] = None) -> int:
+    """Bytes BigQuery would process for a query, from a (free) dry run. Raises on invalid queries."""
+    from google.cloud import bigquery
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=query_parameters or [], dry_run=True, use_query_cache=False
+    )
+    job = get_bigquery_client().query(sql_query, job_config=job_config)
+    return int(job.total_bytes_processed or 0)
+
+def _record_job_stats(row_iterator: Any, table: str, sql_query: str, rows: int, seconds: float) -> Dict[str, Any]:
+    bytes_processed = getattr(row_iterator, "total_bytes_processed", None) or 0
+    slot_ms = getattr(row_iterator, "slot_millis", None) or 0
+    cache_hit = getattr(row_iterator, "cache_hit", None)
+    if cache_hit is None:
+        # query_and_wait results don't carry cache_hit; BigQuery bills 0 bytes for cached results
+        cache_hit = bytes_processed == 0
+    BQ_QUERIES.inc(table=table, cache="bigquery" if cache_hit else "miss")
+    BQ_SECONDS.observe(seconds, table=table)
+    BQ_BYTES.inc(bytes_processed, table=table)
+    BQ_SLOT_MS.inc(slot_ms, table=table)
+    BQ_ROWS.inc(rows, table=table)
+    log_sampled(
+        "bq query=%s table=%s rows=%d bytes=%d slot_ms=%d cache_hit=%s ms=%.1f",
+        query_fingerprint(sql_query), table, rows, bytes_processed, slot_ms, cache_hit, seconds * 1000,
+    )
+    return {"bytes_processed": bytes_processed, "cache": "bigquery" if cache_hit else "miss"}
+
+def iter_query_rows(
+    sql_query: str,
+    query_parameters: Optional[List[Any]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Runs a query and yields rows as plain dicts, page by page.
+
+    Rows are read straight off the RowIterator pages (no DataFrame), and
+    dates, timestamps and NUMERIC values are converted to JSON-native types
+    as each page arrives, so callers can stream large results. If `stats` is
+    given, it receives the job's bytes_processed and cache outcome once all
+    rows have been read.
+    """
+    from google.cloud import bigquery
     bq_client = get_bigquery_client()
-    print(f"[ADK TOOL] Executing BigQuery SELECT: {sql_query[:50]}...")
+    table = "+".join(referenced_tables(sql_query)) or "unknown"
+    start = time.perf_counter()
+    job_config = bigquery.QueryJobConfig(query_parameters=query_parameters or [])
     try:
-        query_job = bq_client.query_and_wait(sql_query)
-        df = query_job.to_dataframe()
-        records = df.to_dict(orient="records")
-        safe_records = [
-            {k: json_safe(v) for k, v in row.items()}
-            for row in records
-        ]
-        return json.dumps(safe_records)
+        row_iterator = bq_client.query_and_wait(sql_query, job_config=job_config)
+    except Exception as e:
+        BQ_QUERIES.inc(table=table, cache="error")
+        log_sampled("bq query=%s table=%s failed: %s", query_fingerprint(sql_query), table,
+                    type(e).__name__, level=logging.WARNING)
+        raise
+    names = None
+    rows = 0
+    decode_seconds = 0.0
+    for page in row_iterator.pages:
+        page_start = time.perf_counter()
+        converted = []
+        for row in page:
+            if names is None:
+                names = list(row.keys())
+            converted.append(dict(zip(names, map(json_safe, row.values()))))
+        decode_seconds += time.perf_counter() - page_start
+        rows += len(converted)
+        yield from converted
+    SERIALIZATION_SECONDS.observe(decode_seconds, stage="rows")
+    job_stats = _record_job_stats(row_iterator, table, sql_query, rows, time.perf_counter() - start)
+    if stats is not None:
+        stats.update(job_stats)
+
+def query_rows(
+    sql_query: str,
+    query_parameters: Optional[List[Any]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Returns the rows of a SELECT query as a list of JSON-safe dicts.
+
+    Results are served from the query cache when possible; the returned dicts
+    may be shared with the cache and must be treated as read-only. If `stats`
+    is given, it receives bytes_processed (0 when served locally) and the
+    cache outcome ("local", "bigquery" or "miss").
+    Raises on query errors.
+    """
+    cache_key = (normalize_sql(sql_query), _params_key(query_parameters))
+    cached = query_cache.get(cache_key)
+    if cached is not None:
+        BQ_QUERIES.inc(table="+".join(referenced_tables(sql_query)) or "unknown", cache="local")
+        if stats is not None:
+            stats.update(bytes_processed=0, cache="local")
+        return list(cached)
+
+    rows = list(iter_query_rows(sql_query, query_parameters, stats))
+    query_cache.put(cache_key, tuple(rows), _estimate_rows_size(rows), referenced_tables(sql_query))
+    return rows
+
+def query_bigquery_context(sql_query: str, query_parameters: Optional[List[Any]] = None) -> str:
+    "Executes a SELECT query on BigQuery to retrieve patient info, drug name, or inventory data required for decision making."
+    try:
+        rows = query_rows(sql_query, query_parameters)
     except Exception as e:
         return json.dumps({"status": "ERROR", "message": str(e)})
+    with SERIALIZATION_SECONDS.time(stage="json"):
+        return dumps(rows)
 
 # -------------------------
 # Twilio SMS Utility
@@ -64,34 +325,3 @@ def normalize_us_phone(phone: str) -> str:
         raise ValueError(f"Invalid US phone number format: {phone}")
 
     return f"+1{digits}"
-
-def send_patient_sms(to_number: str, message_body: str) -> str:
-    """
-    Sends an SMS message using Twilio.
-    """
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    twilio_number = os.getenv("TWILIO_PHONE_NUMBER")
-
-    if not all([account_sid, auth_token, twilio_number]):
-        raise ValueError("Twilio environment variables not set")
-
-    try:
-        # Normalize to Twilio-friendly E.164 format
-        normalized_number = normalize_us_phone(to_number)
-
-        client = TwilioClient(account_sid, auth_token)
-        message = client.messages.create(
-            body=message_body,
-            from_=twilio_number,
-            to=normalized_number
-        )
-        print(f"[ADK TOOL] SMS sent to {to_number}, SID: {message.sid}")
-        return json.dumps({
-            "status": "SUCCESS",
-            "sid": message.sid,
-            "to": to_number
-        })
-    except Exception as e:
-        print(f"[ADK TOOL] Twilio SMS error: {e}")
-        return json.dumps({"status": "ERROR", "message": str(e)})
\ No newline at end of file
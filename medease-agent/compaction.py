@@ -0,0 +1,309 @@
+"""
+Compaction of tool results before they reach the model.
+
+Every tool result stays in the conversation for the rest of the turn (and the
+session), so each later model step pays for it again. Results with "rows"
+are shrunk before the model sees them:
+
+- tools in COMPACTION_PROFILES return their profile's columns unless the
+  model asked for specific `columns` (the rest are listed in "omitted_columns");
+- null fields are dropped from each row;
+- fields with the same value in every row are moved to "common";
+- above COMPACTION_MAX_ROWS rows (or COMPACTION_MAX_CHARS characters), the
+  rows are replaced by a "summary" (count, min/max for numbers and dates,
+  top values for text), a few "sample" rows and the row "ids", at most
+  COMPACTION_MAX_IDS of them ("ids_truncated" marks the rest as left out), except
+  for ROW_HANDOFF_TOOLS, whose rows the model passes on to other tools.
+
+Full rows of the query tools are kept per session, so get_full_records can
+return them by id without another query. The tokens saved are estimated
+per turn (see pop_turn_stats) and counted in medease_tool_result_tokens_total.
+"""
+import functools
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from metrics import registry
+from tool_memo import call_tool, session_id_of, tool_signature
+
+COMPACTION_MAX_ROWS = int(os.getenv("COMPACTION_MAX_ROWS", "25"))
+COMPACTION_MAX_CHARS = int(os.getenv("COMPACTION_MAX_CHARS", "8000"))
+COMPACTION_SAMPLE_ROWS = int(os.getenv("COMPACTION_SAMPLE_ROWS", "5"))
+COMPACTION_MAX_IDS = int(os.getenv("COMPACTION_MAX_IDS", str(COMPACTION_MAX_ROWS * 4)))
+COMPACTION_TOP_K = int(os.getenv("COMPACTION_TOP_K", "5"))
+COMPACTION_STASH_ROWS = int(os.getenv("COMPACTION_STASH_ROWS", "20000"))
+
+# Rough size of a token in JSON text, for reporting savings
+CHARS_PER_TOKEN = 4
+
+# Columns returned when the model doesn't pass `columns`; wide free-text and
+# bookkeeping columns are left out
+COMPACTION_PROFILES = {
+    "get_prescriptions": (
+        "id", "patientId", "patientName", "medication", "dosage", "quantity", "status",
+        "priority", "insuranceStatus", "dateCreated", "dateFilled", "refillsRemaining",
+    ),
+    "get_users": ("id", "name", "role", "phone", "email"),
+    "check_inventory": (
+        "id", "name", "genericName", "ndc", "currentStock", "minThreshold", "maxStock",
+        "needsReorder", "supplier", "expirationDate", "location",
+    ),
+}
+
+# Record source (see get_full_records) of each tool's rows
+TOOL_SOURCES = {
+    "get_prescriptions": "prescriptions",
+    "get_prescriptions_with_patients": "prescriptions",
+    "get_pending_pickups": "prescriptions",
+    "get_users": "users",
+    "check_inventory": "inventory",
+    "get_low_stock_alerts": "inventory",
+}
+
+# Tools whose rows the model may pass on verbatim (to send_prescription_reminders),
+# so their rows are never summarized and every row keeps all of its fields
+ROW_HANDOFF_TOOLS = frozenset({"get_prescriptions_with_patients"})
+
+COMPACTION_EXCLUDED_TOOLS = frozenset({
+    "notify_patient", "notify_patients", "send_prescription_reminders", "get_full_records",
+})
+
+RESULT_TOKENS = registry.counter(
+    "medease_tool_result_tokens_total", "Estimated tokens of tool results before and after compaction.",
+    ["tool", "stage"],
+)
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+# -------------------------
+# Row compaction
+# -------------------------
+def estimate_tokens(value: Any) -> int:
+    return len(json.dumps(value, default=str, separators=(",", ":"))) // CHARS_PER_TOKEN
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _column_summary(values: List[Any], top_k: int) -> Dict[str, Any]:
+    """count, min/max (and mean) for numbers and ISO dates, distinct and most common values otherwise."""
+    present = [v for v in values if v is not None]
+    summary: Dict[str, Any] = {"count": len(present)}
+    if not present:
+        return summary
+    if all(_is_number(v) for v in present):
+        summary.update(min=min(present), max=max(present), mean=round(sum(present) / len(present), 2))
+    elif all(isinstance(v, str) and _DATE_RE.match(v) for v in present):
+        summary.update(min=min(present), max=max(present))
+    else:
+        counts = Counter(json.dumps(v, default=str) if isinstance(v, (dict, list)) else v for v in present)
+        summary["distinct"] = len(counts)
+        top = [[value, n] for value, n in counts.most_common(top_k) if n > 1]
+        if top:
+            summary["top"] = top
+    return summary
+
+def compact_rows(
+    rows: Sequence[Dict[str, Any]],
+    columns: Optional[Sequence[str]] = None,
+    hoist: bool = True,
+    key: str = "id",
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any], List[str]]:
+    """
+    Narrows rows to `columns` and drops their null fields.
+
+    Args:
+        rows: result rows (not modified).
+        columns: columns to keep; None keeps every column.
+        hoist: move fields that have the same value in every row (other than `key`) to "common".
+        key: row id column, never hoisted.
+
+    Returns:
+        (compacted rows, common fields, omitted column names)
+    """
+    seen: Dict[str, None] = {}
+    for row in rows:
+        seen.update(dict.fromkeys(row))
+    omitted = [c for c in seen if columns is not None and c not in columns]
+    kept = [c for c in seen if c not in omitted]
+
+    common: Dict[str, Any] = {}
+    if hoist and len(rows) > 1:
+        for column in kept:
+            if column == key:
+                continue
+            first = rows[0].get(column)
+            if first is not None and all(row.get(column) == first for row in rows):
+                common[column] = first
+
+    compacted = [
+        {c: row[c] for c in kept if c not in common and row.get(c) is not None}
+        for row in rows
+    ]
+    return compacted, common, omitted
+
+# -------------------------
+# Compactor
+# -------------------------
+class ResultCompactor:
+    def __init__(
+        self,
+        max_rows: int = COMPACTION_MAX_ROWS,
+        max_chars: int = COMPACTION_MAX_CHARS,
+        sample_rows: int = COMPACTION_SAMPLE_ROWS,
+        max_ids: int = COMPACTION_MAX_IDS,
+        top_k: int = COMPACTION_TOP_K,
+        stash_rows: int = COMPACTION_STASH_ROWS,
+        max_turns: int = 1024,
+    ):
+        self.max_rows = max_rows
+        self.max_chars = max_chars
+        self.sample_rows = sample_rows
+        self.max_ids = max_ids
+        self.top_k = top_k
+        self.stash_rows = stash_rows
+        self.max_turns = max_turns
+        self._stash: "OrderedDict[Tuple[str, str, Any], Dict[str, Any]]" = OrderedDict()
+        self._turns: "OrderedDict[str, Counter]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compact(
+        self,
+        tool: str,
+        result: Any,
+        columns: Optional[Sequence[str]] = None,
+        session_id: Optional[str] = None,
+        invocation_id: Optional[str] = None,
+    ) -> Any:
+        """
+        Returns the compacted form of a tool result (a new dict; `result` is
+        not modified). Results without a "rows" list, and ERROR results, are
+        returned as they are.
+
+        Args:
+            tool: tool name, selecting its column profile and record source.
+            result: the tool's return value.
+            columns: the `columns` argument the model passed, if any.
+            session_id: session to keep the full rows under, for get_full_records.
+            invocation_id: turn to count the saved tokens against.
+        """
+        if not isinstance(result, dict) or not isinstance(result.get("rows"), list) or result.get("status") == "ERROR":
+            return result
+        rows = result["rows"]
+        source = TOOL_SOURCES.get(tool)
+        profile = None if columns else COMPACTION_PROFILES.get(tool)
+        if session_id is not None and source and tool in COMPACTION_PROFILES and not columns and "rewritten" not in result:
+            self._keep(session_id, source, rows)
+
+        handoff = tool in ROW_HANDOFF_TOOLS
+        compacted_rows, common, omitted = compact_rows(rows, profile, hoist=not handoff)
+        compacted = {k: v for k, v in result.items() if k != "rows"}
+        if not handoff and (
+            len(rows) > self.max_rows or estimate_tokens(compacted_rows) * CHARS_PER_TOKEN > self.max_chars
+        ):
+            summary_columns = dict.fromkeys(c for row in compacted_rows for c in row)
+            summary_columns.pop("id", None)
+            compacted.update(
+                total_rows=len(rows),
+                summary={c: _column_summary([row.get(c) for row in compacted_rows], self.top_k) for c in summary_columns},
+                sample=compacted_rows[:self.sample_rows],
+            )
+            ids = [row["id"] for row in rows if row.get("id") is not None]
+            truncated = len(ids) > self.max_ids
+            if ids:
+                compacted["ids"] = ids[:self.max_ids]
+            if truncated:
+                compacted["ids_truncated"] = True
+            compacted["note"] = (
+                f"{len(rows)} rows summarized to save context. "
+                + (f"Only the first {self.max_ids} ids are listed. " if truncated else "")
+                + (f'Call get_full_records("{source}", ids) for the rows you need, ' if source and ids else "")
+                + "narrow the filters"
+                + (" (or use next_page_token)" if result.get("next_page_token") else "")
+                + ", or pass the same filters to a tool that accepts them."
+            )
+        else:
+            compacted["rows"] = compacted_rows
+        if common:
+            compacted["common"] = common
+        if omitted:
+            compacted["omitted_columns"] = omitted
+
+        before, after = estimate_tokens(result), estimate_tokens(compacted)
+        RESULT_TOKENS.inc(before, tool=tool, stage="raw")
+        RESULT_TOKENS.inc(after, tool=tool, stage="compacted")
+        self._count(invocation_id, before, after)
+        return compacted
+
+    def _keep(self, session_id: str, source: str, rows: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            for row in rows:
+                if row.get("id") is None:
+                    continue
+                key = (session_id, source, row["id"])
+                self._stash[key] = row
+                self._stash.move_to_end(key)
+            while len(self._stash) > self.stash_rows:
+                self._stash.popitem(last=False)
+
+    def lookup(self, session_id: Optional[str], source: str, ids: Iterable[Any]) -> Dict[Any, Dict[str, Any]]:
+        """Full rows of `source` kept for the session, by id; ids not kept are left out."""
+        if session_id is None:
+            return {}
+        found = {}
+        with self._lock:
+            for row_id in ids:
+                row = self._stash.get((session_id, source, row_id))
+                if row is not None:
+                    found[row_id] = row
+        return found
+
+    def _count(self, invocation_id: Optional[str], before: int, after: int) -> None:
+        if invocation_id is None:
+            return
+        with self._lock:
+            counts = self._turns.get(invocation_id)
+            if counts is None:
+                counts = self._turns[invocation_id] = Counter()
+                while len(self._turns) > self.max_turns:
+                    self._turns.popitem(last=False)
+            counts["before"] += before
+            counts["after"] += after
+
+    def pop_turn_stats(self, invocation_id: Optional[str]) -> Dict[str, int]:
+        """
+        Returns and forgets the compaction stats of one turn: estimated tool
+        result tokens before and after compaction, and the tokens saved.
+        """
+        with self._lock:
+            counts = self._turns.pop(invocation_id, Counter()) if invocation_id else Counter()
+        return {
+            "result_tokens": counts["before"],
+            "compacted_tokens": counts["after"],
+            "tokens_saved": counts["before"] - counts["after"],
+        }
+
+compactor = ResultCompactor()
+
+def compact_tool(fn: Callable, compactor: ResultCompactor = compactor) -> Callable:
+    """Wraps a tool so its result is compacted before the model sees it."""
+    if fn.__name__ in COMPACTION_EXCLUDED_TOOLS:
+        raise ValueError(f"Tool '{fn.__name__}' must not be compacted")
+
+    @functools.wraps(fn)
+    async def wrapper(tool_context=None, **kwargs):
+        result = await call_tool(fn, kwargs, tool_context)
+        return compactor.compact(
+            fn.__name__, result, kwargs.get("columns"),
+            session_id_of(tool_context), getattr(tool_context, "invocation_id", None),
+        )
+
+    wrapper.__signature__ = tool_signature(fn)
+    return wrapper
+
+def compact_tools(tools: List[Callable]) -> List[Callable]:
+    """Compacts the results of every tool except those in COMPACTION_EXCLUDED_TOOLS."""
+    return [t if t.__name__ in COMPACTION_EXCLUDED_TOOLS else compact_tool(t) for t in tools]
@@ -0,0 +1,199 @@
+"""
+Bytes-scanned budget for the queries agent tools generate.
+
+The model picks filters, `columns` and `limit` freely, so a single call can
+scan a whole table. Before a tool query runs, it is priced with a BigQuery
+dry run. Estimates are cached per query shape: the SQL text built by
+query_builder only depends on the filter columns, projection and limit, and
+BigQuery prices a query by the columns it reads, not by the parameter values.
+
+A query estimated over its tool's budget is rewritten once, to the table's
+summary projection and at most REWRITE_LIMIT rows; if that still does not fit,
+the tool returns an error asking for narrower filters instead of running it.
+Estimated and actual bytes are returned to the caller with the rows.
+
+Single-table tool queries are paged by keyset on the table's id, with a
+continuation token (pagination.py) for the next page.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from clients import dry_run_bytes, normalize_sql, query_rows
+from metrics import BQ_BUDGET, BQ_DRY_RUNS, log_sampled
+from pagination import decode_page_token, encode_page_token
+from query_builder import MAX_LIMIT, build_filter_query
+
+DEFAULT_BYTES_BUDGET = int(os.getenv("BQ_TOOL_BYTES_BUDGET", str(1_000_000_000)))
+REWRITE_LIMIT = int(os.getenv("BQ_BUDGET_REWRITE_LIMIT", "20"))
+ESTIMATE_TTL_SECONDS = float(os.getenv("BQ_DRY_RUN_TTL_SECONDS", "600"))
+MAX_ESTIMATES = 1024
+
+def _parse_budgets(spec: str) -> Dict[str, int]:
+    """Parses BQ_TOOL_BYTES_BUDGETS, e.g. "get_prescriptions=200000000,get_users=50000000"."""
+    budgets = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        tool, _, limit = item.partition("=")
+        budgets[tool.strip()] = int(limit)
+    return budgets
+
+TOOL_BYTES_BUDGETS = _parse_budgets(os.getenv("BQ_TOOL_BYTES_BUDGETS", ""))
+
+def bytes_budget(tool: str) -> int:
+    return TOOL_BYTES_BUDGETS.get(tool, DEFAULT_BYTES_BUDGET)
+
+# -------------------------
+# Dry-run estimates, cached per query shape
+# -------------------------
+_estimates: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+_estimates_lock = threading.Lock()
+
+def estimate_query_bytes(sql_query: str, query_parameters: Optional[List[Any]] = None) -> int:
+    """Dry-run estimate of the bytes a query would scan. Raises if the dry run fails."""
+    key = normalize_sql(sql_query)
+    now = time.monotonic()
+    with _estimates_lock:
+        entry = _estimates.get(key)
+        if entry is not None and entry[0] > now:
+            _estimates.move_to_end(key)
+            BQ_DRY_RUNS.inc(source="cached")
+            return entry[1]
+
+    estimate = dry_run_bytes(sql_query, query_parameters)
+    BQ_DRY_RUNS.inc(source="dry_run")
+    with _estimates_lock:
+        _estimates[key] = (now + ESTIMATE_TTL_SECONDS, estimate)
+        _estimates.move_to_end(key)
+        while len(_estimates) > MAX_ESTIMATES:
+            _estimates.popitem(last=False)
+    return estimate
+
+def _try_estimate(sql_query: str, query_parameters: List[Any]) -> Optional[int]:
+    try:
+        return estimate_query_bytes(sql_query, query_parameters)
+    except Exception as e:
+        # A failing dry run doesn't block the query; the real run reports any SQL error
+        log_sampled("dry run failed: %s", type(e).__name__, level=logging.WARNING)
+        return None
+
+# -------------------------
+# Budgeted tool queries
+# -------------------------
+QueryBuilder = Callable[[Optional[Sequence[str]], int], Tuple[str, List[Any]]]
+
+def run_within_budget(
+    tool: str,
+    build: QueryBuilder,
+    requested_columns: Sequence[str],
+    summary_columns: Sequence[str],
+    limit: int = 50,
+    columns: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Prices and runs a tool query within `tool`'s bytes budget.
+
+    Args:
+        tool: tool name, used to look up its budget.
+        build: build(columns, limit) -> (sql, query_parameters); called again
+            with the narrowed projection and limit if the query is over budget.
+        requested_columns: the projection actually requested (all columns if `columns` is None).
+        summary_columns: narrow projection to fall back to when over budget.
+        limit, columns: the caller's limit and projection.
+
+    Returns:
+        As for run_budgeted_query.
+    """
+    budget = bytes_budget(tool)
+    sql_query, query_parameters = build(columns, limit)
+    estimated = _try_estimate(sql_query, query_parameters)
+    rewritten = None
+
+    if estimated is not None and estimated > budget:
+        narrow = [c for c in requested_columns if c in summary_columns] or list(summary_columns)
+        narrow_limit = min(int(limit), REWRITE_LIMIT)
+        sql_query, query_parameters = build(narrow, narrow_limit)
+        narrow_estimate = _try_estimate(sql_query, query_parameters)
+        if narrow_estimate is None or narrow_estimate > budget:
+            BQ_BUDGET.inc(tool=tool, outcome="rejected")
+            log_sampled("tool=%s rejected: estimated=%d budget=%d", tool, narrow_estimate or estimated, budget,
+                        level=logging.WARNING)
+            return {
+                "status": "ERROR",
+                "message": (
+                    f"Query would scan about {estimated:,} bytes ({narrow_estimate or estimated:,} with summary "
+                    f"columns), over the {budget:,}-byte budget for {tool}. "
+                    "Add more selective filters or request fewer columns."
+                ),
+                "estimated_bytes": estimated,
+                "budget_bytes": budget,
+            }
+        rewritten = {"columns": narrow, "limit": narrow_limit, "budget_bytes": budget}
+        estimated = narrow_estimate
+
+    BQ_BUDGET.inc(tool=tool, outcome="rewritten" if rewritten else "within")
+    stats: Dict[str, Any] = {}
+    rows = query_rows(sql_query, query_parameters, stats)
+    result = {
+        "rows": rows,
+        "estimated_bytes": estimated,
+        "bytes_processed": stats.get("bytes_processed", 0),
+    }
+    if rewritten:
+        result["rewritten"] = rewritten
+    return result
+
+def run_budgeted_query(
+    tool: str,
+    table: str,
+    column_types: Dict[str, str],
+    summary_columns: Sequence[str],
+    filters: Optional[Dict[str, Any]],
+    limit: int = 50,
+    columns: Optional[Sequence[str]] = None,
+    page_token: Optional[str] = None,
+    key: str = "id",
+) -> Dict[str, Any]:
+    """
+    Builds, prices and runs one page of a filter query within `tool`'s bytes budget.
+
+    Rows are ordered by `key` (which is always part of the projection); when
+    more rows match, "next_page_token" continues after the last one.
+
+    Args:
+        tool: tool name, used to look up its budget.
+        table: fully qualified table id.
+        column_types: the table's column -> schema type map.
+        summary_columns: narrow projection to fall back to when over budget.
+        filters, limit, columns: as for query_builder.build_filter_query.
+        page_token: "next_page_token" from the previous page of the same query.
+        key: unique column to page by.
+
+    Returns:
+        {"rows": [...], "estimated_bytes": int or None, "bytes_processed": int},
+        plus "next_page_token" if more rows match, "rewritten": {"columns",
+        "limit", "budget_bytes"} if the query was narrowed to fit, or an ERROR
+        dict with the estimate if it could not be.
+
+    Raises:
+        ValueError: on invalid filters, columns or page_token.
+    """
+    after = decode_page_token(page_token, tool, filters) if page_token else None
+
+    def build(cols: Optional[Sequence[str]], n: int) -> Tuple[str, List[Any]]:
+        if cols and key not in cols:
+            cols = [key, *cols]
+        return build_filter_query(table, column_types, filters, n, cols, order_by=key, after=after)
+
+    result = run_within_budget(
+        tool, build, list(columns) if columns else list(column_types), summary_columns, limit, columns
+    )
+    rows = result.get("rows")
+    page_size = result["rewritten"]["limit"] if "rewritten" in result else max(1, min(int(limit), MAX_LIMIT))
+    if rows is not None and len(rows) > page_size:
+        # build_filter_query fetched one row past the page to detect the next one
+        del rows[page_size:]
+        result["next_page_token"] = encode_page_token(tool, filters, rows[-1][key])
+    return result
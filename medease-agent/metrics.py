@@ -0,0 +1,226 @@
+"""
+In-process metrics and sampled, PII-free logging for the agent service.
+
+Counters and histograms are kept in memory and rendered in the Prometheus
+text exposition format by the /metrics route in app.py. Log lines never
+include SQL values, result rows, phone numbers or message bodies: queries
+are identified by a short hash of their (parameterized) text, and only
+counts, sizes and timings are logged. Routine lines are sampled at
+LOG_SAMPLE_RATE; warnings and errors are always logged.
+"""
+import functools
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Sequence, Tuple
+
+from tool_memo import call_tool, tool_signature
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_str(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.label_names), 0.0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_label_str(self.label_names, key)} {value:g}"
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%g"' % bound
+                yield f"{self.name}_bucket{_label_str(self.label_names, key, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_label_str(self.label_names, key, le)} {series[-1]}"
+            yield f"{self.name}_sum{_label_str(self.label_names, key)} {series[-2]:g}"
+            yield f"{self.name}_count{_label_str(self.label_names, key)} {series[-1]}"
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# -------------------------
+# Metrics
+# -------------------------
+TOOL_CALLS = registry.counter("medease_tool_calls_total", "Agent tool calls.", ["tool", "status"])
+TOOL_SECONDS = registry.histogram("medease_tool_duration_seconds", "Agent tool call latency.", ["tool"])
+
+BQ_QUERIES = registry.counter(
+    "medease_bq_queries_total", "BigQuery queries by cache outcome (local, bigquery, miss, error).", ["table", "cache"]
+)
+BQ_SECONDS = registry.histogram("medease_bq_query_duration_seconds", "BigQuery query latency, including row fetch.", ["table"])
+BQ_BYTES = registry.counter("medease_bq_bytes_processed_total", "Bytes processed by BigQuery jobs.", ["table"])
+BQ_SLOT_MS = registry.counter("medease_bq_slot_ms_total", "Slot milliseconds consumed by BigQuery jobs.", ["table"])
+BQ_ROWS = registry.counter("medease_bq_rows_returned_total", "Rows returned by BigQuery.", ["table"])
+BQ_DRY_RUNS = registry.counter("medease_bq_dry_runs_total", "Cost estimates by source (cached or dry_run).", ["source"])
+BQ_BUDGET = registry.counter(
+    "medease_bq_budget_total", "Budget checks by tool and outcome (within, rewritten, rejected).", ["tool", "outcome"]
+)
+
+SERIALIZATION_SECONDS = registry.histogram(
+    "medease_serialization_seconds", "Time spent converting or encoding results.", ["stage"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+
+STREAM_EVENT_SECONDS = registry.histogram(
+    "medease_stream_event_gap_seconds", "Time between consecutive streamed events (first: since request start).",
+    ["format", "position"],
+)
+STREAM_EVENTS = registry.counter("medease_stream_events_total", "Events streamed to clients.", ["format"])
+
+class StreamTimer:
+    """Records the gap before each streamed event of one response."""
+
+    def __init__(self, stream_format: str):
+        self.stream_format = stream_format
+        self.events = 0
+        self._last = time.perf_counter()
+
+    def mark(self) -> None:
+        now = time.perf_counter()
+        position = "first" if self.events == 0 else "next"
+        STREAM_EVENT_SECONDS.observe(now - self._last, format=self.stream_format, position=position)
+        STREAM_EVENTS.inc(format=self.stream_format)
+        self.events += 1
+        self._last = now
+
+# -------------------------
+# Sampled, PII-free logging
+# -------------------------
+logger = logging.getLogger("medease")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
+    logger.propagate = False
+
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+def log_sampled(message: str, *args: Any, level: int = logging.INFO) -> None:
+    """Logs routine events for a LOG_SAMPLE_RATE fraction of calls; warnings and above always."""
+    if level >= logging.WARNING or random.random() < LOG_SAMPLE_RATE:
+        logger.log(level, message, *args)
+
+def query_fingerprint(sql_query: str) -> str:
+    """Short stable id for a query shape, safe to log (no SQL text or values)."""
+    return hashlib.sha1(" ".join(sql_query.split()).encode()).hexdigest()[:12]
+
+# -------------------------
+# Tool instrumentation
+# -------------------------
+def _is_error(result: Any) -> bool:
+    return isinstance(result, dict) and (result.get("status") == "ERROR" or "error" in result)
+
+def instrument_tool(fn: Callable) -> Callable:
+    """Wraps a tool so every call is timed and counted by status."""
+    @functools.wraps(fn)
+    async def wrapper(tool_context=None, **kwargs):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            result = await call_tool(fn, kwargs, tool_context)
+            if _is_error(result):
+                status = "error"
+            return result
+        except Exception:
+            status = "exception"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            TOOL_SECONDS.observe(elapsed, tool=fn.__name__)
+            TOOL_CALLS.inc(tool=fn.__name__, status=status)
+            log_sampled("tool=%s status=%s ms=%.1f", fn.__name__, status, elapsed * 1000,
+                        level=logging.WARNING if status != "ok" else logging.INFO)
+
+    wrapper.__signature__ = tool_signature(fn)
+    return wrapper
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,256 @@
+"""
+Asynchronous SMS dispatch for patient notifications.
+
+Messages go through one pooled httpx client straight to the Twilio REST API
+(TWILIO_API_BASE can point at a local stand-in). Dispatch is capped by
+concurrency and a token-bucket rate limit matching the sender's provider
+limit. Only failures where the message provably wasn't accepted are
+retried, with exponential backoff: 429, 503 and errors before the request
+went out (connect errors and timeouts, pool timeouts). Any other failure
+(a 500/502/504, or a timeout or broken connection after the request was
+sent) may still have delivered it, so it is reported as UNKNOWN and its
+key is remembered as if sent rather than risking a duplicate text. Each message has an idempotency key (by default the phone
+number plus body), and a key already sent within the dedup window is not
+sent again. Sent keys are forgotten when their window ends, and the oldest
+go first once more than dedup_max_entries are held.
+
+The dispatcher runs on its own event loop thread; NotificationQueue is the
+thread-safe entry point the (synchronous) agent tools use.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from clients import normalize_us_phone
+from metrics import log_sampled, registry
+
+SMS_SENT = registry.counter("medease_sms_total", "SMS dispatch outcomes.", ["status"])
+SMS_SECONDS = registry.histogram("medease_sms_duration_seconds", "SMS delivery latency including retries.")
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class SmsDispatcher:
+    # The request was refused or never sent, so retrying can't duplicate the message
+    RETRYABLE_STATUS = {429, 503}
+    RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        from_number: str,
+        api_base: str = "https://api.twilio.com",
+        max_concurrency: int = 4,
+        rate_per_second: float = 1.0,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+        dedup_seconds: float = 86400.0,
+        dedup_max_entries: int = 100_000,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.api_base = api_base.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.dedup_seconds = dedup_seconds
+        self.dedup_max_entries = dedup_max_entries
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._limiter: Optional[RateLimiter] = None
+        # idempotency key -> (expires_at, result), oldest first
+        self._sent: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def _ensure_started(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_base,
+                auth=(self.account_sid, self.auth_token),
+                timeout=httpx.Timeout(10.0),
+                limits=httpx.Limits(max_connections=self.max_concurrency),
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._limiter = RateLimiter(self.rate_per_second, burst=max(1, int(self.rate_per_second)))
+
+    @staticmethod
+    def idempotency_key(to_number: str, body: str) -> str:
+        return hashlib.sha256(f"{to_number}\n{body}".encode()).hexdigest()
+
+    async def send(self, to_number: str, body: str, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Sends one SMS unless the same idempotency key was already sent (or is
+        being sent). A message whose delivery is UNKNOWN counts as sent.
+        """
+        try:
+            normalized_number = normalize_us_phone(to_number)
+        except ValueError as e:
+            return {"status": "FAILED", "to": to_number, "message": str(e)}
+        key = idempotency_key or self.idempotency_key(normalized_number, body)
+
+        sent = self._sent.get(key)
+        if sent is not None and sent[0] > time.monotonic():
+            return {**sent[1], "deduplicated": True}
+        pending = self._pending.get(key)
+        if pending is not None:
+            return {**(await asyncio.shield(pending)), "idempotency_key": key, "deduplicated": True}
+
+        task = asyncio.ensure_future(self._deliver(normalized_number, to_number, body))
+        self._pending[key] = task
+        try:
+            result = {**(await asyncio.shield(task)), "idempotency_key": key}
+        finally:
+            self._pending.pop(key, None)
+        if result["status"] in ("SUCCESS", "UNKNOWN"):
+            self._remember(key, result)
+        return result
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        # Every entry has the same window, so the oldest entries expire first
+        now = time.monotonic()
+        self._sent[key] = (now + self.dedup_seconds, result)
+        self._sent.move_to_end(key)
+        while self._sent:
+            expires_at, _ = next(iter(self._sent.values()))
+            if expires_at > now and len(self._sent) <= self.dedup_max_entries:
+                break
+            self._sent.popitem(last=False)
+
+    async def send_many(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sends dicts with `to`, `body` and optional `idempotency_key` concurrently, within the limits."""
+        return await asyncio.gather(*(
+            self.send(m["to"], m["body"], m.get("idempotency_key")) for m in messages
+        ))
+
+    async def _deliver(self, normalized_number: str, to_number: str, body: str) -> Dict[str, Any]:
+        self._ensure_started()
+        url = f"/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        data = {"To": normalized_number, "From": self.from_number, "Body": body}
+        start = time.monotonic()
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._limiter.acquire()
+                retry_after = None
+                try:
+                    response = await self._client.post(url, data=data)
+                    if response.status_code < 300:
+                        sid = response.json().get("sid")
+                        SMS_SENT.inc(status="sent")
+                        SMS_SECONDS.observe(time.monotonic() - start)
+                        log_sampled("sms sent sid=%s attempts=%d", sid, attempt + 1)
+                        return {"status": "SUCCESS", "sid": sid, "to": to_number}
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code >= 500 and response.status_code not in self.RETRYABLE_STATUS:
+                        return self._unknown(to_number, error)
+                    if response.status_code not in self.RETRYABLE_STATUS:
+                        SMS_SENT.inc(status="rejected")
+                        log_sampled("sms rejected status=%d", response.status_code, level=logging.WARNING)
+                        return {"status": "ERROR", "to": to_number, "message": error}
+                    retry_after = response.headers.get("Retry-After")
+                except self.RETRYABLE_ERRORS as e:
+                    error = f"{type(e).__name__}: {e}"
+                except httpx.TransportError as e:
+                    return self._unknown(to_number, f"{type(e).__name__}: {e}")
+                if attempt < self.max_retries:
+                    delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() / 2)
+                    if retry_after and retry_after.isdigit():
+                        delay = max(delay, float(retry_after))
+                    await asyncio.sleep(delay)
+        SMS_SENT.inc(status="failed")
+        log_sampled("sms failed after %d attempts", self.max_retries + 1, level=logging.WARNING)
+        return {"status": "ERROR", "to": to_number, "message": error}
+
+    def _unknown(self, to_number: str, error: str) -> Dict[str, Any]:
+        SMS_SENT.inc(status="unknown")
+        log_sampled("sms outcome unknown: %s", error.split(":")[0], level=logging.WARNING)
+        return {
+            "status": "UNKNOWN",
+            "to": to_number,
+            "message": f"{error} (the message may have been delivered, so it will not be sent again)",
+        }
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class NotificationQueue:
+    """Runs an SmsDispatcher on a dedicated event-loop thread and accepts work from any thread."""
+
+    def __init__(self, dispatcher: SmsDispatcher):
+        self.dispatcher = dispatcher
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="sms-dispatch", daemon=True)
+        self._thread.start()
+
+    def submit(self, to_number: str, body: str, idempotency_key: Optional[str] = None) -> Future:
+        return asyncio.run_coroutine_threadsafe(
+            self.dispatcher.send(to_number, body, idempotency_key), self._loop
+        )
+
+    def submit_many(self, messages: List[Dict[str, Any]]) -> Future:
+        return asyncio.run_coroutine_threadsafe(self.dispatcher.send_many(messages), self._loop)
+
+    def close(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.dispatcher.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+_queue: Optional[NotificationQueue] = None
+_queue_lock = threading.Lock()
+
+def get_notification_queue() -> NotificationQueue:
+    """Returns the process-wide notification queue, configured from the environment."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+                auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+                twilio_number = os.getenv("TWILIO_PHONE_NUMBER")
+                if not all([account_sid, auth_token, twilio_number]):
+                    raise ValueError("Twilio environment variables not set")
+                _queue = NotificationQueue(SmsDispatcher(
+                    account_sid,
+                    auth_token,
+                    twilio_number,
+                    api_base=os.getenv("TWILIO_API_BASE", "https://api.twilio.com"),
+                    max_concurrency=int(os.getenv("SMS_MAX_CONCURRENCY", "4")),
+                    rate_per_second=float(os.getenv("SMS_RATE_PER_SECOND", "1")),
+                    max_retries=int(os.getenv("SMS_MAX_RETRIES", "3")),
+                    dedup_seconds=float(os.getenv("SMS_DEDUP_SECONDS", "86400")),
+                    dedup_max_entries=int(os.getenv("SMS_DEDUP_MAX_ENTRIES", "100000")),
+                ))
+    return _queue
@@ -0,0 +1,84 @@
+"""
+Fan-out orchestration helpers for the agent (AGENT_ORCHESTRATION=parallel).
+
+A multi-domain question is answered by domain sub-agents running under a
+ParallelAgent, each writing its findings to session state, and a final
+agent that merges them. TimeoutAgent bounds each branch: when its deadline
+passes, the branch is cancelled and its findings are recorded as timed out,
+so one slow lookup doesn't hold up the others and a turn takes about as long
+as its slowest (bounded) branch plus the merge.
+"""
+import asyncio
+import time
+from typing import AsyncGenerator, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from metrics import registry
+
+BRANCH_SECONDS = registry.histogram(
+    "medease_agent_branch_seconds", "Fan-out branch duration by outcome (ok, timeout, error).", ["branch", "outcome"],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+
+class TimeoutAgent(BaseAgent):
+    """
+    Runs its single sub-agent with a deadline. Events are passed through as
+    they are produced, and the sub-agent only continues once the runner has
+    consumed each one (as ParallelAgent does), so session state stays in
+    order. On timeout the sub-agent is cancelled and a final event reports
+    it, also setting `output_key` in state so a merging agent sees it.
+    """
+
+    timeout_seconds: float = 30.0
+    output_key: Optional[str] = None
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        agent = self.sub_agents[0]
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        async def produce():
+            try:
+                async for event in agent.run_async(ctx):
+                    resumed = asyncio.Event()
+                    await queue.put((event, resumed))
+                    await resumed.wait()
+            finally:
+                queue.put_nowait((finished, None))
+
+        start = time.perf_counter()
+        deadline = loop.time() + self.timeout_seconds
+        task = asyncio.create_task(produce())
+        try:
+            while True:
+                try:
+                    event, resumed = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if event is finished:
+                    try:
+                        await task  # re-raises the sub-agent's failure, if any
+                    except Exception:
+                        BRANCH_SECONDS.observe(time.perf_counter() - start, branch=agent.name, outcome="error")
+                        raise
+                    BRANCH_SECONDS.observe(time.perf_counter() - start, branch=agent.name, outcome="ok")
+                    return
+                yield event
+                resumed.set()
+        finally:
+            task.cancel()
+
+        BRANCH_SECONDS.observe(time.perf_counter() - start, branch=agent.name, outcome="timeout")
+        message = f"{agent.name} did not finish within {self.timeout_seconds:g}s; its findings are unavailable."
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=message)]),
+            actions=EventActions(state_delta={self.output_key: message} if self.output_key else {}),
+        )
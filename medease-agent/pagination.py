@@ -0,0 +1,36 @@
+"""
+Continuation tokens for the paged agent tools.
+
+A token carries the key of the last row returned and a fingerprint of the
+tool and filters it was issued for, so the next call continues the same
+listing (`key > @after`) and a token is never applied to a different query.
+Tokens are opaque to the model: URL-safe base64 of a small JSON object.
+"""
+import base64
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+def _fingerprint(tool: str, filters: Optional[Dict[str, Any]]) -> str:
+    canonical = json.dumps([tool, filters or {}], sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+def encode_page_token(tool: str, filters: Optional[Dict[str, Any]], after: Any) -> str:
+    payload = json.dumps({"q": _fingerprint(tool, filters), "after": after}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_page_token(token: str, tool: str, filters: Optional[Dict[str, Any]]) -> Any:
+    """
+    Returns the key to continue after.
+
+    Raises:
+        ValueError: if the token is malformed or was issued for other filters.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        fingerprint, after = payload["q"], payload["after"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid page_token") from e
+    if fingerprint != _fingerprint(tool, filters):
+        raise ValueError("page_token was issued for different filters; pass the same filters as the first call")
+    return after
@@ -0,0 +1,267 @@
+"""
+Builds parameterized SELECT queries from the filter dicts the agent tools
+receive.
+
+Filters map column -> value, column -> (operator, value) or column -> list
+of values. Columns and operators are checked against the table's column
+type map, and values are bound as named query parameters. The SQL text only
+depends on the *shape* of the filters (columns, operators, projection and
+limit), so repeated tool calls produce identical query text that BigQuery's
+result cache and our own query cache can reuse. Compiled shapes are cached.
+
+Queries can be paged by keyset: ordered by a key column and continued with
+`key > @after` from the last row of the previous page, so a later page
+costs the same as the first.
+"""
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+MAX_LIMIT = 1000
+
+COMPARISON_OPERATORS = {"=", "!=", "<>", "<", "<=", ">", ">="}
+NULL_OPERATORS = {"IS", "IS NOT"}
+LIST_OPERATORS = {"IN", "NOT IN"}
+PATTERN_OPERATORS = {"LIKE", "NOT LIKE"}
+ALLOWED_OPERATORS = COMPARISON_OPERATORS | NULL_OPERATORS | LIST_OPERATORS | PATTERN_OPERATORS
+
+# Schema type -> BigQuery query parameter type
+PARAMETER_TYPES = {
+    "STRING": "STRING",
+    "INTEGER": "INT64",
+    "NUMERIC": "NUMERIC",
+    "BOOLEAN": "BOOL",
+    "DATE": "DATE",
+    "TIMESTAMP": "TIMESTAMP",
+}
+
+# Looks like a comparison operator ("<=", "=>") rather than a value
+_OPERATOR_LIKE_RE = re.compile(r"^\s*[=!<>]+\s*$")
+
+def _split_filter(val: Any) -> Tuple[str, Any]:
+    """Returns (operator, value) for a filter value, defaulting to equality / IN."""
+    if (
+        isinstance(val, (tuple, list))
+        and len(val) == 2
+        and isinstance(val[0], str)
+        and (val[0].strip().upper() in ALLOWED_OPERATORS or _OPERATOR_LIKE_RE.match(val[0]))
+    ):
+        return val[0].strip().upper(), val[1]
+    if isinstance(val, (tuple, list)):
+        return "IN", list(val)
+    return "=", val
+
+def _coerce(col_type: str, val: Any) -> Any:
+    if col_type == "INTEGER":
+        return int(val)
+    if col_type == "NUMERIC":
+        return Decimal(str(val))
+    if col_type == "BOOLEAN":
+        if isinstance(val, str):
+            return val.strip().lower() in ("true", "1", "yes")
+        return bool(val)
+    if col_type in ("DATE", "TIMESTAMP"):
+        return val if not isinstance(val, str) else val.strip()
+    return str(val)
+
+def _shape_term(column_types: Dict[str, str], col: str, op: str, val: Any) -> Tuple[str, str, str]:
+    """Validates one filter and returns its (column, operator, kind) shape."""
+    col_type = column_types.get(col)
+    if col_type is None:
+        raise ValueError(f"Unknown column '{col}'")
+    if op not in ALLOWED_OPERATORS:
+        raise ValueError(f"Unsupported operator '{op}' for column '{col}'")
+
+    if val is None:
+        if op in ("=", "IS"):
+            return col, "IS", "null"
+        if op in ("!=", "<>", "IS NOT"):
+            return col, "IS NOT", "null"
+        raise ValueError(f"Operator '{op}' cannot compare '{col}' with NULL")
+    if op in NULL_OPERATORS:
+        raise ValueError(f"Operator '{op}' requires a NULL value for column '{col}'")
+    if op in LIST_OPERATORS:
+        if not isinstance(val, (list, tuple)) or not val:
+            raise ValueError(f"Operator '{op}' requires a non-empty list for column '{col}'")
+        return col, op, "list"
+    if op in PATTERN_OPERATORS and col_type != "STRING":
+        raise ValueError(f"Operator '{op}' only applies to STRING columns, not '{col}'")
+    if op not in ("=", "!=", "<>") and col_type == "BOOLEAN":
+        raise ValueError(f"Operator '{op}' does not apply to BOOLEAN column '{col}'")
+    return col, op, "value"
+
+def _where_clauses(shape: Tuple[Tuple[str, str, str], ...], alias: str = "", offset: int = 0) -> List[str]:
+    prefix = f"{alias}." if alias else ""
+    clauses = []
+    for i, (col, op, kind) in enumerate(shape, start=offset):
+        if kind == "null":
+            clauses.append(f"{prefix}{col} {op} NULL")
+        elif kind == "list":
+            clauses.append(f"{prefix}{col} {op} UNNEST(@p{i})")
+        else:
+            clauses.append(f"{prefix}{col} {op} @p{i}")
+    return clauses
+
+@lru_cache(maxsize=512)
+def _compile(
+    table: str,
+    shape: Tuple[Tuple[str, str, str], ...],
+    projection: Tuple[str, ...],
+    limit: int,
+    order_by: Optional[str] = None,
+    after: bool = False,
+) -> str:
+    clauses = _where_clauses(shape)
+    if after:
+        clauses.append(f"{order_by} > @after")
+    where_sql = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    order_sql = f" ORDER BY {order_by}" if order_by else ""
+    return f"SELECT {', '.join(projection)} FROM `{table}`{where_sql}{order_sql} LIMIT {limit}"
+
+@lru_cache(maxsize=256)
+def _compile_join(
+    table: str,
+    join_table: str,
+    on: Tuple[str, str],
+    shape: Tuple[Tuple[str, str, str], ...],
+    join_shape: Tuple[Tuple[str, str, str], ...],
+    projection: Tuple[str, ...],
+    join_projection: Tuple[str, ...],
+    join_prefix: str,
+    limit: int,
+) -> str:
+    select = [f"t.{c}" for c in projection] + [f"j.{c} AS {join_prefix}{c}" for c in join_projection]
+    clauses = _where_clauses(shape, "t") + _where_clauses(join_shape, "j", offset=len(shape))
+    where_sql = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    # A LEFT JOIN keeps rows without a match, unless a filter on the joined table excludes them
+    return (
+        f"SELECT {', '.join(select)} FROM `{table}` AS t "
+        f"LEFT JOIN `{join_table}` AS j ON j.{on[1]} = t.{on[0]}{where_sql} LIMIT {limit}"
+    )
+
+def compiled_shape_cache_info():
+    """Hit/miss statistics of the compiled query-shape cache."""
+    return _compile.cache_info()
+
+def _projection(column_types: Dict[str, str], columns: Optional[Sequence[str]]) -> Tuple[str, ...]:
+    projection = tuple(columns) if columns else tuple(column_types)
+    unknown = [c for c in projection if c not in column_types]
+    if unknown:
+        raise ValueError(f"Unknown column(s) in projection: {', '.join(unknown)}")
+    return projection
+
+def _bind_filters(
+    column_types: Dict[str, str], filters: Optional[Dict[str, Any]], offset: int = 0
+) -> Tuple[Tuple[Tuple[str, str, str], ...], List[Any]]:
+    """Validates filters and returns their shape and query parameters (named p{offset}, p{offset+1}, ...)."""
+    from google.cloud import bigquery
+
+    shape = []
+    params = []
+    for col in sorted(filters or {}):
+        op, val = _split_filter(filters[col])
+        term = _shape_term(column_types, col, op, val)
+        name = f"p{offset + len(shape)}"
+        col_type = column_types[col]
+        try:
+            if term[2] == "list":
+                params.append(bigquery.ArrayQueryParameter(
+                    name, PARAMETER_TYPES[col_type], [_coerce(col_type, v) for v in val]
+                ))
+            elif term[2] == "value":
+                params.append(bigquery.ScalarQueryParameter(
+                    name, PARAMETER_TYPES[col_type], _coerce(col_type, val)
+                ))
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise ValueError(f"Invalid value for column '{col}': {val!r}") from e
+        shape.append(term)
+    return tuple(shape), params
+
+def build_filter_query(
+    table: str,
+    column_types: Dict[str, str],
+    filters: Optional[Dict[str, Any]],
+    limit: int = 50,
+    columns: Optional[Sequence[str]] = None,
+    order_by: Optional[str] = None,
+    after: Any = None,
+) -> Tuple[str, List[Any]]:
+    """
+    Compiles a filter dict into parameterized SQL.
+
+    Args:
+        table: fully qualified table id, e.g. "project.dataset.Inventory".
+        column_types: the table's column -> schema type map (e.g. INVENTORY_COLUMN_TYPES).
+        filters: dict mapping column -> value, (operator, value) or list of values.
+        limit: maximum number of rows, clamped to 1..MAX_LIMIT.
+        columns: optional projection; defaults to every column in `column_types`.
+        order_by: keyset column for paging. Rows are ordered by it and one
+            extra row (limit + 1) is fetched so callers can tell whether
+            another page follows.
+        after: with `order_by`, only return rows whose key is greater than this.
+
+    Returns:
+        (sql, query_parameters) ready for QueryJobConfig(query_parameters=...).
+
+    Raises:
+        ValueError: on unknown columns, unsupported operators or bad values.
+    """
+    from google.cloud import bigquery
+
+    projection = _projection(column_types, columns)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    shape, params = _bind_filters(column_types, filters)
+    if order_by is not None:
+        if order_by not in column_types:
+            raise ValueError(f"Unknown order column '{order_by}'")
+        limit += 1
+        if after is not None:
+            col_type = column_types[order_by]
+            params.append(bigquery.ScalarQueryParameter("after", PARAMETER_TYPES[col_type], _coerce(col_type, after)))
+    sql = _compile(table, shape, projection, limit, order_by, after is not None and order_by is not None)
+    return sql, params
+
+def build_join_query(
+    table: str,
+    column_types: Dict[str, str],
+    join_table: str,
+    join_column_types: Dict[str, str],
+    on: Tuple[str, str],
+    filters: Optional[Dict[str, Any]] = None,
+    join_filters: Optional[Dict[str, Any]] = None,
+    limit: int = 50,
+    columns: Optional[Sequence[str]] = None,
+    join_columns: Optional[Sequence[str]] = None,
+    join_prefix: str = "",
+) -> Tuple[str, List[Any]]:
+    """
+    Compiles a filtered LEFT JOIN of `table` to `join_table` into parameterized SQL.
+
+    Args:
+        table, column_types: the main table and its column types.
+        join_table, join_column_types: the joined table and its column types.
+        on: (column of `table`, column of `join_table`) to join on.
+        filters: filters on `table` columns, as for build_filter_query.
+        join_filters: filters on `join_table` columns.
+        limit: maximum number of rows, clamped to 1..MAX_LIMIT.
+        columns: projection of `table`; defaults to all of its columns.
+        join_columns: projection of `join_table`, returned as `join_prefix` + column.
+
+    Returns:
+        (sql, query_parameters).
+
+    Raises:
+        ValueError: on unknown columns, unsupported operators or bad values.
+    """
+    if on[0] not in column_types or on[1] not in join_column_types:
+        raise ValueError(f"Unknown join columns {on!r}")
+    projection = _projection(column_types, columns)
+    join_projection = _projection(join_column_types, join_columns)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    shape, params = _bind_filters(column_types, filters)
+    join_shape, join_params = _bind_filters(join_column_types, join_filters, offset=len(shape))
+    sql = _compile_join(
+        table, join_table, tuple(on), shape, join_shape, projection, join_projection, join_prefix, limit
+    )
+    return sql, params + join_params
@@ -0,0 +1,255 @@
+"""
+Reorder planning over the whole inventory, computed in bulk with NumPy.
+
+The inventory is loaded once into column arrays (and reloaded when older
+than REORDER_MAX_STALENESS_SECONDS). A plan is then a handful of vectorized
+passes over those arrays, so it covers every SKU in one call instead of the
+model paging through check_inventory results.
+
+Each inventory row is a lot; lots with the same ndc are one SKU (a row
+without an ndc is a SKU of its own):
+
+- stock in lots expiring within `expiry_buffer_days` is not counted as
+  usable, since it will have to be pulled from the shelf; the rest of the
+  SKU's lots add up to its usable stock;
+- a SKU needs reordering when its usable stock is below minThreshold (or
+  any of its lots is flagged needsReorder);
+- the order quantity brings usable stock back up to maxStock (minThreshold
+  if maxStock is missing), priced at costPerUnit. A SKU's minThreshold and
+  maxStock are the largest across its lots; its supplier, costPerUnit, id
+  and name are those of its first lot;
+- quantities and costs are totalled per supplier.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from clients import iter_query_rows
+from metrics import log_sampled, registry
+from schemas import table_id
+
+# numpy is imported where it is first used (the first plan), so importing
+# this module with agent.py keeps startup cheap.
+if TYPE_CHECKING:
+    import numpy as np
+
+REORDER_MAX_STALENESS_SECONDS = float(os.getenv("REORDER_MAX_STALENESS_SECONDS", "300"))
+DEFAULT_EXPIRY_BUFFER_DAYS = int(os.getenv("REORDER_EXPIRY_BUFFER_DAYS", "30"))
+NO_SUPPLIER = "(none)"
+
+REORDER_PLAN_SECONDS = registry.histogram(
+    "medease_reorder_plan_seconds", "Reorder plan computation time (excluding inventory load).",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+INVENTORY_COLUMNS = (
+    "id", "name", "ndc", "supplier", "currentStock", "minThreshold", "maxStock",
+    "costPerUnit", "expirationDate", "needsReorder",
+)
+
+def _int_column(values: List[Any]) -> "np.ndarray":
+    import numpy as np
+    return np.array([0 if v is None else v for v in values], dtype=np.int64)
+
+def _group_max(values: "np.ndarray", groups: "np.ndarray", n_groups: int) -> "np.ndarray":
+    import numpy as np
+    out = np.full(n_groups, np.iinfo(values.dtype).min, dtype=values.dtype)
+    np.maximum.at(out, groups, values)
+    return out
+
+def columns_from_rows(rows: List[Dict[str, Any]]) -> Dict[str, "np.ndarray"]:
+    """
+    Converts inventory row dicts (one per lot) into the column arrays the
+    planner works on: per-lot "lot_sku", "lot_stock" and "lot_expiration",
+    and one entry per SKU (lots grouped by ndc) in the other columns.
+    """
+    import numpy as np
+
+    raw = {c: [r.get(c) for r in rows] for c in INVENTORY_COLUMNS}
+    keys = np.array(
+        [f"ndc:{n}" if n else f"id:{i}" for n, i in zip(raw["ndc"], raw["id"])], dtype=object
+    )
+    _, first, lot_sku = np.unique(keys, return_index=True, return_inverse=True)
+    n_skus = len(first)
+    lot_stock = _int_column(raw["currentStock"])
+    min_threshold = _int_column(raw["minThreshold"])
+    max_stock = _int_column([m if m is not None else t for m, t in zip(raw["maxStock"], raw["minThreshold"])])
+    needs_reorder = np.zeros(n_skus, dtype=bool)
+    needs_reorder[lot_sku[np.array([bool(v) for v in raw["needsReorder"]], dtype=bool)]] = True
+    suppliers, supplier_codes = np.unique(
+        np.array([raw["supplier"][i] or NO_SUPPLIER for i in first], dtype=object), return_inverse=True
+    )
+    return {
+        "lot_sku": lot_sku.astype(np.int64),
+        "lot_stock": lot_stock,
+        # None becomes NaT, which never compares as expiring
+        "lot_expiration": np.array([None if v is None else v[:10] for v in raw["expirationDate"]], dtype="datetime64[D]"),
+        "id": np.array([raw["id"][i] for i in first], dtype=object),
+        "name": np.array([raw["name"][i] for i in first], dtype=object),
+        "ndc": np.array([raw["ndc"][i] for i in first], dtype=object),
+        "lots": np.bincount(lot_sku, minlength=n_skus),
+        "supplier_code": supplier_codes.astype(np.int32),
+        "suppliers": suppliers,
+        "currentStock": np.bincount(lot_sku, weights=lot_stock, minlength=n_skus).astype(np.int64),
+        "minThreshold": _group_max(min_threshold, lot_sku, n_skus),
+        "maxStock": _group_max(max_stock, lot_sku, n_skus),
+        "costPerUnit": np.array([raw["costPerUnit"][i] or 0.0 for i in first], dtype=np.float64),
+        "needsReorder": needs_reorder,
+    }
+
+def compute_reorder_plan(
+    columns: Dict[str, "np.ndarray"],
+    today: Optional[date] = None,
+    expiry_buffer_days: int = DEFAULT_EXPIRY_BUFFER_DAYS,
+    supplier: Optional[str] = None,
+    include_flagged: bool = True,
+    limit: int = 25,
+) -> Dict[str, Any]:
+    """
+    Computes order quantities for every SKU (lots grouped by ndc) and totals them per supplier.
+
+    Args:
+        columns: inventory column arrays (see columns_from_rows).
+        today: planning date; defaults to today.
+        expiry_buffer_days: lots expiring within this many days don't count as usable stock.
+        supplier: only plan for this supplier.
+        include_flagged: also reorder items flagged needsReorder even if above minThreshold.
+        limit: number of order lines to return (largest line cost first); totals cover all lines.
+
+    Returns:
+        dict with "suppliers" (per-supplier items, units and cost, largest cost
+        first), "lines", "total_units", "total_cost", "skus_considered" and
+        "expiring_lots" (lots whose stock was not counted as usable).
+        "skus_considered" counts SKUs, not lots.
+    """
+    import numpy as np
+
+    start = time.perf_counter()
+    today = np.datetime64(today or date.today(), "D")
+    codes = columns["supplier_code"]
+    suppliers = columns["suppliers"]
+
+    expiring = columns["lot_expiration"] <= today + np.timedelta64(int(expiry_buffer_days), "D")
+    usable = np.bincount(
+        columns["lot_sku"], weights=np.where(expiring, 0, columns["lot_stock"]), minlength=len(codes)
+    ).astype(np.int64)
+    needs = usable < columns["minThreshold"]
+    if include_flagged:
+        needs |= columns["needsReorder"]
+    if supplier is not None:
+        match = np.flatnonzero(suppliers == supplier)
+        needs &= codes == (match[0] if match.size else -1)
+
+    target = np.maximum(columns["maxStock"], columns["minThreshold"])
+    quantity = np.where(needs, np.maximum(target - usable, 0), 0)
+    line_cost = quantity * columns["costPerUnit"]
+    ordered = quantity > 0
+
+    n_suppliers = len(suppliers)
+    supplier_items = np.bincount(codes, weights=ordered, minlength=n_suppliers)
+    supplier_units = np.bincount(codes, weights=quantity, minlength=n_suppliers)
+    supplier_cost = np.bincount(codes, weights=line_cost, minlength=n_suppliers)
+
+    # Top `limit` lines by cost without sorting every SKU
+    limit = max(0, int(limit))
+    candidates = np.flatnonzero(ordered)
+    if candidates.size > limit:
+        candidates = candidates[np.argpartition(-line_cost[candidates], limit - 1)[:limit]] if limit else candidates[:0]
+    top = candidates[np.argsort(-line_cost[candidates], kind="stable")] if candidates.size else candidates
+
+    lines = [
+        {
+            "id": columns["id"][i],
+            "name": columns["name"][i],
+            "ndc": columns["ndc"][i],
+            "supplier": suppliers[codes[i]],
+            "lots": int(columns["lots"][i]),
+            "currentStock": int(columns["currentStock"][i]),
+            "usableStock": int(usable[i]),
+            "minThreshold": int(columns["minThreshold"][i]),
+            "maxStock": int(columns["maxStock"][i]),
+            "orderQuantity": int(quantity[i]),
+            "lineCost": round(float(line_cost[i]), 2),
+        }
+        for i in top
+    ]
+    by_supplier = [
+        {
+            "supplier": suppliers[s],
+            "items": int(supplier_items[s]),
+            "units": int(supplier_units[s]),
+            "total_cost": round(float(supplier_cost[s]), 2),
+        }
+        for s in np.argsort(-supplier_cost, kind="stable")
+        if supplier_items[s]
+    ]
+    elapsed = time.perf_counter() - start
+    REORDER_PLAN_SECONDS.observe(elapsed)
+    return {
+        "suppliers": by_supplier,
+        "lines": lines,
+        "total_units": int(quantity.sum()),
+        "total_cost": round(float(line_cost.sum()), 2),
+        "skus_considered": int(len(codes)),
+        "expiring_lots": int(np.count_nonzero(expiring)),
+        "expiry_buffer_days": int(expiry_buffer_days),
+        "compute_ms": round(elapsed * 1000, 2),
+    }
+
+class ReorderPlanner:
+    """Holds the inventory column arrays and reloads them when stale."""
+
+    def __init__(self, table: Optional[str] = None, max_staleness: float = REORDER_MAX_STALENESS_SECONDS):
+        self.table = table
+        self.max_staleness = max_staleness
+        self.last_error: Optional[str] = None
+        self._columns: Optional[Dict[str, "np.ndarray"]] = None
+        self._loaded_at: Optional[float] = None
+        self._load_lock = threading.Lock()
+
+    def load(self) -> Dict[str, "np.ndarray"]:
+        table = self.table or table_id("Inventory")
+        try:
+            rows = list(iter_query_rows(f"SELECT {', '.join(INVENTORY_COLUMNS)} FROM `{table}`"))
+        except Exception as e:
+            self.last_error = str(e)
+            log_sampled("reorder inventory load failed: %s", type(e).__name__, level=logging.WARNING)
+            raise
+        self._columns = columns_from_rows(rows)
+        self._loaded_at = time.monotonic()
+        self.last_error = None
+        return self._columns
+
+    def columns(self) -> Dict[str, "np.ndarray"]:
+        """
+        Returns the inventory columns, reloading them if older than max_staleness.
+        If a reload fails but older columns exist, those keep being used.
+        """
+        age = self.age_seconds()
+        if age is not None and age <= self.max_staleness:
+            return self._columns
+        with self._load_lock:
+            age = self.age_seconds()
+            if age is not None and age <= self.max_staleness:
+                return self._columns
+            try:
+                return self.load()
+            except Exception:
+                if self._columns is None:
+                    raise
+                return self._columns
+
+    def age_seconds(self) -> Optional[float]:
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def plan(self, **kwargs: Any) -> Dict[str, Any]:
+        result = compute_reorder_plan(self.columns(), **kwargs)
+        result["age_seconds"] = round(self.age_seconds() or 0.0, 1)
+        return result
+
+reorder_planner = ReorderPlanner()
@@ -0,0 +1,67 @@
+"""Table ids and column types of the MedEase BigQuery tables, shared by the agent tools and query builder."""
+import os
+
+gcp_project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
+dataset_id = os.getenv('BQ_DATASET_ID')
+
+def table_id(name: str) -> str:
+    return f"{gcp_project_id}.{dataset_id}.{name}"
+
+INVENTORY_COLUMN_TYPES = {
+    "id": "STRING",
+    "name": "STRING",
+    "genericName": "STRING",
+    "ndc": "STRING",
+    "currentStock": "INTEGER",
+    "minThreshold": "INTEGER",
+    "maxStock": "INTEGER",
+    "lastReorder": "DATE",
+    "needsReorder": "BOOLEAN",
+    "supplier": "STRING",
+    "costPerUnit": "NUMERIC",
+    "expirationDate": "DATE",
+    "lotNumber": "STRING",
+    "location": "STRING",
+    "created_at": "TIMESTAMP",
+    "updated_at": "TIMESTAMP",
+}
+
+PRESCRIPTIONS_COLUMN_TYPES = {
+    "id": "STRING",
+    "patientId": "STRING",
+    "patientName": "STRING",
+    "medication": "STRING",
+    "dosage": "STRING",
+    "quantity": "INTEGER",
+    "status": "STRING",           # e.g., "pending", "filled", "blocked"
+    "prescribedBy": "STRING",
+    "dateCreated": "TIMESTAMP",
+    "dateFilled": "TIMESTAMP",
+    "agentId": "STRING",
+    "insuranceStatus": "STRING",  # e.g., "approved", "denied", "pending"
+    "priority": "STRING",         # e.g., "normal", "high"
+    "estimatedCompletion": "TIMESTAMP",
+    "copayAmount": "NUMERIC",
+    "refillsRemaining": "INTEGER",
+    "instructions": "STRING",
+    "warnings": "STRING",
+    "created_at": "TIMESTAMP",
+    "updated_at": "TIMESTAMP",
+}
+
+USERS_COLUMN_TYPES = {
+    "id": "STRING",
+    "name": "STRING",
+    "role": "STRING",
+    "email": "STRING",
+    "phone": "STRING",
+    "DateOfBirth": "DATE",
+    "created_at": "TIMESTAMP",
+    "updated_at": "TIMESTAMP",
+}
+
+# Narrow projections the cost guard falls back to when a query would scan
+# more than its tool's bytes budget (see cost_guard.py)
+INVENTORY_SUMMARY_COLUMNS = ("id", "name", "ndc", "currentStock", "minThreshold", "needsReorder", "expirationDate")
+PRESCRIPTIONS_SUMMARY_COLUMNS = ("id", "patientId", "patientName", "medication", "status", "dateCreated")
+USERS_SUMMARY_COLUMNS = ("id", "name", "role", "phone")
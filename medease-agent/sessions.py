@@ -0,0 +1,114 @@
+"""
+Process-wide session storage for the agent service.
+
+By default sessions live in memory with LRU, idle-timeout and total-size
+eviction (BoundedSessionService). Setting AGENT_SESSION_DB (for example
+"sqlite:///sessions.db") switches to ADK's DatabaseSessionService so
+conversations survive a restart.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+
+SessionKey = Tuple[str, str, str]
+
+class BoundedSessionService(InMemorySessionService):
+    """
+    InMemorySessionService that evicts sessions when there are more than
+    `max_sessions`, when one has been idle for `idle_timeout` seconds, or when
+    the approximate size of all stored events exceeds `max_bytes`.
+    Least recently used sessions are evicted first.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_timeout: float = 1800.0, max_bytes: int = 256 * 1024 * 1024):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_bytes = max_bytes
+        self.evicted = 0
+        self._last_access: "OrderedDict[SessionKey, float]" = OrderedDict()
+        self._sizes: Dict[SessionKey, int] = {}
+        self._total_bytes = 0
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        self._touch((app_name, user_id, session.id))
+        self._evict()
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None) -> Optional[Session]:
+        self._evict()
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None:
+            self._touch((app_name, user_id, session_id))
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self._forget((app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        key = (session.app_name, session.user_id, session.id)
+        if key in self._last_access:
+            size = len(event.model_dump_json(exclude_none=True))
+            self._sizes[key] = self._sizes.get(key, 0) + size
+            self._total_bytes += size
+            self._touch(key)
+            self._evict()
+        return event
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._last_access),
+            "bytes": self._total_bytes,
+            "evicted": self.evicted,
+        }
+
+    def _touch(self, key: SessionKey) -> None:
+        self._last_access[key] = time.monotonic()
+        self._last_access.move_to_end(key)
+
+    def _forget(self, key: SessionKey) -> None:
+        self._last_access.pop(key, None)
+        self._total_bytes -= self._sizes.pop(key, 0)
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._last_access:
+            key, last_access = next(iter(self._last_access.items()))
+            over_limit = len(self._last_access) > self.max_sessions or (
+                self._total_bytes > self.max_bytes and len(self._last_access) > 1
+            )
+            if last_access >= cutoff and not over_limit:
+                break
+            app_name, user_id, session_id = key
+            self.sessions.get(app_name, {}).get(user_id, {}).pop(session_id, None)
+            self._forget(key)
+            self.evicted += 1
+
+def create_session_service() -> BaseSessionService:
+    """Builds the session service configured by the environment."""
+    db_url = os.getenv("AGENT_SESSION_DB")
+    if db_url:
+        from google.adk.sessions import DatabaseSessionService
+        return DatabaseSessionService(db_url=db_url)
+    return BoundedSessionService(
+        max_sessions=int(os.getenv("AGENT_MAX_SESSIONS", "1000")),
+        idle_timeout=float(os.getenv("AGENT_SESSION_IDLE_SECONDS", "1800")),
+        max_bytes=int(os.getenv("AGENT_SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+    )
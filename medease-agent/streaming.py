@@ -0,0 +1,70 @@
+"""
+Compact stream formats for /agent/respond.
+
+Instead of a full ADK Event per line, the compact formats send only what the
+chat client renders:
+
+    {"t": "text", "d": "..."}                    incremental answer text
+    {"t": "thought", "d": "..."}                 incremental thought text (opt-in)
+    {"t": "tool", "n": "check_inventory", "s": "call" | "done"}
+    {"t": "end", "avoided_calls": 2, "tokens_saved": 1800} / {"t": "error", "d": "..."}
+
+"ndjson" writes one JSON object per line; "sse" writes Server-Sent Events
+("event: <t>" plus a "data:" line). Text arrives as deltas because the compact
+formats run the model in SSE streaming mode; the final aggregated event that
+repeats already-streamed text is dropped.
+
+With AGENT_ORCHESTRATION=parallel, the fan-out branches' own text is their
+internal findings (merged into the answer afterwards), so only their tool
+markers are streamed.
+"""
+from typing import Any, Dict, Iterator
+
+from clients import dumps
+
+FULL_FORMAT = "events"
+COMPACT_FORMATS = ("ndjson", "sse")
+STREAM_FORMATS = (FULL_FORMAT,) + COMPACT_FORMATS
+
+MEDIA_TYPES = {
+    FULL_FORMAT: "application/json",
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+# Ask proxies not to buffer, so each event is flushed to the client as it is written
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+class CompactEventEncoder:
+    """Turns ADK events into compact messages, tracking which text was already streamed."""
+
+    def __init__(self, include_thoughts: bool = False):
+        self.include_thoughts = include_thoughts
+        self._streamed_partial = False
+
+    def messages(self, event: Any) -> Iterator[Dict[str, Any]]:
+        parts = event.content.parts if event.content and event.content.parts else []
+        # Events of parallel branches interleave with each other, and their text is not the answer
+        in_branch = bool(getattr(event, "branch", None))
+        partial = bool(event.partial)
+        # A non-partial event after partial chunks repeats the aggregated text
+        skip_text = in_branch or (not partial and self._streamed_partial)
+        if not in_branch:
+            self._streamed_partial = partial
+
+        for part in parts:
+            if part.function_call:
+                yield {"t": "tool", "n": part.function_call.name, "s": "call"}
+            elif part.function_response:
+                yield {"t": "tool", "n": part.function_response.name, "s": "done"}
+            elif part.text and not skip_text:
+                if part.thought:
+                    if self.include_thoughts:
+                        yield {"t": "thought", "d": part.text}
+                else:
+                    yield {"t": "text", "d": part.text}
+
+def encode(message: Dict[str, Any], stream_format: str) -> str:
+    if stream_format == "sse":
+        return f"event: {message['t']}\ndata: {dumps(message)}\n\n"
+    return dumps(message) + "\n"
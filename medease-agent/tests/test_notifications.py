@@ -0,0 +1,185 @@
+"""
+SmsDispatcher and NotificationQueue against an in-process stand-in for the
+Twilio Messages API (httpx.MockTransport). Run with: python -m pytest medease-agent/tests
+"""
+import asyncio
+import time
+from typing import List
+from urllib.parse import parse_qs
+
+import httpx
+
+from notifications import NotificationQueue, RateLimiter, SmsDispatcher
+
+class FakeTwilio:
+    """
+    Answers each POST with the next scripted (status, headers), then 201 once
+    the script runs out. A scripted exception is raised instead, as if from the network.
+    """
+
+    def __init__(self, script: List[tuple] = ()):
+        self.script = list(script)
+        self.requests: List[dict] = []
+        self.transport = httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        form = {k: v[0] for k, v in parse_qs(request.content.decode()).items()}
+        self.requests.append(form)
+        if self.script:
+            status, headers = self.script.pop(0)
+            if isinstance(status, Exception):
+                raise status
+            return httpx.Response(status, headers=headers, text="scripted failure")
+        return httpx.Response(201, json={"sid": f"SM{len(self.requests)}"})
+
+def make_dispatcher(twilio: FakeTwilio, **kwargs) -> SmsDispatcher:
+    options = {"rate_per_second": 1000.0, "backoff_seconds": 0.01, "transport": twilio.transport, **kwargs}
+    return SmsDispatcher("ACtest", "token", "+15550000000", **options)
+
+def run(dispatcher: SmsDispatcher, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await dispatcher.aclose()
+    return asyncio.run(main())
+
+# -------------------------
+# Idempotency
+# -------------------------
+def test_resend_of_same_message_is_deduplicated():
+    twilio = FakeTwilio()
+    dispatcher = make_dispatcher(twilio)
+
+    async def send_twice():
+        first = await dispatcher.send("555-123-4567", "Your refill is ready")
+        second = await dispatcher.send("(555) 123 4567", "Your refill is ready")
+        return first, second
+
+    first, second = run(dispatcher, send_twice())
+    assert first["status"] == "SUCCESS" and "deduplicated" not in first
+    assert second["deduplicated"] is True and second["sid"] == first["sid"]
+    assert len(twilio.requests) == 1
+    assert twilio.requests[0]["To"] == "+15551234567"
+
+def test_concurrent_duplicates_share_one_delivery():
+    twilio = FakeTwilio()
+    dispatcher = make_dispatcher(twilio)
+    messages = [{"to": "555-123-4567", "body": "Pickup reminder"}] * 5
+
+    results = run(dispatcher, dispatcher.send_many(messages))
+    assert {r["sid"] for r in results} == {"SM1"}
+    assert sum(1 for r in results if r.get("deduplicated")) == 4
+    assert len(twilio.requests) == 1
+
+def test_failed_message_is_not_remembered():
+    twilio = FakeTwilio([(400, {})])
+    dispatcher = make_dispatcher(twilio)
+
+    async def send_twice():
+        return [await dispatcher.send("555-123-4567", "hello") for _ in range(2)]
+
+    failed, retried = run(dispatcher, send_twice())
+    assert failed["status"] == "ERROR" and retried["status"] == "SUCCESS"
+    assert len(twilio.requests) == 2
+
+def test_dedup_entries_expire_and_are_bounded():
+    twilio = FakeTwilio()
+    dispatcher = make_dispatcher(twilio, dedup_max_entries=3)
+
+    async def send_all():
+        for i in range(10):
+            await dispatcher.send(f"555-000-{i:04d}", "hello")
+
+    run(dispatcher, send_all())
+    assert len(dispatcher._sent) == 3
+
+    dispatcher = make_dispatcher(twilio, dedup_seconds=0.05)
+
+    async def send_after_window():
+        await dispatcher.send("555-123-4567", "expiring")
+        await asyncio.sleep(0.1)
+        return await dispatcher.send("555-765-4321", "other")
+
+    run(dispatcher, send_after_window())
+    assert list(dispatcher._sent) == [SmsDispatcher.idempotency_key("+15557654321", "other")]
+
+# -------------------------
+# Retries and rate limiting
+# -------------------------
+def test_retries_when_message_was_not_accepted():
+    connect_error = httpx.ConnectError("connection refused")
+    twilio = FakeTwilio([(503, {}), (429, {}), (connect_error, {})])
+    dispatcher = make_dispatcher(twilio, max_retries=3)
+
+    result = run(dispatcher, dispatcher.send("555-123-4567", "hello"))
+    assert result["status"] == "SUCCESS"
+    assert len(twilio.requests) == 4
+
+def test_possibly_delivered_message_is_not_retried_or_resent():
+    for failure in (500, 502, 504, httpx.ReadTimeout("timed out")):
+        twilio = FakeTwilio([(failure, {})])
+        dispatcher = make_dispatcher(twilio, max_retries=3)
+
+        async def send_twice():
+            return [await dispatcher.send("555-123-4567", "hello") for _ in range(2)]
+
+        unknown, resent = run(dispatcher, send_twice())
+        assert unknown["status"] == "UNKNOWN" and "deduplicated" not in unknown
+        assert resent["status"] == "UNKNOWN" and resent["deduplicated"] is True
+        assert len(twilio.requests) == 1
+
+def test_gives_up_after_max_retries():
+    twilio = FakeTwilio([(503, {})] * 10)
+    dispatcher = make_dispatcher(twilio, max_retries=2)
+
+    result = run(dispatcher, dispatcher.send("555-123-4567", "hello"))
+    assert result["status"] == "ERROR" and "HTTP 503" in result["message"]
+    assert len(twilio.requests) == 3
+
+def test_client_errors_are_not_retried():
+    twilio = FakeTwilio([(400, {})])
+    dispatcher = make_dispatcher(twilio, max_retries=3)
+
+    result = run(dispatcher, dispatcher.send("555-123-4567", "hello"))
+    assert result["status"] == "ERROR"
+    assert len(twilio.requests) == 1
+
+def test_429_backs_off_for_retry_after():
+    twilio = FakeTwilio([(429, {"Retry-After": "1"})])
+    dispatcher = make_dispatcher(twilio)
+
+    start = time.monotonic()
+    result = run(dispatcher, dispatcher.send("555-123-4567", "hello"))
+    assert result["status"] == "SUCCESS"
+    assert time.monotonic() - start >= 1.0
+
+def test_rate_limiter_paces_acquisitions():
+    limiter = RateLimiter(rate=20.0, burst=1)
+
+    async def acquire(n):
+        for _ in range(n):
+            await limiter.acquire()
+
+    start = time.monotonic()
+    asyncio.run(acquire(5))
+    # The first token is available immediately, then one every 1/20 s
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+# -------------------------
+# Queue
+# -------------------------
+def test_queue_drains_all_submitted_messages():
+    twilio = FakeTwilio([(503, {})])
+    queue = NotificationQueue(make_dispatcher(twilio, max_concurrency=3, rate_per_second=200.0))
+    try:
+        bulk = queue.submit_many([{"to": f"555-000-{i:04d}", "body": "bulk"} for i in range(20)])
+        single = queue.submit("555-999-0000", "single")
+        results = bulk.result(timeout=10) + [single.result(timeout=10)]
+    finally:
+        queue.close()
+
+    assert all(r["status"] == "SUCCESS" for r in results)
+    assert len({r["to"] for r in results}) == 21
+    assert len({r["To"] for r in twilio.requests}) == 21  # plus one retried 503
+    assert len(twilio.requests) == 22
@@ -0,0 +1,148 @@
+"""
+Per-conversation memoization of read-only agent tools.
+
+Tool results are cached for a short TTL under (session id, tool name,
+canonicalized arguments). Identical calls that overlap share one in-flight
+backend call. Wrapped tools run on a worker thread, so parallel function
+calls from the model no longer block the event loop or each other.
+Tools with side effects (MEMO_EXCLUDED_TOOLS) are never memoized.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+MEMO_EXCLUDED_TOOLS = frozenset({"notify_patient", "notify_patients", "send_prescription_reminders"})
+
+TOOL_CONTEXT_PARAM = "tool_context"
+
+# -------------------------
+# Tool wrapping helpers
+# -------------------------
+def tool_signature(fn: Callable) -> inspect.Signature:
+    """The signature of `fn` with a keyword-only `tool_context` parameter, so ADK injects it."""
+    sig = inspect.signature(fn)
+    if TOOL_CONTEXT_PARAM in sig.parameters:
+        return sig
+    params = list(sig.parameters.values())
+    params.append(inspect.Parameter(TOOL_CONTEXT_PARAM, inspect.Parameter.KEYWORD_ONLY, default=None))
+    return sig.replace(parameters=params)
+
+async def call_tool(fn: Callable, kwargs: Dict[str, Any], tool_context: Any = None) -> Any:
+    """Calls a (possibly wrapped) tool, awaiting async tools and running sync ones on a thread."""
+    if TOOL_CONTEXT_PARAM in inspect.signature(fn).parameters:
+        kwargs = {**kwargs, TOOL_CONTEXT_PARAM: tool_context}
+    if inspect.iscoroutinefunction(fn):
+        return await fn(**kwargs)
+    return await asyncio.to_thread(functools.partial(fn, **kwargs))
+
+def canonical_args(fn: Callable, kwargs: Dict[str, Any]) -> str:
+    """Arguments with defaults applied, as order-independent JSON (tuples and lists compare equal)."""
+    sig = inspect.signature(fn)
+    params = {k: v for k, v in sig.parameters.items() if k != TOOL_CONTEXT_PARAM}
+    bound = sig.replace(parameters=list(params.values())).bind(**kwargs)
+    bound.apply_defaults()
+    return json.dumps(bound.arguments, sort_keys=True, default=str)
+
+def session_id_of(tool_context: Any) -> Optional[str]:
+    invocation_context = getattr(tool_context, "_invocation_context", None)
+    session = getattr(invocation_context, "session", None)
+    return getattr(session, "id", None)
+
+# -------------------------
+# Memo store
+# -------------------------
+def _is_error(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("status") == "ERROR"
+
+class ToolMemo:
+    def __init__(self, ttl: float = 30.0, max_entries: int = 4096, max_turns: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_turns = max_turns
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._turns: "OrderedDict[str, Counter]" = OrderedDict()
+
+    async def get_or_call(
+        self, key: Hashable, invocation_id: Optional[str], call: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            self._count(invocation_id, "cached")
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count(invocation_id, "shared")
+            return await asyncio.shield(task)
+
+        self._count(invocation_id, "backend")
+        task = asyncio.ensure_future(call())
+        self._inflight[key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+        if not _is_error(result):
+            self._store(key, result)
+        return result
+
+    def _store(self, key: Hashable, result: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        now = time.monotonic()
+        while self._entries:
+            oldest_key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[oldest_key]
+
+    def _count(self, invocation_id: Optional[str], outcome: str) -> None:
+        if invocation_id is None:
+            return
+        counts = self._turns.get(invocation_id)
+        if counts is None:
+            counts = self._turns[invocation_id] = Counter()
+            while len(self._turns) > self.max_turns:
+                self._turns.popitem(last=False)
+        counts[outcome] += 1
+
+    def pop_turn_stats(self, invocation_id: Optional[str]) -> Dict[str, int]:
+        """
+        Returns and forgets the memo stats of one turn:
+        backend calls made, and calls avoided (served cached or shared in flight).
+        """
+        counts = self._turns.pop(invocation_id, Counter()) if invocation_id else Counter()
+        return {
+            "backend_calls": counts["backend"],
+            "avoided_calls": counts["cached"] + counts["shared"],
+        }
+
+tool_memo = ToolMemo(ttl=float(os.getenv("TOOL_MEMO_TTL_SECONDS", "30")))
+
+def memoize_tool(fn: Callable, memo: ToolMemo = tool_memo) -> Callable:
+    """Wraps a read-only tool so repeated calls within a session are served from the memo."""
+    if fn.__name__ in MEMO_EXCLUDED_TOOLS:
+        raise ValueError(f"Tool '{fn.__name__}' has side effects and must not be memoized")
+
+    @functools.wraps(fn)
+    async def wrapper(tool_context=None, **kwargs):
+        session_id = session_id_of(tool_context)
+        if session_id is None:
+            return await call_tool(fn, kwargs, tool_context)
+        key = (session_id, fn.__name__, canonical_args(fn, kwargs))
+        invocation_id = getattr(tool_context, "invocation_id", None)
+        return await memo.get_or_call(key, invocation_id, lambda: call_tool(fn, kwargs, tool_context))
+
+    wrapper.__signature__ = tool_signature(fn)
+    return wrapper
+
+def memoize_tools(tools: List[Callable]) -> List[Callable]:
+    """Memoizes every tool except those in MEMO_EXCLUDED_TOOLS."""
+    return [t if t.__name__ in MEMO_EXCLUDED_TOOLS else memoize_tool(t) for t in tools]